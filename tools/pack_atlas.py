@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+
+
+"""
+Pack all character and weapon sprites into a texture atlas
+
+Each sprite is scaled as its class uses it, then the sprites are packed onto shelves
+of as few sheets as possible. The sheets are written with a JSON index of where each
+sprite is, which wwd.assets loads at runtime.
+
+Re-run this whenever sprites or their scale factors change.
+"""
+
+
+import json
+import sys
+from typing import Dict, List, Tuple
+
+import pygame
+
+from wwd.assets import ASSETS_DIR, ATLAS_INDEX_PATH, SPRITE_PATHS
+from wwd.characters import Enemy, Pet, Player, RemotePlayer
+from wwd.weapons import MeeleeWeapon, RangedWeapon
+
+
+SHEET_SIZE = 2048
+
+# Transparent gap around each sprite, so smooth scaling never samples a neighbour
+PADDING = 2
+
+SPRITE_CLASSES = (Player, RemotePlayer, Enemy, Pet, MeeleeWeapon, RangedWeapon)
+
+
+def pack(
+    sizes: List[Tuple[int, int]], sheet_size: int = SHEET_SIZE
+) -> List[Tuple[int, int, int]]:
+    """
+    Pack rectangles onto shelves of square sheets, tallest first
+
+    Args:
+        sizes: Width and height of each rectangle
+        sheet_size: Width and height of each sheet
+
+    Returns:
+        Sheet index and top left x and y of each rectangle
+    """
+    placements: List[Tuple[int, int, int]] = [(0, 0, 0)] * len(sizes)
+    sheet = shelf_y = shelf_height = x = 0
+    for idx in sorted(range(len(sizes)), key=lambda idx: -sizes[idx][1]):
+        width, height = (size + 2 * PADDING for size in sizes[idx])
+        if width > sheet_size or height > sheet_size:
+            raise ValueError(f"Sprite of size {sizes[idx]} does not fit on a sheet")
+
+        # Start a new shelf, or a new sheet, when this one is full
+        if x + width > sheet_size:
+            shelf_y, shelf_height, x = shelf_y + shelf_height, 0, 0
+        if shelf_y + height > sheet_size:
+            sheet, shelf_y, shelf_height, x = sheet + 1, 0, 0, 0
+
+        placements[idx] = (sheet, x + PADDING, shelf_y + PADDING)
+        x += width
+        shelf_height = max(shelf_height, height)
+    return placements
+
+
+def main() -> int:
+    """
+    Main logic
+    """
+    pygame.init()
+
+    # Converting sprites needs a display, though nothing is shown on it
+    pygame.display.set_mode((1, 1), pygame.HIDDEN)
+
+    # Each sprite at each scale it is used at, converted to 32 bit first as smooth
+    # scaling fails on paletted and 8 bit images
+    keys_and_scales = sorted(
+        {
+            (sprite_class.ASSET_KEY, sprite_class.SCALE_FACTOR)
+            for sprite_class in SPRITE_CLASSES
+        }
+    )
+    sprites = [
+        pygame.transform.smoothscale_by(
+            pygame.image.load(ASSETS_DIR / SPRITE_PATHS[key]).convert_alpha(), scale
+        )
+        for key, scale in keys_and_scales
+    ]
+
+    placements = pack([sprite.get_size() for sprite in sprites])
+    n_sheets = max(sheet for sheet, _, _ in placements) + 1
+    sheets = [
+        pygame.Surface((SHEET_SIZE, SHEET_SIZE), pygame.SRCALPHA)
+        for _ in range(n_sheets)
+    ]
+    index: Dict = {
+        "sheets": [f"atlas_{sheet}.png" for sheet in range(n_sheets)],
+        "sprites": [],
+    }
+    for (key, scale), sprite, (sheet, x, y) in zip(
+        keys_and_scales, sprites, placements
+    ):
+        sheets[sheet].blit(sprite, (x, y))
+        index["sprites"].append(
+            {
+                "key": key,
+                "scale": scale,
+                "sheet": sheet,
+                "rect": [x, y, *sprite.get_size()],
+            }
+        )
+
+    # Trim unused space from the bottom of the last sheet
+    used_height = max(
+        y + height + PADDING
+        for (sheet, _, y), (_, height) in zip(
+            placements, (sprite.get_size() for sprite in sprites)
+        )
+        if sheet == n_sheets - 1
+    )
+    sheets[-1] = sheets[-1].subsurface((0, 0, SHEET_SIZE, used_height))
+
+    ATLAS_INDEX_PATH.parent.mkdir(parents=True, exist_ok=True)
+    for name, sheet in zip(index["sheets"], sheets):
+        pygame.image.save(sheet, ATLAS_INDEX_PATH.parent / name)
+    ATLAS_INDEX_PATH.write_text(json.dumps(index, indent=4))
+    print(f"Packed {len(sprites)} sprites onto {n_sheets} sheet(s)")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
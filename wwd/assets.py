@@ -0,0 +1,83 @@
+"""
+Asset registry and cached sprite loading
+
+Sprites are referenced by asset key (e.g. "enemy/zombie") rather than by path, so
+that game state can refer to them without storing surfaces.
+
+If a packed atlas has been built (see tools/pack_atlas.py), sprites are handed out as
+subsurfaces of its few pre-scaled sheets, loaded once, rather than each being loaded
+and scaled from its own file.
+"""
+
+
+import json
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Tuple
+
+import pygame
+
+
+ASSETS_DIR = Path("../assets")
+ATLAS_INDEX_PATH = ASSETS_DIR / "atlas" / "atlas.json"
+
+SPRITE_PATHS = {
+    "player": "sprites/player/forward/regular.png",
+    "enemy/zombie": "sprites/enemy/zombie/regular.png",
+    "panko": "sprites/panko/regular.png",
+    "weapons/machete": "sprites/weapons/machete.png",
+    "weapons/arrow": "sprites/weapons/arrow.png",
+}
+
+
+@lru_cache(maxsize=None)
+def load_atlas(
+    index_path: Path = ATLAS_INDEX_PATH,
+) -> Dict[Tuple[str, float], pygame.Surface]:
+    """
+    Load the packed sprite atlas, caching the result
+
+    Args:
+        index_path: Path of atlas JSON index
+
+    Returns:
+        Subsurface of the atlas for each asset key and scale, empty if no atlas has
+        been built
+    """
+    if not index_path.exists():
+        return {}
+    index = json.loads(index_path.read_text())
+    sheets = [
+        pygame.image.load(index_path.parent / sheet).convert_alpha()
+        for sheet in index["sheets"]
+    ]
+    return {
+        (sprite["key"], sprite["scale"]): sheets[sprite["sheet"]].subsurface(
+            sprite["rect"]
+        )
+        for sprite in index["sprites"]
+    }
+
+
+@lru_cache(maxsize=None)
+def load_sprite(key: str, scale: float) -> pygame.Surface:
+    """
+    Load and scale a sprite, caching the result
+
+    The returned surface is shared between all callers (and may be part of the
+    atlas), so it must not be drawn on.
+
+    Args:
+        key: Asset key of sprite, from SPRITE_PATHS
+        scale: Factor to scale the sprite by
+
+    Returns:
+        Scaled sprite surface
+    """
+    atlas_sprite = load_atlas().get((key, scale))
+    if atlas_sprite is not None:
+        return atlas_sprite
+    return pygame.transform.smoothscale_by(
+        pygame.image.load(ASSETS_DIR / SPRITE_PATHS[key]).convert_alpha(),
+        scale,
+    )
@@ -0,0 +1,143 @@
+"""
+Non-blocking gameplay capture
+
+Each captured frame is blitted from the screen into one of a ring of preallocated
+surfaces of the same pixel format (a straight copy, far cheaper than converting
+pixels) and handed to a background writer thread, which converts and encodes it
+while the game carries on. If the writer falls behind and no buffer is free, the
+frame is dropped rather than stalling the game loop.
+"""
+
+
+import logging
+import queue
+import threading
+import time
+from enum import Enum
+from pathlib import Path
+
+import PIL.Image
+import pygame
+
+
+logger = logging.getLogger(__name__)
+
+
+# Number of frames that can be waiting for the writer before frames are dropped
+CAPTURE_BUFFERS = 8
+
+
+class CaptureFormat(Enum):
+    """
+    How captured frames are written
+    """
+
+    # One PNG per frame
+    PNG = "png"
+    # Frames back to back in a single file of raw 8 bit RGB pixels
+    RAW = "raw"
+
+
+class FrameCapture:
+    """
+    Captures frames to disk without blocking the game loop
+    """
+
+    def __init__(
+        self,
+        surface: pygame.Surface,
+        directory: Path,
+        capture_format: CaptureFormat = CaptureFormat.RAW,
+        n_buffers: int = CAPTURE_BUFFERS,
+    ):
+        """
+        Construct the frame capture and start its writer thread
+
+        Args:
+            surface: Surface to capture, e.g. the screen
+            directory: Directory to write to
+            capture_format: How to write frames
+            n_buffers: Number of preallocated frame buffers
+        """
+        self.width, self.height = surface.get_size()
+        self.directory = directory
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.capture_format = capture_format
+
+        # Buffers are passed between the game loop and writer by index
+        self.buffers = [
+            pygame.Surface(surface.get_size(), 0, surface) for _ in range(n_buffers)
+        ]
+        self.free: queue.Queue = queue.Queue()
+        for idx in range(n_buffers):
+            self.free.put(idx)
+        self.filled: queue.Queue = queue.Queue()
+
+        self.n_captured = 0
+        self.n_dropped = 0
+        self.n_written = 0
+        self.capture_time = 0.0
+
+        self.writer = threading.Thread(target=self.write_frames, daemon=True)
+        self.writer.start()
+        logger.info("Capturing %s frames to %s", capture_format.value, directory)
+
+    def capture(self, surface: pygame.Surface) -> None:
+        """
+        Copy a frame into a free buffer for the writer, or drop it if none is free
+
+        Args:
+            surface: Surface to capture, e.g. the screen
+        """
+        start = time.perf_counter()
+        try:
+            idx = self.free.get_nowait()
+        except queue.Empty:
+            self.n_dropped += 1
+        else:
+            self.buffers[idx].blit(surface, (0, 0))
+            self.filled.put((idx, self.n_captured))
+            self.n_captured += 1
+        self.capture_time += time.perf_counter() - start
+
+    def mean_capture_time(self) -> float:
+        """
+        Mean time the game loop has spent capturing each frame, in seconds
+        """
+        return self.capture_time / max(self.n_captured + self.n_dropped, 1)
+
+    def write_frames(self) -> None:
+        """
+        Write captured frames until stopped, returning buffers once written
+        """
+        raw_file = None
+        if self.capture_format is CaptureFormat.RAW:
+            raw_file = open(
+                self.directory / f"frames_{self.width}x{self.height}_rgb24.raw", "wb"
+            )
+        while (item := self.filled.get()) is not None:
+            idx, frame_idx = item
+            frame = pygame.image.tobytes(self.buffers[idx], "RGB")
+            self.free.put(idx)
+            if raw_file is not None:
+                raw_file.write(frame)
+            else:
+                PIL.Image.frombytes("RGB", (self.width, self.height), frame).save(
+                    self.directory / f"frame_{frame_idx:06d}.png", compress_level=1
+                )
+            self.n_written += 1
+        if raw_file is not None:
+            raw_file.close()
+
+    def stop(self) -> None:
+        """
+        Finish writing captured frames and stop the writer thread
+        """
+        self.filled.put(None)
+        self.writer.join()
+        logger.info(
+            "Capture stopped: %d frames written, %d dropped, %.3fms overhead/frame",
+            self.n_written,
+            self.n_dropped,
+            self.mean_capture_time() * 1000,
+        )
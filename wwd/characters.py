@@ -4,12 +4,13 @@ Wagga Wagga Down character classes
 
 
 from enum import Enum
-from pathlib import Path
-from typing import Dict, Iterator, Tuple
+from itertools import count
+from typing import Dict, Iterator, List, Tuple
 
 import pygame
 
-from wwd.constants import CollisionsDict
+from wwd.assets import load_sprite
+from wwd.render import RenderQueue
 from wwd.weapons import MeeleeWeapon, RangedWeapon
 
 
@@ -20,6 +21,9 @@ ENEMY_SCALE_FACTOR = 1.0
 # Movement and following
 ENEMY_FOLLOW_DIST = 800
 ENEMY_MOVE_SPEED = 100
+# Enemies further than this fraction of their follow distance from the player are
+# far, and may be updated less often
+FAR_ENEMY_FOLLOW_FRACTION = 0.5
 PANKO_MOVEMENT_SPEED = 200
 
 # Enemy starting health
@@ -56,6 +60,12 @@ class MouseButton(Enum):
 
 MOUSE_BUTTONS = {"LEFT": idx for idx, mouse_button in enumerate(MouseButton)}
 
+# Staggers the frames on which far away enemies are updated
+enemy_update_phases = count()
+
+# Identifies characters across the network
+entity_ids = count(1)
+
 
 class Character(pygame.sprite.Sprite):
     """
@@ -80,6 +90,7 @@ class Character(pygame.sprite.Sprite):
         self.max_health = max_health
         self.health = self.max_health
         self.screen = screen
+        self.entity_id = next(entity_ids)
 
     def animation_frames(self) -> Iterator[pygame.Surface]:
         """
@@ -107,7 +118,10 @@ class Character(pygame.sprite.Sprite):
         if self.health < 0:
             self.kill()
 
-        # Draw health bar
+    def draw_overlay(self, render_queue: RenderQueue) -> None:
+        """
+        Queue drawing of the character's health bar
+        """
         health_bar_left = self.pos.copy() - pygame.Vector2(
             self.rect.width / 2, 10 + self.rect.height / 2
         )
@@ -117,11 +131,11 @@ class Character(pygame.sprite.Sprite):
         )
         health_bar_right = health_bar_left.copy()
         health_bar_right.x = health_bar_left.x + self.rect.width
-        pygame.draw.line(
-            self.screen, "green", health_bar_left, health_bar_inflection_point, width=2
+        render_queue.submit_line(
+            "green", health_bar_left, health_bar_inflection_point, width=2
         )
-        pygame.draw.line(
-            self.screen, "red", health_bar_inflection_point, health_bar_right, width=2
+        render_queue.submit_line(
+            "red", health_bar_inflection_point, health_bar_right, width=2
         )
 
     def regenerate_health(self, dt: float) -> None:
@@ -137,6 +151,9 @@ class Player(Character):
     Class for player character
     """
 
+    ASSET_KEY = "player"
+    SCALE_FACTOR = PLAYER_SCALE_FACTOR
+
     def __init__(
         self,
         pos: pygame.Vector2,
@@ -147,12 +164,7 @@ class Player(Character):
         """
         Construct the player
         """
-        fwd_image = pygame.transform.smoothscale_by(
-            pygame.image.load(
-                Path("../assets/sprites/player/forward/regular.png")
-            ).convert_alpha(),
-            PLAYER_SCALE_FACTOR,
-        )
+        fwd_image = load_sprite(self.ASSET_KEY, self.SCALE_FACTOR)
         super().__init__(
             pos=pos,
             sprites={AnimationFrame.REGULAR: fwd_image},
@@ -167,7 +179,6 @@ class Player(Character):
         self,
         scroll_delta: pygame.Vector2,
         dt: float,
-        player_enemy_collisions: CollisionsDict,
         mouse_buttons: Tuple[bool],
         scroll_wheel: bool,
         keys: Tuple[bool],
@@ -175,11 +186,6 @@ class Player(Character):
         """
         Update player
         """
-        # Check collisions
-        if self in player_enemy_collisions:
-            for _ in player_enemy_collisions[self]:
-                self.health -= ENEMY_COLLISION_DAMAGE * dt
-
         # Check weapons & keypresses
         if scroll_wheel or keys[pygame.K_SPACE]:
             self.switch_weapon()
@@ -204,11 +210,54 @@ class Player(Character):
             self.active_weapon = self.meelee_weapon
 
 
+class RemotePlayer(Character):
+    """
+    Class for another player's character, controlled over the network
+    """
+
+    ASSET_KEY = "player"
+    SCALE_FACTOR = PLAYER_SCALE_FACTOR
+
+    def __init__(self, pos: pygame.Vector2, screen: pygame.Surface):
+        """
+        Construct the remote player
+        """
+        fwd_image = load_sprite(self.ASSET_KEY, self.SCALE_FACTOR)
+        super().__init__(
+            pos=pos,
+            sprites={AnimationFrame.REGULAR: fwd_image},
+            max_health=100,
+            screen=screen,
+        )
+
+    def update(
+        self,
+        scroll_delta: pygame.Vector2,
+        dt: float,
+        movement: pygame.Vector2,
+    ) -> None:
+        """
+        Update remote player
+
+        Args:
+            movement: Movement of the remote player this frame, already checked for
+                walls
+        """
+        self.pos += scroll_delta + movement
+        self.rect.center = self.pos
+
+        self.regenerate_health(dt=dt)
+        super().update()
+
+
 class Enemy(Character):
     """
     Class for enemy NPCs
     """
 
+    ASSET_KEY = "enemy/zombie"
+    SCALE_FACTOR = ENEMY_SCALE_FACTOR
+
     def __init__(
         self,
         pos: pygame.Vector2,
@@ -219,12 +268,7 @@ class Enemy(Character):
         """
         Construct the player
         """
-        fwd_image = pygame.transform.smoothscale_by(
-            pygame.image.load(
-                Path("../assets/sprites/enemy/zombie/regular.png")
-            ).convert_alpha(),
-            ENEMY_SCALE_FACTOR,
-        )
+        fwd_image = load_sprite(self.ASSET_KEY, self.SCALE_FACTOR)
         super().__init__(
             pos=pos,
             sprites={AnimationFrame.REGULAR: fwd_image},
@@ -233,19 +277,43 @@ class Enemy(Character):
         )
         self.player = player
         self.enemy_follow_distance = enemy_follow_distance
+        self.pending_dt = 0
+        self.update_phase = next(enemy_update_phases)
+        self.is_far = False
+        self.can_see_player = True
 
     def update(
         self,
         scroll_delta: pygame.Vector2,
         dt: float,
+        far_update_interval: int = 1,
     ) -> None:
         """
         Update enemy state
+
+        Args:
+            far_update_interval: Enemies far from the player only update every this
+                many frames, catching up on the time skipped
         """
         self.pos += scroll_delta
         self.rect.center = self.pos
-        if self.pos.distance_to(self.player.pos) < self.enemy_follow_distance:
-            self.pos = self.pos.move_towards(self.player.pos, ENEMY_MOVE_SPEED * dt)
+        self.pending_dt += dt
+        self.update_phase += 1
+
+        # Enemies far away when last updated just keep up with the background until
+        # their next update
+        if self.is_far and self.update_phase % far_update_interval:
+            return
+
+        player_distance = self.pos.distance_to(self.player.pos)
+        self.is_far = (
+            player_distance > self.enemy_follow_distance * FAR_ENEMY_FOLLOW_FRACTION
+        )
+        if player_distance < self.enemy_follow_distance and self.can_see_player:
+            self.pos = self.pos.move_towards(
+                self.player.pos, ENEMY_MOVE_SPEED * self.pending_dt
+            )
+        self.pending_dt = 0
         super().update()
 
 
@@ -254,6 +322,9 @@ class Pet(Character):
     Class for friendly pets
     """
 
+    ASSET_KEY = "panko"
+    SCALE_FACTOR = PLAYER_SCALE_FACTOR
+
     def __init__(
         self,
         pos: pygame.Vector2,
@@ -263,12 +334,7 @@ class Pet(Character):
         """
         Construct the player
         """
-        fwd_image = pygame.transform.smoothscale_by(
-            pygame.image.load(
-                Path("../assets/sprites/panko/regular.png")
-            ).convert_alpha(),
-            PLAYER_SCALE_FACTOR,
-        )
+        fwd_image = load_sprite(self.ASSET_KEY, self.SCALE_FACTOR)
         super().__init__(
             pos=pos,
             sprites={AnimationFrame.REGULAR: fwd_image},
@@ -280,38 +346,37 @@ class Pet(Character):
         self.player = player
         self.targeted_enemy = None
 
+        # Path around walls to the targeted enemy, in screen co-ordinates
+        self.waypoints: List[pygame.Vector2] = []
+        self.replan_timer = 0.0
+
     def update(
         self,
         scroll_delta: pygame.Vector2,
         dt: float,
-        pet_enemy_collisions: CollisionsDict,
     ) -> None:
         """
         Update player
         """
         self.regenerate_health(dt=dt)
 
-        if not self.targeted_enemy.alive():
+        if self.targeted_enemy is None or not self.targeted_enemy.alive():
             self.is_attacking = False
 
         if self.is_attacking:
-
             # Move with bg scroll
             self.pos += scroll_delta
             self.rect.center = self.pos
+            for waypoint in self.waypoints:
+                waypoint += scroll_delta
 
-            # Move towards enemy
-            self.pos.move_towards_ip(self.targeted_enemy.pos, PANKO_MOVEMENT_SPEED * dt)
-
-            if self in pet_enemy_collisions and self.is_attacking:
-                # Update damage to self
-                self.health -= (
-                    len(pet_enemy_collisions[self]) * ENEMY_COLLISION_DAMAGE * dt
-                )
-
-                # Update damage to targeted enemy
-                if self.targeted_enemy in pet_enemy_collisions[self]:
-                    self.targeted_enemy.health -= PANKO_BITE_DAMAGE * dt
+            # Move along the path towards enemy, then straight at it
+            destination = (
+                self.waypoints[0] if self.waypoints else self.targeted_enemy.pos
+            )
+            self.pos.move_towards_ip(destination, PANKO_MOVEMENT_SPEED * dt)
+            if self.waypoints and self.pos == self.waypoints[0]:
+                self.waypoints.pop(0)
 
         super().update()
 
@@ -328,3 +393,11 @@ class Pet(Character):
         """
         self.targeted_enemy = enemy
         self.is_attacking = True
+
+    def stop_attacking(self) -> None:
+        """
+        Stop attacking, e.g. when the targeted enemy is out of range
+        """
+        self.targeted_enemy = None
+        self.is_attacking = False
+        self.waypoints.clear()
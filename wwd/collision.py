@@ -0,0 +1,144 @@
+"""
+Swept movement against the walls mask
+
+A move is traced through every pixel its path crosses, in order, by stepping from
+one pixel boundary to the next along the line (a grid DDA), so no wall is skipped
+however far something moves in a frame. When the path first touches a wall, the
+rest of the move slides along it. The walls mask is kept as a flat bytes object and
+indexed directly, so moves allocate no arrays and cost one step per pixel boundary
+crossed.
+"""
+
+
+from math import floor, inf
+from typing import NamedTuple, Tuple
+
+import numpy as np
+
+
+# Gap left between a contact point and the wall it touched, in map (numpy) pixels
+CONTACT_GAP = 1e-3
+
+# Number of walls a move can slide along before stopping, e.g. in a corner
+MAX_SLIDES = 2
+
+
+class Sweep(NamedTuple):
+    """
+    Where a move first touches a wall, and how the rest of it slides along the wall
+    """
+
+    # Map (numpy) co-ordinates of the contact point, or the end of the move if it
+    # touched no wall
+    x: float
+    y: float
+    hit: bool
+    # Rest of the move along the wall, in map (numpy) pixels, zero if no wall was
+    # touched or the move was straight into it
+    slide_x: float
+    slide_y: float
+
+
+class WallCollider:
+    """
+    Traces moves through the walls mask
+    """
+
+    def __init__(self, walls: np.ndarray):
+        """
+        Construct the wall collider
+
+        Args:
+            walls: Walls mask, 255 where walkable
+        """
+        self.height, self.width = walls.shape
+        self.walkable = (walls == 255).tobytes()
+
+    def walkable_at(self, cell_x: int, cell_y: int) -> bool:
+        """
+        Check if a pixel can be walked on, pixels outside the map cannot
+        """
+        return (
+            0 <= cell_x < self.width
+            and 0 <= cell_y < self.height
+            and self.walkable[cell_y * self.width + cell_x] != 0
+        )
+
+    def sweep(self, x: float, y: float, dx: float, dy: float) -> Sweep:
+        """
+        Trace a move until it first touches a wall
+
+        Walls are ignored until the move has left any it starts inside, so
+        something stuck in a wall can walk out of it.
+
+        Args:
+            x, y: Map (numpy) co-ordinates of the start of the move
+            dx, dy: Move, in map (numpy) pixels
+
+        Returns:
+            First contact with a wall, and the rest of the move along the wall
+        """
+        cell_x, cell_y = floor(x), floor(y)
+        escaping = not self.walkable_at(cell_x, cell_y)
+
+        # Fraction of the move to the next pixel boundary on each axis, and between
+        # successive boundaries
+        step_x, step_y = (1 if dx > 0 else -1), (1 if dy > 0 else -1)
+        t_delta_x = t_next_x = t_delta_y = t_next_y = inf
+        if dx:
+            t_delta_x = abs(1 / dx)
+            t_next_x = ((cell_x + 1 - x) if dx > 0 else (x - cell_x)) * t_delta_x
+        if dy:
+            t_delta_y = abs(1 / dy)
+            t_next_y = ((cell_y + 1 - y) if dy > 0 else (y - cell_y)) * t_delta_y
+
+        while True:
+            crossed_x = t_next_x < t_next_y
+            t = t_next_x if crossed_x else t_next_y
+            if t > 1:
+                return Sweep(x + dx, y + dy, False, 0.0, 0.0)
+            if crossed_x:
+                cell_x += step_x
+                t_next_x += t_delta_x
+            else:
+                cell_y += step_y
+                t_next_y += t_delta_y
+
+            if self.walkable_at(cell_x, cell_y):
+                escaping = False
+                continue
+            if escaping:
+                continue
+
+            # Stop just short of the boundary crossed, and slide along it. The other
+            # co-ordinate is kept off its pixel boundaries too, so that the slide
+            # starts in the walkable pixel the move reached (e.g. after meeting a
+            # corner exactly) rather than in the wall beside it.
+            if crossed_x:
+                contact_x = cell_x - CONTACT_GAP if dx > 0 else cell_x + 1 + CONTACT_GAP
+                contact_y = min(
+                    max(y + dy * t, cell_y + CONTACT_GAP), cell_y + 1 - CONTACT_GAP
+                )
+                return Sweep(contact_x, contact_y, True, 0.0, dy * (1 - t))
+            contact_x = min(
+                max(x + dx * t, cell_x + CONTACT_GAP), cell_x + 1 - CONTACT_GAP
+            )
+            contact_y = cell_y - CONTACT_GAP if dy > 0 else cell_y + 1 + CONTACT_GAP
+            return Sweep(contact_x, contact_y, True, dx * (1 - t), 0.0)
+
+    def move(self, x: float, y: float, dx: float, dy: float) -> Tuple[float, float]:
+        """
+        Move as far as walls allow, sliding along any in the way
+
+        Args:
+            x, y: Map (numpy) co-ordinates of the start of the move
+            dx, dy: Move, in map (numpy) pixels
+
+        Returns:
+            Map (numpy) co-ordinates reached
+        """
+        for _ in range(MAX_SLIDES + 1):
+            x, y, hit, dx, dy = self.sweep(x, y, dx, dy)
+            if not hit or (dx == 0 and dy == 0):
+                break
+        return x, y
@@ -7,4 +7,6 @@ from typing import Dict, List
 
 import pygame
 
+BG_SCALE_FACTOR = 1.5
+
 CollisionsDict = Dict[pygame.sprite.Sprite, List[pygame.sprite.Sprite]]
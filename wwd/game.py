@@ -6,26 +6,135 @@ Main game logic
 """
 
 
+import time
 from functools import partial
+from itertools import chain
+from math import exp
 from pathlib import Path
 from random import random
-from typing import Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
 
 import numpy as np
 import PIL.Image
 import pygame
 
-from wwd.characters import Player, Enemy, Pet
-from wwd.weapons import MeeleeWeapon, RangedWeapon
+from wwd import snapshot
+from wwd.capture import CaptureFormat, FrameCapture
+from wwd.characters import (
+    ENEMY_COLLISION_DAMAGE,
+    PANKO_BITE_DAMAGE,
+    Character,
+    Player,
+    Enemy,
+    Pet,
+    RemotePlayer,
+)
+from wwd.collision import WallCollider
+from wwd.combat import CombatResolver
+from wwd.constants import BG_SCALE_FACTOR
+from wwd.crowd import CrowdSeparation
+from wwd.hud import Hud
+from wwd.map_layers import MapLayer, MapLayers
+from wwd.minimap import MINIMAP_SIZE, Minimap
+from wwd.net import (
+    EntityKind,
+    InputFlag,
+    NetClient,
+    NetHost,
+    dequantize_positions,
+)
+from wwd.particles import ParticleEffect, ParticleSystem
+from wwd.pathfinding import PathFinder
+from wwd.pipeline import FramePipeline, FrameState
+from wwd.population import PopulationManager
+from wwd.profiler import SamplingProfiler
+from wwd.pyramid import MapPyramid
+from wwd.quality import HealthBarDetail, QualityGovernor
+from wwd.raycast import RaycastEngine
+from wwd.render import RenderLayer, RenderQueue
+from wwd.scenes import Scene, SceneCache, ScenePaths
+from wwd.targeting import TargetingService
+from wwd.visibility import FogOverlay, VisibilityMap
+from wwd.weapons import DAMAGE_FALLOFF, MeeleeWeapon, RangedWeapon, Weapon
 
 
-BG_SCALE_FACTOR = 1.5
 SCROLL_DIST = 150
 HOME_X, HOME_Y = 845, 5030
 MOVEMENT_ENEMY_SPAWN_PROBABILITY = 0.05
 SPRINT_SPEED_MULTIPLIER = 2.5
 ENEMY_FOLLOW_DIST_MULTIPLIER = 0.5
 PANKO_RESPAWN_TIME = 3.0
+COMPANION_TARGET_RANGE = 600
+COMPANION_REPLAN_INTERVAL = 0.5
+TARGET_FRAME_TIME = 1 / 60
+
+# Enemy population limits
+MAX_ENEMIES = 150
+DEFAULT_AREA_ENEMY_BUDGET = 40
+AREA_ENEMY_BUDGETS = {}
+ENEMY_DESPAWN_DIST_MULTIPLIER = 1.5
+ENEMY_DESPAWN_INTERVAL = 0.5
+
+# Enemies closer than the radius are pushed apart at up to this speed
+ENEMY_SEPARATION_RADIUS = 24
+ENEMY_SEPARATION_STRENGTH = 120
+
+# Hit and death effects
+HIT_EFFECT = ParticleEffect(colour="red", radius=2, speed=60, lifetime=0.4)
+DEATH_EFFECT = ParticleEffect(colour="darkred", radius=3, speed=120, lifetime=0.8)
+HIT_PARTICLES_PER_DAMAGE = 0.2
+DEATH_PARTICLES = 30
+
+# Map assets
+BACKGROUND_PATH = Path("../assets/combined_bg.jpg")
+WALLS_PATH = Path("../assets/walls.png")
+MASKS_DIR = Path("../assets/masks")
+MAP_LAYERS_PATH = Path("../assets/map_layers.npz")
+NAV_GRAPH_PATH = Path("../assets/nav_graph.npz")
+
+# Interiors, each laid out like the overworld's assets in a directory of its own,
+# and entered from the overworld entrance regions with these IDs. Interiors are
+# left through any of their own entrance regions.
+INTERIORS_DIR = Path("../assets/interiors")
+INTERIOR_ENTRANCES = {1: "home", 2: "maccas", 3: "rules_club", 4: "bunnings"}
+# Interiors with entrances this close to the player are loaded in the background,
+# in map (numpy) pixels
+INTERIOR_PRELOAD_DIST = 1000
+
+# Saving and loading
+SAVES_DIR = Path("../saves")
+QUICKSAVE_PATH = SAVES_DIR / "quicksave.wwd"
+AUTOSAVE_PATH = SAVES_DIR / "autosave.wwd"
+AUTOSAVE_INTERVAL = 60.0
+QUICKSAVE_KEY = pygame.K_F5
+QUICKLOAD_KEY = pygame.K_F9
+
+# Zooming out and minimap
+ZOOM_LEVELS = (1.0, 0.5, 0.25)
+ZOOM_OUT_KEY = pygame.K_MINUS
+ZOOM_IN_KEY = pygame.K_EQUALS
+MINIMAP_VIEW_RADIUS = 600
+MINIMAP_MARGIN = 50
+PLAYER_DOT_COLOUR = "blue"
+PET_DOT_COLOUR = "yellow"
+ENEMY_DOT_COLOUR = "red"
+
+# Capturing gameplay
+CAPTURES_DIR = Path("../captures")
+CAPTURE_FORMAT = CaptureFormat.RAW
+CAPTURE_KEY = pygame.K_F10
+
+# Overlapping simulation and rendering
+PIPELINE_KEY = pygame.K_F11
+
+# Profiling
+PROFILES_DIR = Path("../profiles")
+PROFILE_DURATION = 10.0
+PROFILE_KEY = pygame.K_F12
+
+# HUD controls
+TOGGLE_OBJECTIVE_KEY = pygame.K_TAB
+DISMISS_DIALOGUE_KEY = pygame.K_RETURN
 
 
 class Game:
@@ -33,9 +142,19 @@ class Game:
     Highest level game class
     """
 
-    def __init__(self):
+    def __init__(
+        self,
+        host_port: Optional[int] = None,
+        host_address: Optional[Tuple[str, int]] = None,
+        pipelined: bool = False,
+    ):
         """
         Construct the game object
+
+        Args:
+            host_port: Host a co-op game, listening on this port
+            host_address: Join a co-op game at this host name and port
+            pipelined: Simulate each frame while the previous one is drawn
         """
         # Initialise game
         pygame.init()
@@ -44,25 +163,61 @@ class Game:
         self.screen = pygame.display.set_mode(self.resolution)
         # TODO: loading screen
         self.clock = pygame.time.Clock()
+        self.pipeline = FramePipeline(overlapped=pipelined)
+        self.hud = Hud(resolution=self.resolution)
+        self.governor = QualityGovernor(target_frame_time=TARGET_FRAME_TIME)
+        self.canvases: Dict[float, pygame.Surface] = {1.0: self.screen}
+        self.capture: Optional[FrameCapture] = None
+        self.profiler: Optional[SamplingProfiler] = None
 
-        # Load assets
-        self.background = pygame.transform.smoothscale_by(
-            pygame.image.load(Path("../assets/combined_bg.jpg")).convert(),
-            BG_SCALE_FACTOR,
-        )
-        self.walls = np.array(PIL.Image.open(Path("../assets/walls.png")))[
-            :, :, -1  # Mask is alpha channel
-        ]
-
-        # Initialise variables
+        # Load the overworld, and load interiors as the player nears them
+        self.zoom_idx = 0
         self.dt = 0
+        self.autosave_timer = AUTOSAVE_INTERVAL
+        self.despawn_timer = ENEMY_DESPAWN_INTERVAL
         self.center_screen = pygame.Vector2(
             self.screen.get_width() / 2, self.screen.get_height() / 2
         )
-        self.screen_pos = self.numpy_pos_to_pygame(pygame.Vector2(HOME_X, HOME_Y))
-        self.numpy_pos_ub = pygame.Vector2(
-            self.background.get_width() / BG_SCALE_FACTOR - 1,
-            self.background.get_height() / BG_SCALE_FACTOR - 1,
+        self.overworld = self.load_scene(
+            name="overworld",
+            paths=ScenePaths(
+                background=BACKGROUND_PATH,
+                walls=WALLS_PATH,
+                masks_dir=MASKS_DIR,
+                map_layers=MAP_LAYERS_PATH,
+                nav_graph=NAV_GRAPH_PATH,
+            ),
+            start=pygame.Vector2(HOME_X, HOME_Y),
+        )
+        self.scenes = SceneCache(loader=self.load_interior)
+        entrances = self.overworld.map_layers.bboxes[MapLayer.ENTRANCES]
+        self.interior_entrances = {
+            region: name
+            for region, name in INTERIOR_ENTRANCES.items()
+            if region < len(entrances)
+            and entrances[region, 0] >= 0
+            and (INTERIORS_DIR / name).is_dir()
+        }
+        self.use_scene(self.overworld)
+        self.entrance_region = self.current_region(MapLayer.ENTRANCES)
+
+        # Companion targeting
+        self.targeting = TargetingService(
+            raycaster=self.raycaster,
+            pathfinder=self.pathfinder,
+            target_range=COMPANION_TARGET_RANGE,
+        )
+
+        # Fog of war
+        self.fog = FogOverlay()
+
+        # Damage from all sources, applied together each frame
+        self.combat = CombatResolver()
+        self.particles = ParticleSystem(effects=(HIT_EFFECT, DEATH_EFFECT))
+
+        # Stop enemies stacking up
+        self.crowd = CrowdSeparation(
+            radius=ENEMY_SEPARATION_RADIUS, strength=ENEMY_SEPARATION_STRENGTH
         )
 
         # Initialise characters and groups
@@ -98,9 +253,26 @@ class Game:
             screen=self.screen,
             enemy_follow_distance=min(self.resolution) * ENEMY_FOLLOW_DIST_MULTIPLIER,
         )
-        self.enemies_group = pygame.sprite.Group(
-            self.enemy_factory(pos=self.center_screen / 2)
-        )
+        self.enemies_group.add(self.enemy_factory(pos=self.center_screen / 2))
+
+        # Co-op play. Clients only show the entities the host sends them.
+        self.remote_player_group = pygame.sprite.Group()
+        self.net_host = NetHost(host_port) if host_port is not None else None
+        self.net_client = None
+        self.net_sprites: Dict[int, Character] = {}
+        if host_address is not None:
+            self.net_client = NetClient(host_address)
+            self.panko.kill()
+            self.enemies_group.empty()
+
+        # Frame states are written by the simulation, so when overlapped the first
+        # needs writing now
+        if self.pipeline.overlapped:
+            self.prepare_frame(self.pipeline.front_frame)
+
+        # Opening scene
+        self.hud.say("Em", "Where is everyone?")
+        self.hud.set_objective("Find out where everyone went")
 
     def main_loop(self) -> None:
         """
@@ -116,101 +288,561 @@ class Game:
                     running = False
                 elif event.type == pygame.MOUSEWHEEL:
                     scroll_wheel = True
+                elif event.type == pygame.KEYDOWN and event.key == QUICKSAVE_KEY:
+                    self.save_snapshot(QUICKSAVE_PATH)
+                    self.hud.notify("Game saved")
+                elif event.type == pygame.KEYDOWN and event.key == QUICKLOAD_KEY:
+                    if QUICKSAVE_PATH.exists():
+                        self.load_snapshot(QUICKSAVE_PATH)
+                        self.hud.notify("Game loaded")
+                elif event.type == pygame.KEYDOWN and event.key == TOGGLE_OBJECTIVE_KEY:
+                    self.hud.toggle_objective()
+                elif event.type == pygame.KEYDOWN and event.key == DISMISS_DIALOGUE_KEY:
+                    self.hud.dismiss_dialogue()
+                elif event.type == pygame.KEYDOWN and event.key == ZOOM_OUT_KEY:
+                    self.zoom_idx = min(self.zoom_idx + 1, len(ZOOM_LEVELS) - 1)
+                elif event.type == pygame.KEYDOWN and event.key == ZOOM_IN_KEY:
+                    self.zoom_idx = max(self.zoom_idx - 1, 0)
+                elif event.type == pygame.KEYDOWN and event.key == CAPTURE_KEY:
+                    self.toggle_capture()
+                elif event.type == pygame.KEYDOWN and event.key == PIPELINE_KEY:
+                    self.toggle_pipelining()
+                elif event.type == pygame.KEYDOWN and event.key == PROFILE_KEY:
+                    self.toggle_profiler()
 
-            # Detect collisions (from last frame)
-            player_enemy_collisions = pygame.sprite.groupcollide(
-                groupa=self.player_group,
-                groupb=self.enemies_group,
-                dokilla=False,
-                dokillb=False,
-            )
-            weapon_enemy_collisions = pygame.sprite.groupcollide(
-                groupa=self.weapons_group,
-                groupb=self.enemies_group,
-                dokilla=False,
-                dokillb=False,
-            )
-            pet_enemy_collisions = pygame.sprite.groupcollide(
-                groupa=self.pet_group,
-                groupb=self.enemies_group,
-                dokilla=False,
-                dokillb=False,
-            )
+            # Profiles finish in the background
+            if self.profiler is not None and not self.profiler.is_alive():
+                self.profiler = None
+                self.hud.notify("Profile saved")
 
-            # Get pressed keys
+            # Simulate and draw, overlapping the two if pipelined
             keys, mouse_buttons, sprint = self.get_input()
+            if not self.pipeline.run(
+                simulate=partial(
+                    self.step,
+                    keys=keys,
+                    mouse_buttons=mouse_buttons,
+                    sprint=sprint,
+                    scroll_wheel=scroll_wheel,
+                ),
+                render=self.render_frame,
+            ):
+                running = False
 
-            # Determine player/background movements
-            scroll_delta = self.move_background(keys=keys, sprint=sprint)
+            # limits FPS to 60
+            # dt is delta time in seconds since last frame, used for framerate-
+            # independent physics.
+            self.dt = self.clock.tick(60) / 1000
 
-            # Spawn new enemies on movement
-            if scroll_delta:
-                self.spawn_enemies(scroll_delta)
+            # Adjust quality to hold frame time budget
+            self.governor.record(self.clock.get_rawtime() / 1000)
 
-            # Make Panko target the nearest enemy
-            if (
-                not self.panko.is_attacking
-                and (nearest_enemy := self.nearest_enemy()) is not None
-            ):
-                self.panko.attack(nearest_enemy)
+        if self.capture is not None:
+            self.toggle_capture()
+        self.pipeline.shutdown()
+        self.scenes.shutdown()
+        pygame.quit()
 
-            # Draw background
-            self.screen.fill("black")
-            self.screen.blit(self.background, self.screen_pos)
+    def simulate(
+        self,
+        keys: Tuple[bool],
+        mouse_buttons: Tuple[bool],
+        sprint: bool,
+        scroll_wheel: bool,
+    ) -> bool:
+        """
+        Run the simulation for a frame
 
-            # Update logic
-            self.player_group.update(
-                scroll_delta=scroll_delta,
-                dt=self.dt,
-                player_enemy_collisions=player_enemy_collisions,
+        Returns:
+            False if the game is over, True otherwise
+        """
+        # Go in or out of buildings walked into last frame, and get ready for those
+        # nearby
+        self.use_entrances()
+        self.preload_interiors()
+
+        # Save where arrows were, to check for walls after they move
+        arrows = [
+            weapon
+            for weapon in self.weapons_group
+            if isinstance(weapon, RangedWeapon) and weapon.is_attacking
+        ]
+        arrow_starts = self.sprite_positions_to_numpy(arrows)
+
+        # Determine player/background movements
+        scroll_delta = self.move_background(keys=keys, sprint=sprint)
+
+        # Periodically despawn distant enemies, whether or not the player moves
+        self.despawn_timer -= self.dt
+        if self.despawn_timer <= 0:
+            self.despawn_timer = ENEMY_DESPAWN_INTERVAL
+            self.despawn_enemies()
+
+        # Spawn new enemies on movement
+        if scroll_delta:
+            self.spawn_enemies(scroll_delta)
+
+        # Enemies only chase the player if they can see them
+        self.update_enemy_sight()
+
+        # Give companions targets
+        self.assign_companion_targets()
+        self.route_companions()
+
+        # Deal damage to everything touching (from last frame)
+        spent_weapons = self.resolve_combat()
+
+        # Update logic
+        self.player_group.update(
+            scroll_delta=scroll_delta,
+            dt=self.dt,
+            mouse_buttons=mouse_buttons,
+            scroll_wheel=scroll_wheel,
+            keys=keys,
+        )
+        self.weapons_group.update(scroll_delta=scroll_delta, dt=self.dt)
+        for weapon in spent_weapons:
+            weapon.kill_next_time = True
+        self.stop_arrows_at_walls(arrows=arrows, arrow_starts=arrow_starts)
+        self.enemies_group.update(
+            scroll_delta=scroll_delta,
+            dt=self.dt,
+            far_update_interval=self.governor.level.far_enemy_update_interval,
+        )
+        self.separate_enemies()
+        self.pet_group.update(scroll_delta=scroll_delta, dt=self.dt)
+        self.update_remote_players(scroll_delta=scroll_delta)
+        self.particles.update(self.dt)
+
+        # Pets respawning
+        if not self.panko.alive():
+            if self.panko_respawn_timer <= 0:
+                self.panko_respawn_timer = PANKO_RESPAWN_TIME
+                self.panko = self.panko_factory()
+                self.pet_group = pygame.sprite.Group(self.panko)
+            else:
+                self.panko_respawn_timer -= self.dt
+
+        # End game if player is dead
+        if not self.player.alive():
+            print("you died")
+            return False
+
+        # Periodically save progress
+        self.autosave_timer -= self.dt
+        if self.autosave_timer <= 0:
+            self.autosave_timer = AUTOSAVE_INTERVAL
+            self.save_snapshot(AUTOSAVE_PATH)
+
+        return True
+
+    def toggle_capture(self) -> None:
+        """
+        Start or stop capturing gameplay to a new, timestamped directory
+        """
+        if self.capture is None:
+            self.capture = FrameCapture(
+                surface=self.screen,
+                directory=CAPTURES_DIR / time.strftime("%Y%m%d_%H%M%S"),
+                capture_format=CAPTURE_FORMAT,
+            )
+            self.hud.notify("Capture started")
+        else:
+            self.capture.stop()
+            self.capture = None
+            self.hud.notify("Capture stopped")
+
+    def step(
+        self,
+        frame: FrameState,
+        keys: Tuple[bool],
+        mouse_buttons: Tuple[bool],
+        sprint: bool,
+        scroll_wheel: bool,
+    ) -> bool:
+        """
+        Advance the game by a frame, or sync it with the host, and record what to draw
+
+        Args:
+            frame: Frame state to write
+
+        Returns:
+            False if the game is over, True otherwise
+        """
+        if self.net_client is not None:
+            # The host runs the simulation, just show the state it sends
+            self.net_client.send_input(self.input_flags(keys=keys, sprint=sprint))
+            running = self.apply_host_states()
+        else:
+            running = self.simulate(
+                keys=keys,
                 mouse_buttons=mouse_buttons,
+                sprint=sprint,
                 scroll_wheel=scroll_wheel,
-                keys=keys,
             )
-            self.weapons_group.update(
-                scroll_delta=scroll_delta,
-                dt=self.dt,
-                weapon_enemy_collisions=weapon_enemy_collisions,
-            )
-            self.enemies_group.update(
-                scroll_delta=scroll_delta,
-                dt=self.dt,
+            if self.net_host is not None:
+                self.send_states_to_client()
+        self.prepare_frame(frame)
+        return running
+
+    def prepare_frame(self, frame: FrameState) -> None:
+        """
+        Record everything needed to draw the current state of the game
+
+        Args:
+            frame: Frame state to write
+        """
+        frame.render_queue.submit(self.player_group, RenderLayer.PLAYER)
+        frame.render_queue.submit(self.remote_player_group, RenderLayer.PLAYER)
+        frame.render_queue.submit(self.weapons_group, RenderLayer.WEAPONS)
+        frame.render_queue.submit(self.enemies_group, RenderLayer.ENEMIES)
+        frame.render_queue.submit(self.pet_group, RenderLayer.PETS)
+        self.particles.submit(
+            render_queue=frame.render_queue,
+            screen_pos=self.screen_pos,
+            layer=RenderLayer.PARTICLES,
+        )
+        self.draw_overlays(
+            render_queue=frame.render_queue,
+            health_bars=self.governor.level.health_bars,
+        )
+        frame.scene = self.scene
+        frame.screen_pos = self.screen_pos.copy()
+        frame.player_pos = self.player_pos()
+        self.visibility.update(frame.player_pos)
+        frame.visible = self.visibility.visible
+        frame.visible_origin = self.visibility.origin
+        frame.minimap_entities = [
+            (ENEMY_DOT_COLOUR, self.sprite_positions_to_numpy(self.enemies_group)),
+            (PET_DOT_COLOUR, self.sprite_positions_to_numpy(self.pet_group)),
+            (
+                PLAYER_DOT_COLOUR,
+                self.sprite_positions_to_numpy(
+                    chain(self.player_group, self.remote_player_group)
+                ),
+            ),
+        ]
+
+        frame.counters = [
+            ("HP", max(self.player.health, 0)),
+            ("Zombies", len(self.enemies_group)),
+            ("FPS", self.clock.get_fps()),
+        ]
+        if self.pipeline.overlapped:
+            frame.counters.append(("Overlap %", self.pipeline.stats.overlap() * 100))
+        if self.net_host is not None and self.net_host.connected:
+            frame.counters.append(("Sync B/s", self.net_host.stats.bandwidth()))
+            frame.counters.append(
+                ("Sync us", self.net_host.stats.mean_serialize_time() * 1e6)
             )
-            self.pet_group.update(
-                scroll_delta=scroll_delta,
-                dt=self.dt,
-                pet_enemy_collisions=pet_enemy_collisions,
+        if self.capture is not None:
+            frame.counters.append(
+                ("Capture us", self.capture.mean_capture_time() * 1e6)
             )
+            frame.counters.append(("Dropped", self.capture.n_dropped))
 
-            # Pets respawning
-            if not self.panko.alive():
-                if self.panko_respawn_timer <= 0:
-                    self.panko_respawn_timer = PANKO_RESPAWN_TIME
-                    self.panko = self.panko_factory()
-                    self.pet_group = pygame.sprite.Group(self.panko)
-                else:
-                    self.panko_respawn_timer -= self.dt
-
-            # End game if player is dead
-            if not self.player.alive():
-                print("you died")
-                running = False
+    def render_frame(self, frame: FrameState) -> None:
+        """
+        Draw a frame and put it on screen
+
+        Args:
+            frame: Frame state to draw
+        """
+        # Draw background, at reduced resolution if quality has been lowered, and
+        # zoomed out about the player
+        quality = self.governor.level
+        canvas = self.get_canvas(quality.render_scale)
+        view_scale = ZOOM_LEVELS[self.zoom_idx] * quality.render_scale
+        view_offset = (
+            self.center_screen * (1 - ZOOM_LEVELS[self.zoom_idx]) * quality.render_scale
+        )
+        canvas.fill("black")
+        canvas.blit(
+            frame.scene.pyramid.get(view_scale),
+            frame.screen_pos * view_scale + view_offset,
+        )
 
-            # Draw sprites
-            self.player_group.draw(surface=self.screen)
-            self.weapons_group.draw(surface=self.screen)
-            self.enemies_group.draw(surface=self.screen)
-            self.pet_group.draw(surface=self.screen)
+        # Draw sprites
+        frame.render_queue.flush(canvas, scale=view_scale, offset=view_offset)
+        self.fog.draw(
+            canvas,
+            visible=frame.visible,
+            origin=frame.visible_origin,
+            screen_pos=frame.screen_pos,
+            scale=view_scale,
+            offset=view_offset,
+        )
+        if canvas is not self.screen:
+            pygame.transform.scale(canvas, self.screen.get_size(), self.screen)
 
-            # flip() the display to put your work on screen
-            pygame.display.flip()
+        # Draw minimap
+        frame.scene.minimap.draw(
+            self.screen,
+            pos=(self.resolution.x - MINIMAP_SIZE - MINIMAP_MARGIN, MINIMAP_MARGIN),
+            player_pos=frame.player_pos,
+            entities=frame.minimap_entities,
+        )
 
-            # limits FPS to 60
-            # dt is delta time in seconds since last frame, used for framerate-
-            # independent physics.
-            self.dt = self.clock.tick(60) / 1000
+        # Draw HUD
+        self.hud.update(self.dt)
+        self.hud.draw(self.screen, counters=frame.counters)
 
-        pygame.quit()
+        # Record gameplay, without waiting for frames to be written
+        if self.capture is not None:
+            self.capture.capture(self.screen)
+
+        # flip() the display to put your work on screen
+        pygame.display.flip()
+
+    def toggle_profiler(self) -> None:
+        """
+        Start profiling for a while, or stop a profile early
+        """
+        if self.profiler is not None:
+            self.profiler.stop()
+            return
+        self.profiler = SamplingProfiler(
+            duration=PROFILE_DURATION,
+            path=PROFILES_DIR / time.strftime("%Y%m%d_%H%M%S"),
+            tags={
+                "enemies": len(self.enemies_group),
+                "pets": len(self.pet_group),
+                "weapons": len(self.weapons_group),
+                "remote players": len(self.remote_player_group),
+                "area": self.current_region(MapLayer.AREAS),
+                "quality": self.governor.level.name,
+                "pipelined": self.pipeline.overlapped,
+                "fps": f"{self.clock.get_fps():.0f}",
+            },
+        )
+        self.profiler.start()
+        self.hud.notify(f"Profiling for {PROFILE_DURATION:.0f}s")
+
+    def toggle_pipelining(self) -> None:
+        """
+        Switch between overlapping simulation and rendering and running them in turn
+        """
+        self.pipeline.overlapped = not self.pipeline.overlapped
+        if self.pipeline.overlapped:
+            # The first overlapped frame draws the current state
+            self.prepare_frame(self.pipeline.front_frame)
+        else:
+            # The frame simulated for the next overlapped render is never drawn, and
+            # the next frame is written into the same state
+            self.pipeline.front_frame.render_queue.clear()
+        self.hud.notify(
+            "Pipelining on" if self.pipeline.overlapped else "Pipelining off"
+        )
+
+    def draw_overlays(
+        self, render_queue: RenderQueue, health_bars: HealthBarDetail
+    ) -> None:
+        """
+        Queue drawing of health bars and weapon overlays
+
+        Args:
+            render_queue: Render queue to draw with
+            health_bars: Which characters to draw health bars for
+        """
+        if health_bars is not HealthBarDetail.NONE:
+            for character in chain(
+                self.player_group,
+                self.remote_player_group,
+                self.enemies_group,
+                self.pet_group,
+            ):
+                if (
+                    health_bars is HealthBarDetail.ALL
+                    or character.health < character.max_health
+                ):
+                    character.draw_overlay(render_queue)
+        for weapon in self.weapons_group:
+            weapon.draw_overlay(render_queue)
+
+    def get_canvas(self, render_scale: float) -> pygame.Surface:
+        """
+        Get the surface to render to at a given internal resolution
+
+        Args:
+            render_scale: Internal resolution, as a fraction of the screen resolution
+
+        Returns:
+            The screen at full resolution, otherwise an offscreen surface
+        """
+        if render_scale not in self.canvases:
+            self.canvases[render_scale] = pygame.Surface(
+                self.resolution * render_scale
+            ).convert()
+        return self.canvases[render_scale]
+
+    def save_snapshot(self, path: Path) -> None:
+        """
+        Save the simulation state to a snapshot file
+
+        Args:
+            path: Path of snapshot file
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        snapshot.write(path, snapshot.capture(self))
+
+    def load_snapshot(self, path: Path) -> None:
+        """
+        Restore the simulation state from a snapshot file
+
+        Args:
+            path: Path of snapshot file
+        """
+        # Snapshots are of the overworld
+        if self.scene is not self.overworld:
+            self.switch_scene(self.overworld)
+        snapshot.restore(self, snapshot.read(path))
+        self.entrance_region = self.current_region(MapLayer.ENTRANCES)
+
+    def load_scene(
+        self, name: str, paths: ScenePaths, start: Optional[pygame.Vector2] = None
+    ) -> Scene:
+        """
+        Load a scene's assets and build everything that depends on them
+
+        Interiors are loaded on the scene cache's worker thread, so this must not
+        change the state of the game.
+
+        Args:
+            name: Name of scene
+            paths: Asset files of scene
+            start: Map (numpy) co-ordinates the player first enters the scene at, by
+                default its first entrance region, or its centre if it has none
+
+        Returns:
+            Loaded scene
+        """
+        background = pygame.transform.smoothscale_by(
+            pygame.image.load(paths.background).convert(), BG_SCALE_FACTOR
+        )
+        pyramid = MapPyramid(background)
+        walls = np.array(PIL.Image.open(paths.walls))[:, :, -1]  # Mask is alpha
+        map_layers = MapLayers.from_assets(
+            walls=walls,
+            walls_path=paths.walls,
+            masks_dir=paths.masks_dir,
+            cache_path=paths.map_layers,
+        )
+        if start is None:
+            entrances = map_layers.bboxes[MapLayer.ENTRANCES]
+            if len(entrances) > 1 and entrances[1, 0] >= 0:
+                start = pygame.Vector2(*map_layers.centroids[MapLayer.ENTRANCES][1])
+            else:
+                start = pygame.Vector2(walls.shape[1], walls.shape[0]) / 2
+
+        return Scene(
+            name=name,
+            background=background,
+            pyramid=pyramid,
+            minimap=Minimap(pyramid=pyramid, view_radius=MINIMAP_VIEW_RADIUS),
+            walls=walls,
+            map_layers=map_layers,
+            collider=WallCollider(walls),
+            raycaster=RaycastEngine(walls),
+            visibility=VisibilityMap(
+                walls=walls, view_size=self.resolution / BG_SCALE_FACTOR
+            ),
+            pathfinder=PathFinder.from_assets(
+                walls=walls, walls_path=paths.walls, cache_path=paths.nav_graph
+            ),
+            population=PopulationManager(
+                walls=walls,
+                map_layers=map_layers,
+                max_enemies=MAX_ENEMIES,
+                default_area_budget=DEFAULT_AREA_ENEMY_BUDGET,
+                despawn_distance=self.resolution.magnitude()
+                * ENEMY_DESPAWN_DIST_MULTIPLIER
+                / BG_SCALE_FACTOR,
+                area_budgets=AREA_ENEMY_BUDGETS,
+            ),
+            screen_pos=self.numpy_pos_to_pygame(start),
+        )
+
+    def load_interior(self, name: str) -> Scene:
+        """
+        Load the interior of a building, from its directory of assets
+        """
+        return self.load_scene(name=name, paths=ScenePaths.in_dir(INTERIORS_DIR / name))
+
+    def use_scene(self, scene: Scene) -> None:
+        """
+        Play in a scene, picking up where the player left it
+        """
+        self.scene = scene
+        self.walls = scene.walls
+        self.map_layers = scene.map_layers
+        self.collider = scene.collider
+        self.raycaster = scene.raycaster
+        self.visibility = scene.visibility
+        self.pathfinder = scene.pathfinder
+        self.population = scene.population
+        self.screen_pos = scene.screen_pos.copy()
+        self.enemies_group = scene.enemies_group
+
+    def switch_scene(self, scene: Scene) -> None:
+        """
+        Leave the current scene for another, saving the state of the one left
+
+        Args:
+            scene: Scene to enter
+        """
+        self.scene.screen_pos = self.screen_pos.copy()
+        self.scene.enemies_group = self.enemies_group
+        self.use_scene(scene)
+        self.targeting.raycaster = self.raycaster
+        self.targeting.pathfinder = self.pathfinder
+
+        # Only the player and their pets come along
+        for weapon in list(self.weapons_group):
+            weapon.kill()
+        for pet in self.pet_group:
+            pet.stop_attacking()
+            pet.pos = self.center_screen + pygame.Vector2(self.player.rect.width, 0)
+            pet.rect.center = pet.pos
+        self.particles.clear()
+
+        # Players arrive on an entrance, which only works once they step off it
+        self.entrance_region = self.current_region(MapLayer.ENTRANCES)
+
+    def use_entrances(self) -> None:
+        """
+        Enter a building when the player steps onto its entrance, or leave the one
+        they are in when they step onto one of its entrances
+
+        Players in a co-op game share the overworld, so cannot enter buildings.
+        """
+        region = self.current_region(MapLayer.ENTRANCES)
+        stepped_on = region != self.entrance_region
+        self.entrance_region = region
+        if not stepped_on or not region or self.net_host is not None:
+            return
+        if self.scene is not self.overworld:
+            self.switch_scene(self.overworld)
+        elif region in self.interior_entrances:
+            self.switch_scene(self.scenes.get(self.interior_entrances[region]))
+
+    def preload_interiors(self) -> None:
+        """
+        Start loading the interiors of buildings near the player in the background
+        """
+        if self.scene is not self.overworld or not self.interior_entrances:
+            return
+        entrances = self.map_layers.centroids[MapLayer.ENTRANCES][
+            list(self.interior_entrances)
+        ]
+        near = (
+            np.linalg.norm(entrances - self.player_pos(), axis=1)
+            < INTERIOR_PRELOAD_DIST
+        )
+        self.scenes.preload(
+            name
+            for name, is_near in zip(self.interior_entrances.values(), near.tolist())
+            if is_near
+        )
 
     def player_pos(self) -> pygame.Vector2:
         """
@@ -218,6 +850,37 @@ class Game:
         """
         return self.pygame_pos_to_numpy(pos=self.screen_pos)
 
+    def current_region(self, layer: MapLayer) -> int:
+        """
+        Get the region of a map layer the player is in, e.g. the current area
+
+        Args:
+            layer: Map layer to query
+
+        Returns:
+            Region ID, 0 if the player is not in a region of that layer
+        """
+        x, y = self.player_pos()
+        return self.map_layers.region_at(layer, int(x), int(y))
+
+    @staticmethod
+    def input_flags(keys: Tuple[bool], sprint: bool) -> InputFlag:
+        """
+        Get the input state sent by clients to the host
+        """
+        flags = InputFlag(0)
+        for key, flag in (
+            (pygame.K_w, InputFlag.UP),
+            (pygame.K_a, InputFlag.LEFT),
+            (pygame.K_s, InputFlag.DOWN),
+            (pygame.K_d, InputFlag.RIGHT),
+        ):
+            if keys[key]:
+                flags |= flag
+        if sprint:
+            flags |= InputFlag.SPRINT
+        return flags
+
     def get_input(self) -> Tuple[Tuple[bool], Tuple[bool], bool]:
         """
         Get keyboard input, check for sprinting
@@ -256,127 +919,393 @@ class Game:
         if keys[pygame.K_d]:
             scroll_vector.x = -scroll_dist * self.dt
 
-        # Get position player wants to move to
-        new_pos = self.screen_pos + scroll_vector
-        new_numpy_pos = self.pygame_pos_to_numpy(new_pos)
-
-        # Clamp coordinates within borders
-        new_numpy_pos.x = pygame.math.clamp(
-            new_numpy_pos.x,
-            0,
-            self.numpy_pos_ub.x,
-        )
-        new_numpy_pos.y = pygame.math.clamp(
-            new_numpy_pos.y,
-            0,
-            self.numpy_pos_ub.y,
-        )
-
-        # Check for walls
-        if not self.can_move_to(new_numpy_pos):
-            best_effort_numpy_pos = self.best_effort_move(
-                scroll_vector=scroll_vector, new_numpy_pos=new_numpy_pos
+        # Trace the move through the walls, sliding along any in the way. The
+        # background moves the opposite way to the player.
+        numpy_pos = self.player_pos()
+        new_numpy_pos = pygame.Vector2(
+            self.collider.move(
+                numpy_pos.x,
+                numpy_pos.y,
+                -scroll_vector.x / BG_SCALE_FACTOR,
+                -scroll_vector.y / BG_SCALE_FACTOR,
             )
-            if best_effort_numpy_pos is not None:
-                new_numpy_pos = best_effort_numpy_pos
-
-        self.screen_pos = self.screen_pos.move_towards(
-            self.numpy_pos_to_pygame(new_numpy_pos), scroll_vector.magnitude()
         )
+        self.screen_pos -= (new_numpy_pos - numpy_pos) * BG_SCALE_FACTOR
 
         # Return true scroll delta
         return self.screen_pos - previous_pos
 
+    def despawn_enemies(self) -> None:
+        """
+        Despawn enemies far from the player
+        """
+        enemies = list(self.enemies_group)
+        far_enemies = self.population.far_enemies(
+            self.sprite_positions_to_numpy(enemies), self.player_pos()
+        )
+        for idx in far_enemies:
+            enemies[idx].kill()
+
     def spawn_enemies(self, scroll_delta: pygame.Vector2) -> None:
         """
-        Randomly spawn an enemy
+        Randomly spawn an enemy at the edge of the screen
         """
         if random() < MOVEMENT_ENEMY_SPAWN_PROBABILITY:
-            spawn_point = pygame.Vector2()
-            if scroll_delta.x:
-                spawn_point.x = 0 if scroll_delta.x > 0 else self.screen.get_width() - 1
-            else:
-                spawn_point.x = random() * self.screen.get_width()
-            if scroll_delta.y:
-                spawn_point.y = (
-                    0 if scroll_delta.y > 0 else self.screen.get_height() - 1
+            spawn_point = self.population.spawn_position(
+                enemy_positions=self.sprite_positions_to_numpy(self.enemies_group),
+                view_lb=self.sprite_pos_to_numpy(pygame.Vector2(0, 0)),
+                view_ub=self.sprite_pos_to_numpy(self.resolution),
+                scroll_delta=scroll_delta,
+            )
+            if spawn_point is not None:
+                self.enemies_group.add(
+                    self.enemy_factory(pos=self.numpy_pos_to_sprite(spawn_point))
                 )
+
+    def assign_companion_targets(self) -> None:
+        """
+        Assign enemies to companions in one batch, and set them attacking
+        """
+        pets = list(self.pet_group)
+        enemies = list(self.enemies_group)
+        assignments = self.targeting.assign(
+            allies=pets,
+            ally_positions=self.sprite_positions_to_numpy(pets),
+            enemies=enemies,
+            enemy_positions=self.sprite_positions_to_numpy(enemies),
+        )
+        for pet in pets:
+            if pet in assignments:
+                pet.attack(assignments[pet])
             else:
-                spawn_point.y = random() * self.screen.get_height()
-            self.enemies_group.add(self.enemy_factory(pos=spawn_point))
+                pet.stop_attacking()
+
+    def route_companions(self) -> None:
+        """
+        Every so often, plan paths around walls for companions to their targets
+        """
+        for pet in self.pet_group:
+            if not pet.is_attacking:
+                continue
+            pet.replan_timer -= self.dt
+            if pet.replan_timer > 0:
+                continue
+            pet.replan_timer = COMPANION_REPLAN_INTERVAL
+
+            start, goal = self.sprite_positions_to_numpy([pet, pet.targeted_enemy])
+            path = self.pathfinder.find_path(start, goal)
+            if path is None:
+                pet.waypoints = []
+                continue
 
-    def nearest_enemy(self) -> Optional[Enemy]:
+            # Cut straight to the furthest waypoint in sight
+            visible = np.flatnonzero(
+                self.raycaster.segments_clear(np.broadcast_to(start, path.shape), path)
+            )
+            first = visible[-1] if len(visible) else 0
+            pet.waypoints = [
+                self.numpy_pos_to_sprite(pygame.Vector2(*point))
+                for point in path[first:-1].tolist()
+            ]
+
+    def resolve_combat(self) -> List[Weapon]:
         """
-        Find the nearest enemy to the player
+        Find everything touching, deal this frame's damage from every source in one
+        pass, and kill the dead
+
+        Returns:
+            Single use weapons that hit an enemy, to be removed next frame
         """
+        players = list(chain(self.player_group, self.remote_player_group))
+        pets = list(self.pet_group)
         enemies = list(self.enemies_group)
-        if not enemies:
-            return None
-        return sorted(
-            enemies,
-            key=lambda enemy: self.center_screen.distance_to(enemy.pos),
-        )[0]
+        combatants: List[Character] = players + pets + enemies
+        first_enemy = len(players) + len(pets)
+        enemy_rects = [enemy.rect for enemy in enemies]
+
+        # Enemies hurt players they touch, and pets that are fighting them, once for
+        # each enemy touching
+        for idx, character in enumerate(chain(players, pets)):
+            if idx < len(players) or character.is_attacking:
+                n_touching = len(character.rect.collidelistall(enemy_rects))
+                if n_touching:
+                    self.combat.add_hit(
+                        idx, ENEMY_COLLISION_DAMAGE * self.dt * n_touching
+                    )
 
-    def can_move_to(self, new_numpy_position: pygame.Vector2) -> bool:
+        # Pets bite the enemy they are fighting
+        for pet in pets:
+            if (
+                pet.is_attacking
+                and pet.targeted_enemy in self.enemies_group
+                and pet.rect.colliderect(pet.targeted_enemy.rect)
+            ):
+                self.combat.add_hit(
+                    enemies.index(pet.targeted_enemy) + first_enemy,
+                    PANKO_BITE_DAMAGE * self.dt,
+                )
+
+        # Weapons hit every enemy they touch, single use weapons only the first. A
+        # weapon swept through a crowd is batched, as few hits are cheaper one by one.
+        spent_weapons = []
+        for weapon in self.weapons_group:
+            if not weapon.is_attacking or weapon.kill_next_time:
+                continue
+            hits = weapon.rect.collidelistall(enemy_rects)
+            if not hits:
+                continue
+            if weapon.single_use:
+                hits = hits[:1]
+                spent_weapons.append(weapon)
+            if len(hits) < self.combat.batch_min_hits:
+                for idx in hits:
+                    distance = enemies[idx].pos.distance_to(weapon.pos)
+                    self.combat.add_hit(
+                        idx + first_enemy,
+                        weapon.damage * exp(-distance * DAMAGE_FALLOFF),
+                    )
+            else:
+                self.combat.add_hits(
+                    targets=np.add(hits, first_enemy),
+                    damage=weapon.damage,
+                    distances=np.linalg.norm(
+                        self.sprite_positions(enemies[idx] for idx in hits)
+                        - np.asarray(weapon.pos),
+                        axis=1,
+                    ),
+                    falloff=DAMAGE_FALLOFF,
+                )
+
+        # Apply damage to those hit, killing any whose health crosses zero
+        hurt: List[Character] = []
+        hurt_damage: List[float] = []
+        dead: List[Character] = []
+        for idx, damage in self.combat.resolve():
+            combatant = combatants[idx]
+            was_alive = combatant.health >= 0
+            combatant.health -= damage
+            hurt.append(combatant)
+            hurt_damage.append(damage)
+            if was_alive and combatant.health < 0:
+                dead.append(combatant)
+
+        # Spray particles from the hurt, more for bigger hits, and burst the dead
+        if hurt:
+            effect_detail = self.governor.level.effect_detail
+            self.particles.emit(
+                effect=HIT_EFFECT,
+                positions=self.sprite_positions_to_numpy(hurt),
+                counts=np.array(hurt_damage) * HIT_PARTICLES_PER_DAMAGE * effect_detail,
+            )
+            if dead:
+                self.particles.emit(
+                    effect=DEATH_EFFECT,
+                    positions=self.sprite_positions_to_numpy(dead),
+                    counts=DEATH_PARTICLES * effect_detail,
+                )
+
+        for combatant in dead:
+            combatant.kill()
+        return spent_weapons
+
+    def update_remote_players(self, scroll_delta: pygame.Vector2) -> None:
         """
-        Check if the player can move to a desired position
+        Add or remove the client's player, and move it with the client's input
         """
-        unscaled_x, unscaled_y = new_numpy_position
-        return self.walls[int(unscaled_y), int(unscaled_x)] == 255
+        if self.net_host is None:
+            return
+        if self.net_host.poll():
+            self.remote_player_group.empty()
+            self.remote_player_group.add(
+                RemotePlayer(
+                    pos=self.center_screen - pygame.Vector2(self.player.rect.width, 0),
+                    screen=self.screen,
+                )
+            )
+        if not self.net_host.connected:
+            self.remote_player_group.empty()
+        for remote_player in self.remote_player_group:
+            remote_player.update(
+                scroll_delta=scroll_delta,
+                dt=self.dt,
+                movement=self.remote_player_movement(
+                    pos=remote_player.pos + scroll_delta,
+                    flags=self.net_host.client_input,
+                ),
+            )
 
-    def best_effort_move(
-        self,
-        scroll_vector: pygame.Vector2,
-        new_numpy_pos: pygame.Vector2,
-        scroll_scale: float = 4.0,
+    def remote_player_movement(
+        self, pos: pygame.Vector2, flags: InputFlag
     ) -> pygame.Vector2:
         """
-        Move background as far as possible in desired direction
+        Move a remote player as its input requests, sliding along walls in the way
 
         Args:
-            scroll_vector: Desired direction of movement
-            scroll_scale: Multiplier for scroll_vector - required to function correctly
-        """
-        # Extract local region of background and walls
-        move_distance = scroll_vector.magnitude() * scroll_scale / BG_SCALE_FACTOR
-        region_offset = pygame.Vector2(move_distance, move_distance)
-        region_lb = new_numpy_pos - region_offset
-        region_ub = new_numpy_pos + region_offset
-        region = self.walls[
-            (lby := int(region_lb.y)) : (uby := int(region_ub.y)),
-            (lbx := int(region_lb.x)) : (ubx := int(region_ub.x)),
-        ]
+            pos: Current position of the remote player on screen
+            flags: Remote player's input state
+
+        Returns:
+            Movement on screen this frame
+        """
+        scroll_dist = (
+            SCROLL_DIST * SPRINT_SPEED_MULTIPLIER
+            if InputFlag.SPRINT in flags
+            else SCROLL_DIST
+        )
+        movement = pygame.Vector2(
+            (InputFlag.RIGHT in flags) - (InputFlag.LEFT in flags),
+            (InputFlag.DOWN in flags) - (InputFlag.UP in flags),
+        ) * (scroll_dist * self.dt)
+        numpy_pos = self.sprite_pos_to_numpy(pos)
+        new_numpy_pos = pygame.Vector2(
+            self.collider.move(
+                numpy_pos.x,
+                numpy_pos.y,
+                movement.x / BG_SCALE_FACTOR,
+                movement.y / BG_SCALE_FACTOR,
+            )
+        )
+        return (new_numpy_pos - numpy_pos) * BG_SCALE_FACTOR
+
+    def send_states_to_client(self) -> None:
+        """
+        Send the state of all players, pets and enemies to the client
+        """
+        players = [self.player, *self.remote_player_group]
+        pets = list(self.pet_group)
+        enemies = list(self.enemies_group)
+        characters = players + pets + enemies
+        kinds = (
+            [EntityKind.HOST_PLAYER]
+            + [EntityKind.CLIENT_PLAYER] * (len(players) - 1)
+            + [EntityKind.PET] * len(pets)
+            + [EntityKind.ENEMY] * len(enemies)
+        )
+        self.net_host.send_states(
+            dt=self.dt,
+            ids=np.array([character.entity_id for character in characters]),
+            kinds=np.array(kinds),
+            positions=self.sprite_positions_to_numpy(characters),
+            health_fractions=np.array(
+                [character.health / character.max_health for character in characters]
+            ),
+        )
 
-        # Construct boolean mask of spaces player can move to
-        free_space = region == 255
+    def apply_host_states(self) -> bool:
+        """
+        Show the latest state sent by the host
 
-        # Get co-ordinates of free spaces
-        ys, xs = np.meshgrid(range(lby, uby), range(lbx, ubx))
-        ys, xs = ys[free_space.T], xs[free_space.T]
+        Returns:
+            False if the game is over for this client, True otherwise
+        """
+        states = self.net_client.receive_states()
+        if self.net_client.connection.closed:
+            print("host disconnected")
+            return False
+        if states is None:
+            return True
 
-        # Sometimes there is no possible move
-        if 0 in (len(xs), len(ys)):
-            return None
+        own = states["kind"] == EntityKind.CLIENT_PLAYER
+        if not own.any():
+            print("you died")
+            return False
+        positions = dequantize_positions(states)
+        health_fractions = states["health"] / 255
 
-        # Determine optimal space to move to
-        best_move = pygame.Vector2()
-        if scroll_vector.x == 0:  # Moving in Y only
-            if scroll_vector.y > 0:
-                best_move_idx = np.argmin(ys)
-            else:
-                best_move_idx = np.argmax(ys)
-        elif scroll_vector.y == 0:  # Moving in X only
-            if scroll_vector.x > 0:
-                best_move_idx = np.argmin(xs)
-            else:
-                best_move_idx = np.argmax(xs)
-        else:  # Moving diagonally
-            best_move_idx = np.argmax(
-                np.sqrt((xs - new_numpy_pos.x) ** 2 + (ys - new_numpy_pos.y) ** 2)
-            )
+        # This client's player stays centred, so its position moves the background
+        self.screen_pos = self.numpy_pos_to_pygame(pygame.Vector2(*positions[own][0]))
+        self.player.health = health_fractions[own][0] * self.player.max_health
 
-        best_move.x, best_move.y = xs[best_move_idx], ys[best_move_idx]
-        return best_move
+        # Everyone else is a sprite, created when first seen and killed when gone
+        for entity_id in set(self.net_sprites) - set(states["id"].tolist()):
+            self.net_sprites.pop(entity_id).kill()
+        for entity_id, kind, pos, health_fraction in zip(
+            states["id"][~own].tolist(),
+            states["kind"][~own].tolist(),
+            positions[~own].tolist(),
+            health_fractions[~own].tolist(),
+        ):
+            if entity_id not in self.net_sprites:
+                self.net_sprites[entity_id] = self.create_net_sprite(EntityKind(kind))
+            sprite = self.net_sprites[entity_id]
+            sprite.pos = self.numpy_pos_to_sprite(pygame.Vector2(pos))
+            sprite.rect.center = sprite.pos
+            sprite.health = health_fraction * sprite.max_health
+        return True
+
+    def create_net_sprite(self, kind: EntityKind) -> Character:
+        """
+        Create a sprite for an entity the host has sent, and add it to its group
+        """
+        if kind is EntityKind.HOST_PLAYER:
+            sprite = RemotePlayer(pos=pygame.Vector2(), screen=self.screen)
+            self.remote_player_group.add(sprite)
+        elif kind is EntityKind.PET:
+            sprite = self.panko_factory(pos=pygame.Vector2())
+            self.pet_group.add(sprite)
+        else:
+            sprite = self.enemy_factory(pos=pygame.Vector2())
+            self.enemies_group.add(sprite)
+        return sprite
+
+    def separate_enemies(self) -> None:
+        """
+        Push apart enemies crowding together, unless that would push them into walls
+        """
+        enemies = list(self.enemies_group)
+        positions = self.sprite_positions(enemies)
+        new_positions = positions + self.crowd.offsets(positions, self.dt)
+
+        numpy_positions = (new_positions - self.screen_pos) / BG_SCALE_FACTOR
+        xs, ys = np.floor(numpy_positions).astype(int).T
+        inside = (
+            (xs >= 0)
+            & (xs < self.walls.shape[1])
+            & (ys >= 0)
+            & (ys < self.walls.shape[0])
+        )
+        walkable = np.zeros(len(enemies), dtype=bool)
+        walkable[inside] = self.walls[ys[inside], xs[inside]] == 255
+
+        for enemy, new_pos, can_move in zip(
+            enemies, new_positions.tolist(), walkable.tolist()
+        ):
+            if can_move:
+                enemy.pos = pygame.Vector2(new_pos)
+                enemy.rect.center = enemy.pos
+
+    def update_enemy_sight(self) -> None:
+        """
+        Check which enemies within following distance can see the player
+        """
+        enemies = [
+            enemy
+            for enemy in self.enemies_group
+            if enemy.pos.distance_to(self.player.pos) < enemy.enemy_follow_distance
+        ]
+        enemy_positions = self.sprite_positions_to_numpy(enemies)
+        player_positions = np.broadcast_to(self.player_pos(), enemy_positions.shape)
+        can_see_player = self.raycaster.segments_clear(
+            enemy_positions, player_positions
+        )
+        for enemy, can_see in zip(enemies, can_see_player.tolist()):
+            enemy.can_see_player = can_see
+
+    def stop_arrows_at_walls(
+        self, arrows: List[RangedWeapon], arrow_starts: np.ndarray
+    ) -> None:
+        """
+        Kill arrows whose movement this frame took them into a wall
+
+        Args:
+            arrows: Arrows in flight at the start of the frame
+            arrow_starts: Numpy array co-ordinates of arrows at the start of the frame
+        """
+        arrow_ends = self.sprite_positions_to_numpy(arrows)
+        hits = self.raycaster.first_hits(arrow_starts, arrow_ends)
+        for arrow, hit in zip(arrows, hits.tolist()):
+            if hit <= 1 and arrow.is_attacking:
+                arrow.kill()
 
     def pygame_pos_to_numpy(self, pos: pygame.Vector2) -> pygame.Vector2:
         """
@@ -389,3 +1318,39 @@ class Game:
         Convert numpy array co-ordinates to pygame screen position
         """
         return self.center_screen - BG_SCALE_FACTOR * pos
+
+    def sprite_pos_to_numpy(self, pos: pygame.Vector2) -> pygame.Vector2:
+        """
+        Convert a sprite's position on screen to numpy array co-ordinates
+        """
+        return (pos - self.screen_pos) / BG_SCALE_FACTOR
+
+    def numpy_pos_to_sprite(self, pos: pygame.Vector2) -> pygame.Vector2:
+        """
+        Convert numpy array co-ordinates to a sprite's position on screen
+        """
+        return self.screen_pos + BG_SCALE_FACTOR * pos
+
+    def sprite_positions_to_numpy(
+        self, sprites: Iterable[pygame.sprite.Sprite]
+    ) -> np.ndarray:
+        """
+        Convert the positions of many sprites to numpy array co-ordinates
+
+        Returns:
+            Co-ordinates, shape (n, 2)
+        """
+        return (self.sprite_positions(sprites) - self.screen_pos) / BG_SCALE_FACTOR
+
+    @staticmethod
+    def sprite_positions(sprites: Iterable[pygame.sprite.Sprite]) -> np.ndarray:
+        """
+        Gather the screen positions of many sprites into an array
+
+        Returns:
+            Co-ordinates, shape (n, 2)
+        """
+        # Much faster than np.array, which treats each Vector2 as a generic sequence
+        return np.fromiter(
+            chain.from_iterable(sprite.pos for sprite in sprites), dtype=float
+        ).reshape(-1, 2)
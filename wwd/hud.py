@@ -0,0 +1,288 @@
+"""
+Heads up display and dialogue
+
+Rendering text with pygame fonts is slow, so text is never rendered every frame.
+Static strings are rendered once and kept in an LRU cache, changing numbers are drawn
+from an atlas of prerendered glyphs, and dialogue boxes are composed once when shown.
+"""
+
+
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Iterable, List, Optional, Tuple
+
+import pygame
+
+
+FONT_SIZE = 28
+DIALOGUE_FONT_SIZE = 32
+TEXT_COLOUR = "white"
+TEXT_CACHE_SIZE = 256
+
+# Characters available to glyph atlas counters
+COUNTER_GLYPHS = "0123456789.:/-% "
+
+NOTIFICATION_TIME = 3.0
+MARGIN = 10
+DIALOGUE_HEIGHT = 160
+DIALOGUE_BG_COLOUR = (0, 0, 0, 180)
+
+
+@lru_cache(maxsize=None)
+def get_font(name: Optional[str], size: int) -> pygame.font.Font:
+    """
+    Load a font, caching the result
+
+    Args:
+        name: Path to font file, or None for pygame's default font
+        size: Font size
+    """
+    return pygame.font.Font(name, size)
+
+
+class TextCache:
+    """
+    Least recently used cache of rendered text surfaces
+    """
+
+    def __init__(self, max_size: int = TEXT_CACHE_SIZE):
+        """
+        Construct the text cache
+
+        Args:
+            max_size: Maximum number of rendered strings to keep
+        """
+        self.max_size = max_size
+        self.surfaces: OrderedDict = OrderedDict()
+
+    def render(
+        self,
+        text: str,
+        font_name: Optional[str] = None,
+        size: int = FONT_SIZE,
+        colour: pygame.Color = TEXT_COLOUR,
+    ) -> pygame.Surface:
+        """
+        Get rendered text, only rendering it if it is not cached
+
+        Args:
+            text: Text to render
+            font_name: Path to font file, or None for pygame's default font
+            size: Font size
+            colour: Text colour
+
+        Returns:
+            Rendered text
+        """
+        key = (text, font_name, size, str(colour))
+        if key in self.surfaces:
+            self.surfaces.move_to_end(key)
+            return self.surfaces[key]
+        surface = get_font(font_name, size).render(text, True, colour)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_size:
+            self.surfaces.popitem(last=False)
+        return surface
+
+
+class GlyphAtlas:
+    """
+    Prerendered glyphs for drawing frequently changing text, e.g. counters
+    """
+
+    def __init__(
+        self,
+        glyphs: str = COUNTER_GLYPHS,
+        font_name: Optional[str] = None,
+        size: int = FONT_SIZE,
+        colour: pygame.Color = TEXT_COLOUR,
+    ):
+        """
+        Render each glyph once
+
+        Args:
+            glyphs: Characters to prerender
+            font_name: Path to font file, or None for pygame's default font
+            size: Font size
+            colour: Text colour
+        """
+        font = get_font(font_name, size)
+        self.glyphs = {glyph: font.render(glyph, True, colour) for glyph in glyphs}
+
+    def draw(self, surface: pygame.Surface, text: str, pos: Tuple[int, int]) -> int:
+        """
+        Draw text made of prerendered glyphs
+
+        Args:
+            surface: Surface to draw on
+            text: Text to draw, characters without glyphs are skipped
+            pos: Top left of text
+
+        Returns:
+            Width of drawn text
+        """
+        x, y = pos
+        blit_sequence = []
+        for char in text:
+            if (glyph := self.glyphs.get(char)) is not None:
+                blit_sequence.append((glyph, (x, y)))
+                x += glyph.get_width()
+        surface.blits(blit_sequence, doreturn=False)
+        return x - pos[0]
+
+
+class DialogueBox:
+    """
+    Box of dialogue from a character, composed once when created
+    """
+
+    def __init__(self, speaker: str, text: str, width: int, text_cache: TextCache):
+        """
+        Compose the dialogue box
+
+        Args:
+            speaker: Name of character speaking
+            text: What they say, wrapped to fit the box
+            width: Width of box
+            text_cache: Cache to render text with
+        """
+        self.surface = pygame.Surface((width, DIALOGUE_HEIGHT), pygame.SRCALPHA)
+        self.surface.fill(DIALOGUE_BG_COLOUR)
+        lines = [
+            text_cache.render(speaker, size=DIALOGUE_FONT_SIZE, colour="yellow")
+        ] + [
+            text_cache.render(line, size=DIALOGUE_FONT_SIZE)
+            for line in self.wrap(text, width - 2 * MARGIN)
+        ]
+        y = MARGIN
+        for line in lines:
+            self.surface.blit(line, (MARGIN, y))
+            y += line.get_height()
+
+    @staticmethod
+    def wrap(text: str, width: int) -> List[str]:
+        """
+        Split text into lines no wider than width
+        """
+        font = get_font(None, DIALOGUE_FONT_SIZE)
+        lines, line = [], ""
+        for word in text.split():
+            candidate = f"{line} {word}".strip()
+            if line and font.size(candidate)[0] > width:
+                lines.append(line)
+                line = word
+            else:
+                line = candidate
+        return lines + [line] if line else lines
+
+
+class Hud:
+    """
+    Heads up display of counters, the current objective, notifications and dialogue
+    """
+
+    def __init__(self, resolution: pygame.Vector2):
+        """
+        Construct the HUD
+
+        Args:
+            resolution: Size of screen
+        """
+        self.resolution = resolution
+        self.text_cache = TextCache()
+        self.counters = GlyphAtlas()
+        self.objective: Optional[str] = None
+        self.show_objective = True
+        self.notifications: List[List] = []
+        self.dialogue: List[DialogueBox] = []
+
+    def set_objective(self, objective: Optional[str]) -> None:
+        """
+        Set the current objective, None to clear it
+        """
+        self.objective = objective
+
+    def toggle_objective(self) -> None:
+        """
+        Show or hide the current objective
+        """
+        self.show_objective = not self.show_objective
+
+    def notify(self, text: str) -> None:
+        """
+        Briefly show a notification, e.g. "Area cleared"
+        """
+        self.notifications.append([text, NOTIFICATION_TIME])
+
+    def say(self, speaker: str, text: str) -> None:
+        """
+        Queue dialogue from a character, shown until dismissed
+        """
+        self.dialogue.append(
+            DialogueBox(
+                speaker=speaker,
+                text=text,
+                width=int(self.resolution.x) - 2 * MARGIN,
+                text_cache=self.text_cache,
+            )
+        )
+
+    def dismiss_dialogue(self) -> None:
+        """
+        Move on to the next queued dialogue
+        """
+        if self.dialogue:
+            self.dialogue.pop(0)
+
+    def update(self, dt: float) -> None:
+        """
+        Expire old notifications
+        """
+        for notification in self.notifications:
+            notification[1] -= dt
+        self.notifications = [
+            notification for notification in self.notifications if notification[1] > 0
+        ]
+
+    def draw(
+        self, surface: pygame.Surface, counters: Iterable[Tuple[str, float]]
+    ) -> None:
+        """
+        Draw the HUD
+
+        Args:
+            surface: Surface to draw on
+            counters: Label and value of each counter to show, e.g. ("HP", 100)
+        """
+        # Counters down the top left
+        y = MARGIN
+        for label, value in counters:
+            label_surface = self.text_cache.render(f"{label} ")
+            surface.blit(label_surface, (MARGIN, y))
+            self.counters.draw(
+                surface, f"{value:.0f}", (MARGIN + label_surface.get_width(), y)
+            )
+            y += label_surface.get_height()
+
+        # Objective in the top right
+        if self.objective is not None and self.show_objective:
+            objective = self.text_cache.render(f"Objective: {self.objective}")
+            surface.blit(
+                objective, (self.resolution.x - objective.get_width() - MARGIN, MARGIN)
+            )
+
+        # Notifications in the centre
+        y = self.resolution.y / 4
+        for text, _ in self.notifications:
+            notification = self.text_cache.render(text, size=DIALOGUE_FONT_SIZE)
+            surface.blit(
+                notification, ((self.resolution.x - notification.get_width()) / 2, y)
+            )
+            y += notification.get_height()
+
+        # Dialogue along the bottom
+        if self.dialogue:
+            surface.blit(
+                self.dialogue[0].surface,
+                (MARGIN, self.resolution.y - DIALOGUE_HEIGHT - MARGIN),
+            )
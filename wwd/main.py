@@ -6,9 +6,12 @@ Main game logic
 """
 
 
+import argparse
+import logging
 import sys
 
 from wwd.game import Game
+from wwd.net import DEFAULT_PORT
 
 
 def main() -> int:
@@ -18,7 +21,35 @@ def main() -> int:
     Returns:
         Exit status
     """
-    Game().main_loop()
+    parser = argparse.ArgumentParser(description="Wagga Wagga Down")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--host",
+        nargs="?",
+        const=DEFAULT_PORT,
+        type=int,
+        metavar="PORT",
+        help="host a co-op game",
+    )
+    mode.add_argument(
+        "--join", metavar="HOST[:PORT]", help="join a co-op game hosted elsewhere"
+    )
+    parser.add_argument(
+        "--pipelined",
+        action="store_true",
+        help="simulate each frame while the previous one is drawn",
+    )
+    args = parser.parse_args()
+
+    host_address = None
+    if args.join is not None:
+        host_name, _, port = args.join.partition(":")
+        host_address = (host_name, int(port) if port else DEFAULT_PORT)
+
+    logging.basicConfig(level=logging.INFO)
+    Game(
+        host_port=args.host, host_address=host_address, pipelined=args.pipelined
+    ).main_loop()
 
     return 0
 
@@ -0,0 +1,357 @@
+"""
+Multi-layer labelled map raster
+
+Each map layer (walls, doors, building entrances, enemy start points, enemy spawn
+points and area boundaries) is a PNG mask in which each pixel value is the ID of the
+region it belongs to, with 0 meaning no region. All layers are packed into a single
+indexed raster, where each pixel holds a label indexing into a table of per-layer
+region IDs. Bounding boxes and centroids of every region are precomputed, as is an
+index of point-like regions (e.g. spawn points) by the area they lie in.
+"""
+
+
+from enum import Enum
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Union
+
+import numpy as np
+import PIL.Image
+
+
+# Rows of the map processed at a time while packing, to bound memory use
+PACK_CHUNK_ROWS = 256
+
+# Bits used per layer in the packing key, so region IDs must be < 256
+REGION_ID_BITS = 8
+
+
+class MapLayer(Enum):
+    """
+    Map mask layers, valued by mask file stem
+    """
+
+    WALLS = "walls"
+    DOORS = "doors"
+    ENTRANCES = "entrances"
+    ENEMY_STARTS = "enemy_starts"
+    SPAWN_POINTS = "spawn_points"
+    AREAS = "areas"
+
+
+# Layers whose regions are small enough to be treated as points within an area
+POINT_LAYERS = (
+    MapLayer.DOORS,
+    MapLayer.ENTRANCES,
+    MapLayer.ENEMY_STARTS,
+    MapLayer.SPAWN_POINTS,
+)
+
+LABEL_TABLE_DTYPE = np.dtype([(layer.value, "u1") for layer in MapLayer])
+
+
+class MapLayers:
+    """
+    Packed, labelled map raster with precomputed region statistics
+    """
+
+    def __init__(
+        self,
+        labels: np.ndarray,
+        label_table: np.ndarray,
+        bboxes: Dict[MapLayer, np.ndarray],
+        centroids: Dict[MapLayer, np.ndarray],
+    ):
+        """
+        Construct the map layers object
+
+        Usually constructed with from_masks() or from_assets()
+
+        Args:
+            labels: Indexed raster of labels, shape (height, width)
+            label_table: Region ID of each layer for each label
+            bboxes: Per-layer (x_min, y_min, x_max, y_max) of each region, with
+                x_max, y_max exclusive, and -1 for regions with no pixels
+            centroids: Per-layer (x, y) centroid of each region
+        """
+        self.labels = labels
+        self.label_table = label_table
+        self.bboxes = bboxes
+        self.centroids = centroids
+        self.shape = labels.shape
+
+        # Index point-like regions by the area containing their centroid. Region 0
+        # is everything outside the layer's regions, so is not a point.
+        self.area_regions: Dict[MapLayer, np.ndarray] = {}
+        self.area_offsets: Dict[MapLayer, np.ndarray] = {}
+        n_areas = len(self.bboxes[MapLayer.AREAS])
+        for layer in POINT_LAYERS:
+            regions = np.flatnonzero(self.bboxes[layer][:, 0] >= 0)
+            regions = regions[regions > 0]
+            xs, ys = np.round(self.centroids[layer][regions]).astype(int).T
+            areas = self.region_at(MapLayer.AREAS, xs, ys)
+            order = np.argsort(areas, kind="stable")
+            self.area_regions[layer] = regions[order]
+            self.area_offsets[layer] = np.searchsorted(
+                areas[order], np.arange(n_areas + 1)
+            )
+
+    @classmethod
+    def from_masks(
+        cls, walls: np.ndarray, masks: Dict[MapLayer, np.ndarray]
+    ) -> "MapLayers":
+        """
+        Pack mask layers into a labelled raster
+
+        Args:
+            walls: Walls mask, 255 where walkable
+            masks: Region ID mask for each remaining layer, missing layers are empty
+
+        Returns:
+            Packed map layers
+        """
+        height, width = walls.shape
+        layers = {layer: masks.get(layer) for layer in MapLayer}
+        layers[MapLayer.WALLS] = walls
+
+        # Assign a label to each distinct combination of region IDs, a chunk at a time
+        labels = np.empty((height, width), dtype=np.uint16)
+        label_of_key: Dict[int, int] = {}
+        for row in range(0, height, PACK_CHUNK_ROWS):
+            rows = slice(row, row + PACK_CHUNK_ROWS)
+            keys = np.zeros((min(PACK_CHUNK_ROWS, height - row), width), np.uint64)
+            for layer in MapLayer:
+                keys <<= np.uint64(REGION_ID_BITS)
+                if layer is MapLayer.WALLS:
+                    keys |= (walls[rows] != 255).astype(np.uint64)
+                elif layers[layer] is not None:
+                    keys |= layers[layer][rows].astype(np.uint64)
+            chunk_keys, inverse = np.unique(keys, return_inverse=True)
+            for key in chunk_keys.tolist():
+                label_of_key.setdefault(key, len(label_of_key))
+            if len(label_of_key) > np.iinfo(labels.dtype).max:
+                raise ValueError("Too many distinct region combinations in map masks")
+            lut = np.array(
+                [label_of_key[key] for key in chunk_keys.tolist()], dtype=labels.dtype
+            )
+            labels[rows] = lut[inverse.reshape(keys.shape)]
+
+        # Decode the region IDs of each label from its key
+        label_table = np.zeros(len(label_of_key), dtype=LABEL_TABLE_DTYPE)
+        mask = (1 << REGION_ID_BITS) - 1
+        for key, label in label_of_key.items():
+            for shift, layer in enumerate(reversed(MapLayer)):
+                region = (key >> (shift * REGION_ID_BITS)) & mask
+                label_table[layer.value][label] = region
+
+        bboxes, centroids = cls._region_stats(labels, label_table)
+        return cls(labels, label_table, bboxes, centroids)
+
+    @classmethod
+    def from_assets(
+        cls, walls: np.ndarray, walls_path: Path, masks_dir: Path, cache_path: Path
+    ) -> "MapLayers":
+        """
+        Load map layers from a baked cache file, packing masks if it is out of date
+
+        Args:
+            walls: Walls mask, 255 where walkable
+            walls_path: Path walls mask was loaded from
+            masks_dir: Directory of "<layer>.png" region ID masks
+            cache_path: Baked map layers file, written if missing or stale
+
+        Returns:
+            Packed map layers
+        """
+        mask_paths = {
+            layer: path
+            for layer in MapLayer
+            if (path := masks_dir / f"{layer.value}.png").exists()
+        }
+        if cache_path.exists() and all(
+            path.stat().st_mtime < cache_path.stat().st_mtime
+            for path in (walls_path, *mask_paths.values())
+        ):
+            map_layers = cls.load(cache_path)
+            if map_layers.shape == walls.shape:
+                return map_layers
+
+        masks = {
+            layer: np.array(PIL.Image.open(path).convert("L"))
+            for layer, path in mask_paths.items()
+            if layer is not MapLayer.WALLS
+        }
+        map_layers = cls.from_masks(walls=walls, masks=masks)
+        map_layers.save(cache_path)
+        return map_layers
+
+    @classmethod
+    def load(cls, path: Path) -> "MapLayers":
+        """
+        Load baked map layers
+
+        Args:
+            path: Path to file written by save()
+
+        Returns:
+            Packed map layers
+        """
+        with np.load(path) as baked:
+            return cls(
+                labels=baked["labels"],
+                label_table=baked["label_table"],
+                bboxes={layer: baked[f"bboxes_{layer.value}"] for layer in MapLayer},
+                centroids={
+                    layer: baked[f"centroids_{layer.value}"] for layer in MapLayer
+                },
+            )
+
+    def save(self, path: Path) -> None:
+        """
+        Save baked map layers
+
+        Args:
+            path: Path to write to
+        """
+        with open(path, "wb") as baked:
+            np.savez_compressed(
+                baked,
+                labels=self.labels,
+                label_table=self.label_table,
+                **{f"bboxes_{layer.value}": self.bboxes[layer] for layer in MapLayer},
+                **{
+                    f"centroids_{layer.value}": self.centroids[layer]
+                    for layer in MapLayer
+                },
+            )
+
+    def regions_at(self, x: int, y: int) -> np.void:
+        """
+        Get the region ID of every layer at a position
+
+        Args:
+            x, y: Map (numpy) co-ordinates
+
+        Returns:
+            Row of label table, indexable by layer value
+        """
+        return self.label_table[self.labels[y, x]]
+
+    def region_at(
+        self,
+        layer: MapLayer,
+        x: Union[int, np.ndarray],
+        y: Union[int, np.ndarray],
+    ) -> Union[int, np.ndarray]:
+        """
+        Get the region ID of one layer at one or many positions
+
+        Args:
+            layer: Layer to query
+            x, y: Map (numpy) co-ordinates, scalars or arrays
+
+        Returns:
+            Region ID(s), 0 where there is no region
+        """
+        return self.label_table[layer.value][self.labels[y, x]]
+
+    def bounding_box(
+        self, layer: MapLayer, region: int
+    ) -> Optional[Tuple[int, int, int, int]]:
+        """
+        Get the bounding box of a region
+
+        Args:
+            layer: Layer of region
+            region: Region ID
+
+        Returns:
+            (x_min, y_min, x_max, y_max) with exclusive maxima, or None if the region
+            has no pixels
+        """
+        if region >= len(self.bboxes[layer]) or self.bboxes[layer][region, 0] < 0:
+            return None
+        return tuple(self.bboxes[layer][region].tolist())
+
+    def regions_in_area(self, layer: MapLayer, area: int) -> np.ndarray:
+        """
+        Get the IDs of all regions of a point layer within an area
+
+        Args:
+            layer: One of POINT_LAYERS
+            area: Area region ID, 0 for regions outside all areas
+
+        Returns:
+            Region IDs, never 0 as that is no region
+        """
+        offsets = self.area_offsets[layer]
+        if area >= len(offsets) - 1:
+            return offsets[:0]
+        return self.area_regions[layer][offsets[area] : offsets[area + 1]]
+
+    def points_in_area(self, layer: MapLayer, area: int) -> np.ndarray:
+        """
+        Get the centroids of all regions of a point layer within an area, e.g. all
+        spawn points in an area
+
+        Args:
+            layer: One of POINT_LAYERS
+            area: Area region ID, 0 for regions outside all areas
+
+        Returns:
+            Map (numpy) co-ordinates, shape (n, 2)
+        """
+        return self.centroids[layer][self.regions_in_area(layer, area)]
+
+    @staticmethod
+    def _region_stats(
+        labels: np.ndarray, label_table: np.ndarray
+    ) -> Tuple[Dict[MapLayer, np.ndarray], Dict[MapLayer, np.ndarray]]:
+        """
+        Compute bounding boxes and centroids of every region in every layer
+
+        Statistics are accumulated per label in one pass over the raster, then
+        combined into per-region statistics using the label table.
+        """
+        n_labels = len(label_table)
+        height, width = labels.shape
+        counts = np.zeros(n_labels)
+        sums = np.zeros((n_labels, 2))
+        mins = np.full((n_labels, 2), np.iinfo(np.int32).max, dtype=np.int32)
+        maxs = np.full((n_labels, 2), -1, dtype=np.int32)
+        xs = np.arange(width, dtype=np.int32)
+        for row in range(0, height, PACK_CHUNK_ROWS):
+            chunk = labels[row : row + PACK_CHUNK_ROWS]
+            chunk_labels = chunk.ravel()
+            chunk_xs = np.broadcast_to(xs, chunk.shape).ravel()
+            chunk_ys = np.repeat(
+                np.arange(row, row + len(chunk), dtype=np.int32), width
+            )
+            counts += np.bincount(chunk_labels, minlength=n_labels)
+            for axis, coords in enumerate((chunk_xs, chunk_ys)):
+                sums[:, axis] += np.bincount(
+                    chunk_labels, weights=coords, minlength=n_labels
+                )
+                np.minimum.at(mins[:, axis], chunk_labels, coords)
+                np.maximum.at(maxs[:, axis], chunk_labels, coords)
+
+        bboxes, centroids = {}, {}
+        for layer in MapLayer:
+            regions = label_table[layer.value].astype(np.intp)
+            n_regions = regions.max(initial=0) + 1
+            region_counts = np.bincount(regions, weights=counts, minlength=n_regions)
+            region_sums = np.stack(
+                [
+                    np.bincount(regions, weights=sums[:, axis], minlength=n_regions)
+                    for axis in range(2)
+                ],
+                axis=1,
+            )
+            bbox = np.full((n_regions, 4), -1, dtype=np.int32)
+            bbox[:, :2] = np.iinfo(np.int32).max
+            np.minimum.at(bbox[:, :2], regions, mins)
+            np.maximum.at(bbox[:, 2:], regions, maxs + 1)
+            bbox[region_counts == 0] = -1
+            bboxes[layer] = bbox
+            with np.errstate(invalid="ignore", divide="ignore"):
+                centroids[layer] = region_sums / region_counts[:, None]
+        return bboxes, centroids
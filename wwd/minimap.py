@@ -0,0 +1,101 @@
+"""
+Minimap widget
+
+Draws the map around the player from the appropriate level of the map pyramid, with
+a dot for each entity.
+"""
+
+
+from math import log2
+from typing import Iterable, Tuple
+
+import numpy as np
+import pygame
+
+from wwd.constants import BG_SCALE_FACTOR
+from wwd.pyramid import MapPyramid
+
+
+MINIMAP_SIZE = 240
+MINIMAP_BORDER_COLOUR = "white"
+DOT_SIZE = 4
+
+
+class Minimap:
+    """
+    Minimap of the area around the player
+    """
+
+    def __init__(
+        self,
+        pyramid: MapPyramid,
+        view_radius: float,
+        size: int = MINIMAP_SIZE,
+    ):
+        """
+        Construct the minimap
+
+        Args:
+            pyramid: Pyramid of the background, level 0 at BG_SCALE_FACTOR
+            view_radius: Distance from the player shown, in map (numpy) pixels
+            size: Width and height of the minimap, in screen pixels
+        """
+        self.size = size
+        self.surface = pygame.Surface((size, size)).convert()
+
+        # Use the pyramid level closest to showing the view radius at this size
+        self.level = max(0, round(log2(BG_SCALE_FACTOR * 2 * view_radius / size)))
+        self.pyramid = pyramid
+        self.scale = BG_SCALE_FACTOR / 2**self.level
+
+        # Build the pyramid down to the minimap's level now, rather than mid-game
+        self.pyramid.level(self.level)
+        self.dots = {}
+
+    def draw(
+        self,
+        surface: pygame.Surface,
+        pos: Tuple[int, int],
+        player_pos: pygame.Vector2,
+        entities: Iterable[Tuple[str, np.ndarray]],
+    ) -> None:
+        """
+        Draw the minimap
+
+        Args:
+            surface: Surface to draw on
+            pos: Top left of minimap on surface
+            player_pos: Map (numpy) co-ordinates of the player, at the minimap centre
+            entities: Colour and map (numpy) co-ordinates (shape (n, 2)) of each
+                group of entities to show
+        """
+        # Map around the player
+        center = pygame.Vector2(self.size / 2, self.size / 2)
+        self.surface.fill("black")
+        self.surface.blit(
+            self.pyramid.level(self.level), center - player_pos * self.scale
+        )
+
+        # Entity dots, drawn in one batch
+        blit_sequence = []
+        for colour, positions in entities:
+            dot = self.get_dot(colour)
+            dot_positions = (positions - np.asarray(player_pos)) * self.scale + (
+                center - pygame.Vector2(DOT_SIZE / 2, DOT_SIZE / 2)
+            )
+            blit_sequence.extend((dot, dot_pos) for dot_pos in dot_positions.tolist())
+        self.surface.blits(blit_sequence, doreturn=False)
+
+        surface.blit(self.surface, pos)
+        pygame.draw.rect(
+            surface, MINIMAP_BORDER_COLOUR, pygame.Rect(pos, self.surface.get_size()), 1
+        )
+
+    def get_dot(self, colour: str) -> pygame.Surface:
+        """
+        Get a dot of a given colour, creating it once
+        """
+        if colour not in self.dots:
+            self.dots[colour] = pygame.Surface((DOT_SIZE, DOT_SIZE)).convert()
+            self.dots[colour].fill(colour)
+        return self.dots[colour]
@@ -0,0 +1,562 @@
+"""
+Networked co-op state sync
+
+The host runs the simulation and sends clients the state of each entity (players,
+pets and enemies) several times a second. Each state message is delta compressed
+against the previous one: positions are quantized, only entities with changed fields
+are sent, small moves are sent as 8 bit offsets, and the message is laid out one
+column per field (with IDs sent as gaps) before being deflated. Clients send back
+their input state whenever it changes.
+
+Messages are sent over TCP, so they arrive in order and every message can be a delta
+against the one before it. That also means no message can be skipped, so a client
+that falls too far behind to keep up is disconnected rather than queued for without
+limit.
+"""
+
+
+import logging
+import socket
+import struct
+import time
+import zlib
+from collections import deque
+from enum import IntEnum, IntFlag
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_PORT = 50007
+
+# Size of position quanta, in map (numpy) pixels
+POSITION_QUANTUM = 0.25
+
+# States are sent at this rate, rather than every frame
+STATE_SEND_RATE = 20
+
+# Bandwidth and serialization time are averaged and logged at this interval
+STATS_INTERVAL = 5.0
+
+# Messages are prefixed by their length
+LENGTH_PREFIX = struct.Struct("<I")
+
+# Connections are closed if more than this many bytes are waiting to be sent
+MAX_UNSENT_BYTES = 1 << 20
+
+# Tick number, then numbers of removed and changed entities
+STATE_HEADER = struct.Struct("<IHH")
+
+# Bit flags of movement keys and sprinting
+INPUT_STATE = struct.Struct("<B")
+
+ENTITY_DTYPE = np.dtype(
+    [
+        ("id", "<u4"),
+        ("kind", "u1"),
+        ("x", "<u2"),
+        ("y", "<u2"),
+        ("health", "u1"),
+    ]
+)
+
+
+class EntityKind(IntEnum):
+    """
+    Kinds of entity synced to clients
+    """
+
+    HOST_PLAYER = 0
+    CLIENT_PLAYER = 1
+    PET = 2
+    ENEMY = 3
+
+
+class ChangedField(IntFlag):
+    """
+    Fields present for an entity in a state message
+    """
+
+    KIND = 1
+    POSITION = 2
+    POSITION_OFFSET = 4
+    HEALTH = 8
+
+
+class InputFlag(IntFlag):
+    """
+    Client input state
+    """
+
+    UP = 1
+    LEFT = 2
+    DOWN = 4
+    RIGHT = 8
+    SPRINT = 16
+
+
+def quantize_states(
+    ids: np.ndarray,
+    kinds: np.ndarray,
+    positions: np.ndarray,
+    health_fractions: np.ndarray,
+) -> np.ndarray:
+    """
+    Quantize entity states for sending
+
+    Args:
+        ids: Entity IDs, shape (n,)
+        kinds: EntityKind of each entity, shape (n,)
+        positions: Map (numpy) co-ordinates, shape (n, 2)
+        health_fractions: Health as a fraction of maximum health, shape (n,)
+
+    Returns:
+        Quantized states, sorted by ID
+    """
+    states = np.empty(len(ids), dtype=ENTITY_DTYPE)
+    states["id"] = ids
+    states["kind"] = kinds
+    quantized = np.clip(
+        np.round(np.reshape(positions, (-1, 2)) / POSITION_QUANTUM),
+        0,
+        np.iinfo(np.uint16).max,
+    )
+    states["x"], states["y"] = quantized.T
+    states["health"] = np.round(np.clip(health_fractions, 0, 1) * 255)
+    return np.sort(states, order="id")
+
+
+def dequantize_positions(states: np.ndarray) -> np.ndarray:
+    """
+    Get map (numpy) co-ordinates of quantized entity states, shape (n, 2)
+    """
+    return np.stack([states["x"], states["y"]], axis=-1) * POSITION_QUANTUM
+
+
+class StateEncoder:
+    """
+    Encodes entity states as deltas against the previously encoded states
+    """
+
+    def __init__(self):
+        """
+        Construct the state encoder
+        """
+        self.previous = np.empty(0, dtype=ENTITY_DTYPE)
+
+    def encode(self, tick: int, states: np.ndarray) -> bytes:
+        """
+        Encode a state message
+
+        Args:
+            tick: Simulation tick number
+            states: Quantized states from quantize_states
+
+        Returns:
+            Message payload
+        """
+        # Match entities to their previous states by ID
+        previous_idxs = np.searchsorted(self.previous["id"], states["id"])
+        previous_idxs = np.minimum(previous_idxs, max(len(self.previous) - 1, 0))
+        existing = np.zeros(len(states), dtype=bool)
+        if len(self.previous):
+            existing = self.previous["id"][previous_idxs] == states["id"]
+        previous = self.previous[previous_idxs] if len(self.previous) else states
+        removed = np.setdiff1d(
+            self.previous["id"], states["id"], assume_unique=True
+        ).astype("<u4")
+
+        # Work out which fields have changed
+        offsets = np.stack(
+            [
+                states["x"].astype(int) - previous["x"],
+                states["y"].astype(int) - previous["y"],
+            ],
+            axis=-1,
+        )
+        moved = offsets.any(axis=1)
+        small_move = (np.abs(offsets) <= np.iinfo(np.int8).max).all(axis=1)
+        masks = (
+            (~existing | (states["kind"] != previous["kind"])) * ChangedField.KIND
+            | (~existing | (moved & ~small_move)) * ChangedField.POSITION
+            | (existing & moved & small_move) * ChangedField.POSITION_OFFSET
+            | (~existing | (states["health"] != previous["health"]))
+            * ChangedField.HEALTH
+        ).astype("u1")
+        changed = masks != 0
+        states_changed, masks, offsets = (
+            states[changed],
+            masks[changed],
+            offsets[changed],
+        )
+
+        # One column per field, each only for the entities where it changed
+        def has(field: ChangedField) -> np.ndarray:
+            return (masks & field) != 0
+
+        body = b"".join(
+            (
+                STATE_HEADER.pack(tick, len(removed), len(states_changed)),
+                removed.tobytes(),
+                np.diff(states_changed["id"], prepend=0).astype("<u4").tobytes(),
+                masks.tobytes(),
+                states_changed["kind"][has(ChangedField.KIND)].tobytes(),
+                np.stack([states_changed["x"], states_changed["y"]], axis=-1)[
+                    has(ChangedField.POSITION)
+                ].tobytes(),
+                offsets[has(ChangedField.POSITION_OFFSET)].astype("i1").tobytes(),
+                states_changed["health"][has(ChangedField.HEALTH)].tobytes(),
+            )
+        )
+        self.previous = states
+        return zlib.compress(body)
+
+
+class StateDecoder:
+    """
+    Decodes state messages, keeping the full state of every entity
+    """
+
+    def __init__(self):
+        """
+        Construct the state decoder
+        """
+        self.states = np.empty(0, dtype=ENTITY_DTYPE)
+        self.tick = -1
+
+    def decode(self, payload: bytes) -> np.ndarray:
+        """
+        Apply a state message
+
+        Args:
+            payload: Message payload from StateEncoder.encode
+
+        Returns:
+            Full quantized states of all entities, sorted by ID
+        """
+        body = zlib.decompress(payload)
+        self.tick, n_removed, n_changed = STATE_HEADER.unpack_from(body)
+        offset = STATE_HEADER.size
+
+        def column(dtype: np.dtype, count: int) -> np.ndarray:
+            nonlocal offset
+            values = np.frombuffer(body, dtype=dtype, count=count, offset=offset)
+            offset += values.nbytes
+            return values
+
+        removed = column(np.dtype("<u4"), n_removed)
+        ids = np.cumsum(column(np.dtype("<u4"), n_changed), dtype="<u4")
+        masks = column(np.dtype("u1"), n_changed)
+
+        def has(field: ChangedField) -> np.ndarray:
+            return (masks & field) != 0
+
+        kinds = column(np.dtype("u1"), np.count_nonzero(has(ChangedField.KIND)))
+        positions = column(
+            np.dtype("<u2"), 2 * np.count_nonzero(has(ChangedField.POSITION))
+        ).reshape(-1, 2)
+        offsets = column(
+            np.dtype("i1"), 2 * np.count_nonzero(has(ChangedField.POSITION_OFFSET))
+        ).reshape(-1, 2)
+        health = column(np.dtype("u1"), np.count_nonzero(has(ChangedField.HEALTH)))
+
+        # Drop removed entities, and add new ones
+        states = self.states[~np.isin(self.states["id"], removed)]
+        new_ids = np.setdiff1d(ids, states["id"])
+        new_states = np.zeros(len(new_ids), dtype=ENTITY_DTYPE)
+        new_states["id"] = new_ids
+        states = np.concatenate([states, new_states])
+        states.sort(order="id")
+
+        # Apply changed fields
+        idxs = np.searchsorted(states["id"], ids)
+        states["kind"][idxs[has(ChangedField.KIND)]] = kinds
+        states["x"][idxs[has(ChangedField.POSITION)]] = positions[:, 0]
+        states["y"][idxs[has(ChangedField.POSITION)]] = positions[:, 1]
+        offset_idxs = idxs[has(ChangedField.POSITION_OFFSET)]
+        states["x"][offset_idxs] = states["x"][offset_idxs] + offsets[:, 0]
+        states["y"][offset_idxs] = states["y"][offset_idxs] + offsets[:, 1]
+        states["health"][idxs[has(ChangedField.HEALTH)]] = health
+        self.states = states
+        return states
+
+
+class NetStats:
+    """
+    Rolling bandwidth and serialization time of sent state messages
+    """
+
+    def __init__(self, interval: float = STATS_INTERVAL):
+        """
+        Construct the stats
+
+        Args:
+            interval: Time over which stats are averaged and logged, in seconds
+        """
+        self.interval = interval
+        self.ticks: deque = deque()
+        self.last_logged = time.perf_counter()
+
+    def record(self, n_bytes: int, serialize_time: float) -> None:
+        """
+        Record a sent state message, logging stats once per interval
+
+        Args:
+            n_bytes: Size of message, including framing
+            serialize_time: Time taken to quantize and encode the message, in seconds
+        """
+        now = time.perf_counter()
+        self.ticks.append((now, n_bytes, serialize_time))
+        while self.ticks[0][0] < now - self.interval:
+            self.ticks.popleft()
+        if now - self.last_logged >= self.interval:
+            self.last_logged = now
+            logger.info(
+                "State sync: %.2f KB/s, %.0f bytes/tick, %.3fms serialization/tick",
+                self.bandwidth() / 1000,
+                self.mean_tick_bytes(),
+                self.mean_serialize_time() * 1000,
+            )
+
+    def bandwidth(self) -> float:
+        """
+        Mean bytes sent per second
+        """
+        return sum(n_bytes for _, n_bytes, _ in self.ticks) / self.interval
+
+    def mean_tick_bytes(self) -> float:
+        """
+        Mean bytes sent per tick
+        """
+        return sum(n_bytes for _, n_bytes, _ in self.ticks) / max(len(self.ticks), 1)
+
+    def mean_serialize_time(self) -> float:
+        """
+        Mean serialization time per tick, in seconds
+        """
+        return sum(t for _, _, t in self.ticks) / max(len(self.ticks), 1)
+
+
+def encode_input(flags: InputFlag) -> bytes:
+    """
+    Encode a client's input state
+    """
+    return INPUT_STATE.pack(flags)
+
+
+def decode_input(payload: bytes) -> InputFlag:
+    """
+    Decode a client's input state
+    """
+    return InputFlag(INPUT_STATE.unpack(payload)[0])
+
+
+class Connection:
+    """
+    Non-blocking, length prefixed messages over a TCP socket
+    """
+
+    def __init__(self, sock: socket.socket, max_unsent: int = MAX_UNSENT_BYTES):
+        """
+        Construct the connection
+
+        Args:
+            sock: Connected socket
+            max_unsent: Close the connection if more than this many bytes are
+                waiting to be sent, as the other end is not keeping up
+        """
+        self.sock = sock
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock.setblocking(False)
+        self.max_unsent = max_unsent
+        self.received = bytearray()
+        self.unsent = bytearray()
+        self.closed = False
+
+    def send(self, payload: bytes) -> int:
+        """
+        Queue a message and send as much as possible without blocking, closing the
+        connection if too much is left queued
+
+        Returns:
+            Size of message, including framing
+        """
+        message = LENGTH_PREFIX.pack(len(payload)) + payload
+        if self.closed:
+            return len(message)
+        self.unsent += message
+        try:
+            sent = self.sock.send(self.unsent)
+        except BlockingIOError:
+            sent = 0
+        except OSError:
+            self.close()
+            sent = 0
+        del self.unsent[:sent]
+        if len(self.unsent) > self.max_unsent:
+            logger.warning(
+                "Closing connection with %d bytes unsent, the other end is not "
+                "keeping up",
+                len(self.unsent),
+            )
+            self.close()
+        return len(message)
+
+    def receive(self) -> List[bytes]:
+        """
+        Receive all complete messages that have arrived, without blocking
+        """
+        while not self.closed:
+            try:
+                data = self.sock.recv(1 << 16)
+            except BlockingIOError:
+                break
+            except OSError:
+                data = b""
+            if not data:
+                self.close()
+            self.received += data
+
+        messages = []
+        while len(self.received) >= LENGTH_PREFIX.size:
+            (length,) = LENGTH_PREFIX.unpack_from(self.received)
+            if len(self.received) < LENGTH_PREFIX.size + length:
+                break
+            messages.append(
+                bytes(self.received[LENGTH_PREFIX.size : LENGTH_PREFIX.size + length])
+            )
+            del self.received[: LENGTH_PREFIX.size + length]
+        return messages
+
+    def close(self) -> None:
+        """
+        Close the connection
+        """
+        self.closed = True
+        self.unsent.clear()
+        self.sock.close()
+
+
+class NetHost:
+    """
+    Accepts a client and sends it entity states
+    """
+
+    def __init__(self, port: int = DEFAULT_PORT):
+        """
+        Construct the host, listening on all interfaces
+
+        Args:
+            port: TCP port to listen on
+        """
+        self.listener = socket.create_server(("", port))
+        self.listener.setblocking(False)
+        self.connection: Optional[Connection] = None
+        self.encoder = StateEncoder()
+        self.stats = NetStats()
+        self.tick = 0
+        self.send_timer = 0.0
+        self.client_input = InputFlag(0)
+        logger.info("Hosting on port %d", port)
+
+    @property
+    def connected(self) -> bool:
+        """
+        Whether a client is connected
+        """
+        return self.connection is not None and not self.connection.closed
+
+    def poll(self) -> bool:
+        """
+        Accept a new client, drop a disconnected one, and read client input
+
+        Returns:
+            True if a new client has connected
+        """
+        new_client = False
+        if self.connection is not None and self.connection.closed:
+            logger.info("Client disconnected")
+            self.connection = None
+        if self.connection is None:
+            try:
+                sock, address = self.listener.accept()
+            except BlockingIOError:
+                return False
+            logger.info("Client connected from %s:%d", *address[:2])
+            self.connection = Connection(sock)
+            self.encoder = StateEncoder()
+            self.client_input = InputFlag(0)
+            new_client = True
+        for message in self.connection.receive():
+            self.client_input = decode_input(message)
+        return new_client
+
+    def send_states(
+        self,
+        dt: float,
+        ids: np.ndarray,
+        kinds: np.ndarray,
+        positions: np.ndarray,
+        health_fractions: np.ndarray,
+    ) -> None:
+        """
+        Send entity states to the client, if one is connected and one is due
+
+        Args:
+            dt: Time since last call, in seconds
+            ids, kinds, positions, health_fractions: As for quantize_states
+        """
+        self.tick += 1
+        self.send_timer -= dt
+        if not self.connected or self.send_timer > 0:
+            return
+        self.send_timer += 1 / STATE_SEND_RATE
+        self.send_timer = max(self.send_timer, 0)
+
+        start = time.perf_counter()
+        payload = self.encoder.encode(
+            self.tick, quantize_states(ids, kinds, positions, health_fractions)
+        )
+        serialize_time = time.perf_counter() - start
+        self.stats.record(self.connection.send(payload), serialize_time)
+
+
+class NetClient:
+    """
+    Sends input to a host and receives entity states
+    """
+
+    def __init__(self, address: Tuple[str, int]):
+        """
+        Construct the client, connecting to a host
+
+        Args:
+            address: Host name and port of host
+        """
+        self.connection = Connection(socket.create_connection(address))
+        self.decoder = StateDecoder()
+        self.sent_input: Optional[InputFlag] = None
+        logger.info("Connected to %s:%d", *address)
+
+    def send_input(self, flags: InputFlag) -> None:
+        """
+        Send input state to the host, if it has changed
+        """
+        if flags != self.sent_input:
+            self.connection.send(encode_input(flags))
+            self.sent_input = flags
+
+    def receive_states(self) -> Optional[np.ndarray]:
+        """
+        Apply all state messages received since the last call
+
+        Returns:
+            Latest full quantized states, None if no new messages have arrived
+        """
+        states = None
+        for message in self.connection.receive():
+            states = self.decoder.decode(message)
+        return states
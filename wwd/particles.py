@@ -0,0 +1,174 @@
+"""
+Pooled particle effects
+
+Particles live in fixed-capacity NumPy arrays of position, velocity, lifetime and
+effect, and are moved, aged and culled in one vectorised pass a frame. Each is drawn
+as one of a handful of small images baked up front, one per effect per fade step, so
+drawing them is just more draws for the batched render queue. Once the particle
+budget is used up, new particles are dropped.
+"""
+
+
+from typing import NamedTuple, Sequence, Union
+
+import numpy as np
+import pygame
+
+from wwd.constants import BG_SCALE_FACTOR
+from wwd.render import RenderQueue
+
+
+# Hard limit on live particles
+MAX_PARTICLES = 2000
+
+# Number of increasingly transparent images each effect fades through
+FADE_STEPS = 4
+
+# Fraction of velocity kept after a second, so bursts slow down as they fade
+DRAG = 0.05
+
+
+class ParticleEffect(NamedTuple):
+    """
+    How the particles of an effect look and move
+    """
+
+    colour: str
+    # Radius of particles, in screen pixels
+    radius: int
+    # Initial speed of particles, in map (numpy) pixels per second
+    speed: float
+    # Longest a particle lasts, in seconds
+    lifetime: float
+
+
+class ParticleSystem:
+    """
+    Fixed-capacity pool of particles, updated and drawn in batches
+    """
+
+    def __init__(
+        self, effects: Sequence[ParticleEffect], capacity: int = MAX_PARTICLES
+    ):
+        """
+        Construct the particle system
+
+        Args:
+            effects: Effects that can be emitted, referred to by index
+            capacity: Hard limit on live particles
+        """
+        self.effects = list(effects)
+        self.capacity = capacity
+        self.speeds = np.array([effect.speed for effect in effects])
+        self.max_lifetimes = np.array([effect.lifetime for effect in effects])
+
+        # Live particles are packed at the start of each array
+        self.n_alive = 0
+        self.positions = np.zeros((capacity, 2))
+        self.velocities = np.zeros((capacity, 2))
+        self.lifetimes = np.zeros(capacity)
+        self.effect_idxs = np.zeros(capacity, dtype=np.intp)
+        self.n_dropped = 0
+        self.rng = np.random.default_rng()
+
+        # Images of each effect, from opaque to nearly transparent
+        self.images = []
+        for effect in effects:
+            for step in range(FADE_STEPS):
+                image = pygame.Surface((2 * effect.radius,) * 2, pygame.SRCALPHA)
+                colour = pygame.Color(effect.colour)
+                colour.a = round(255 * (FADE_STEPS - step) / FADE_STEPS)
+                pygame.draw.circle(image, colour, (effect.radius,) * 2, effect.radius)
+                self.images.append(image)
+
+    def emit(
+        self,
+        effect: ParticleEffect,
+        positions: np.ndarray,
+        counts: Union[float, np.ndarray],
+    ) -> None:
+        """
+        Emit bursts of particles, dropping any over the particle budget
+
+        Args:
+            effect: Effect to emit, one of those the system was constructed with
+            positions: Map (numpy) co-ordinates of each burst, shape (n, 2)
+            counts: Mean number of particles in each burst. Fractions are rounded
+                up or down at random, so many small bursts emit the right total.
+        """
+        positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+        counts = np.floor(
+            np.broadcast_to(counts, len(positions)) + self.rng.random(len(positions))
+        ).astype(np.intp)
+        effect_idx = self.effects.index(effect)
+        origins = np.repeat(positions, counts, axis=0)
+        n_free = self.capacity - self.n_alive
+        self.n_dropped += max(len(origins) - n_free, 0)
+        origins = origins[:n_free]
+        new = slice(self.n_alive, self.n_alive + len(origins))
+        self.n_alive += len(origins)
+
+        # Scatter in random directions, at up to the effect's speed
+        angles = self.rng.uniform(0, 2 * np.pi, len(origins))
+        speeds = self.speeds[effect_idx] * self.rng.uniform(0.3, 1, len(origins))
+        self.positions[new] = origins
+        self.velocities[new, 0] = np.cos(angles) * speeds
+        self.velocities[new, 1] = np.sin(angles) * speeds
+        self.lifetimes[new] = self.max_lifetimes[effect_idx] * self.rng.uniform(
+            0.5, 1, len(origins)
+        )
+        self.effect_idxs[new] = effect_idx
+
+    def update(self, dt: float) -> None:
+        """
+        Move and age particles, removing those that have faded out
+
+        Args:
+            dt: Time step, in seconds
+        """
+        alive = slice(0, self.n_alive)
+        self.positions[alive] += self.velocities[alive] * dt
+        self.velocities[alive] *= DRAG**dt
+        self.lifetimes[alive] -= dt
+
+        # Pack surviving particles at the start of the arrays
+        keep = np.flatnonzero(self.lifetimes[alive] > 0)
+        if len(keep) < self.n_alive:
+            for array in (
+                self.positions,
+                self.velocities,
+                self.lifetimes,
+                self.effect_idxs,
+            ):
+                array[: len(keep)] = array[keep]
+            self.n_alive = len(keep)
+
+    def clear(self) -> None:
+        """
+        Remove all particles, e.g. when the scene changes
+        """
+        self.n_alive = 0
+
+    def submit(
+        self, render_queue: RenderQueue, screen_pos: pygame.Vector2, layer: int
+    ) -> None:
+        """
+        Queue drawing of all live particles
+
+        Args:
+            render_queue: Render queue to submit to
+            screen_pos: Position of the map origin on screen
+            layer: Layer to draw particles on
+        """
+        alive = slice(0, self.n_alive)
+        effect_idxs = self.effect_idxs[alive]
+        remaining = self.lifetimes[alive] / self.max_lifetimes[effect_idxs]
+        fade_steps = np.minimum(
+            (FADE_STEPS * (1 - remaining)).astype(np.intp), FADE_STEPS - 1
+        )
+        render_queue.submit_images(
+            images=self.images,
+            image_idxs=effect_idxs * FADE_STEPS + fade_steps,
+            centres=self.positions[alive] * BG_SCALE_FACTOR + tuple(screen_pos),
+            layer=layer,
+        )
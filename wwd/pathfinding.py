@@ -0,0 +1,744 @@
+"""
+Hierarchical (HPA*) pathfinding over the walls mask
+
+The walls mask is far too large to search directly, so it is reduced to a grid of
+navigation cells, which is split into square clusters. Wherever two neighbouring
+clusters have walkable cells facing each other across their shared edge, an
+entrance is placed in the middle of each run of such cells. Path costs between the
+entrances of each cluster are precomputed, giving a small abstract graph which can
+be baked to disk.
+
+Long paths are found by searching the abstract graph, and only the legs out of the
+starting cluster and into the goal cluster are refined to individual cells.
+Followers re-plan as they go, so the rest of the route is refined locally when they
+reach it. Routes through the abstract graph are kept in an LRU cache by start and
+goal cluster.
+
+Walkable cells are also labelled by the connected region they are in, so whether two
+positions are joined by any path at all can be checked without searching.
+"""
+
+
+from collections import OrderedDict
+from heapq import heapify, heappop, heappush
+from math import sqrt
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+import numpy as np
+
+
+# Size of navigation cells, in map (numpy) pixels. Cells are walkable if every pixel
+# in them is.
+CELL_SIZE = 8
+
+# Width and height of clusters, in cells
+CLUSTER_SIZE = 16
+
+# Runs of open cells between clusters at least this long get an entrance at each end
+LONG_ENTRANCE_LENGTH = 6
+
+# Number of routes through the abstract graph kept
+ROUTE_CACHE_SIZE = 256
+
+# Distance searched for a walkable cell when a position is in a wall, in cells
+SNAP_RADIUS = 2
+
+DIAGONAL_COST = sqrt(2)
+
+# Row offset, column offset and cost of each move to a neighbouring cell
+NEIGHBOUR_MOVES = tuple(
+    (d_row, d_col, DIAGONAL_COST if d_row and d_col else 1.0)
+    for d_row in (-1, 0, 1)
+    for d_col in (-1, 0, 1)
+    if d_row or d_col
+)
+
+Cell = Tuple[int, int]
+
+
+def octile_distance(a: Cell, b: Cell) -> float:
+    """
+    Cost of the shortest path between two cells with no walls in the way
+    """
+    d_row, d_col = abs(a[0] - b[0]), abs(a[1] - b[1])
+    return max(d_row, d_col) + (DIAGONAL_COST - 1) * min(d_row, d_col)
+
+
+def entrance_positions(
+    open_: np.ndarray, cluster_size: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Place entrances along runs of open cells down the columns of a grid, with runs
+    broken at cluster boundaries
+
+    Short runs get one entrance in the middle, and long runs one at each end, so
+    paths can pass through either end of wide openings without a detour.
+
+    Args:
+        open_: Open cells, shape (n_rows, n_cols)
+        cluster_size: Rows per cluster
+
+    Returns:
+        Row and column of each entrance
+    """
+    starts_boundary = (np.arange(len(open_)) % cluster_size == 0)[:, None]
+    ends_boundary = (np.arange(1, len(open_) + 1) % cluster_size == 0)[:, None]
+    closed_row = np.zeros((1, open_.shape[1]), dtype=bool)
+    before = np.concatenate([closed_row, open_[:-1]])
+    after = np.concatenate([open_[1:], closed_row])
+    starts = open_ & (~before | starts_boundary)
+    ends = open_ & (~after | ends_boundary)
+
+    # Column major order pairs each start with its end
+    cols, start_rows = np.nonzero(starts.T)
+    _, end_rows = np.nonzero(ends.T)
+    long = end_rows - start_rows + 1 >= LONG_ENTRANCE_LENGTH
+    rows = np.concatenate(
+        [((start_rows + end_rows) // 2)[~long], start_rows[long], end_rows[long]]
+    )
+    return rows, np.concatenate([cols[~long], cols[long], cols[long]])
+
+
+def connected_components(walkable: np.ndarray) -> np.ndarray:
+    """
+    Label the connected regions of walkable cells
+
+    Moves may not cut wall corners, so diagonal neighbours are only connected
+    through an orthogonal one, and regions are 4-connected. Each region is labelled
+    by its lowest cell index, found by repeatedly hooking the label of one end of
+    every edge between differently labelled cells to the lower label of the other,
+    then following labels to their roots. This takes a handful of rounds even on
+    long winding regions.
+
+    Args:
+        walkable: Walkable cells, shape (n_rows, n_cols)
+
+    Returns:
+        Region label of each cell, -1 where not walkable, shape (n_rows, n_cols)
+    """
+    cell_idxs = np.arange(walkable.size).reshape(walkable.shape)
+    right = walkable[:, :-1] & walkable[:, 1:]
+    down = walkable[:-1] & walkable[1:]
+    a = np.concatenate([cell_idxs[:, :-1][right], cell_idxs[:-1][down]])
+    b = np.concatenate([cell_idxs[:, 1:][right], cell_idxs[1:][down]])
+
+    labels = cell_idxs.ravel()
+    while True:
+        label_a, label_b = labels[a], labels[b]
+        differ = label_a != label_b
+        if not differ.any():
+            return np.where(walkable, labels.reshape(walkable.shape), -1)
+        a, b, label_a, label_b = a[differ], b[differ], label_a[differ], label_b[differ]
+        np.minimum.at(
+            labels, np.maximum(label_a, label_b), np.minimum(label_a, label_b)
+        )
+        while True:
+            roots = labels[labels]
+            if np.array_equal(roots, labels):
+                break
+            labels = roots
+
+
+class PathFinder:
+    """
+    Hierarchical pathfinding over a coarse grid of navigation cells
+    """
+
+    def __init__(
+        self,
+        walkable: np.ndarray,
+        node_cells: np.ndarray,
+        edge_nodes: np.ndarray,
+        edge_costs: np.ndarray,
+        cell_size: int = CELL_SIZE,
+        cluster_size: int = CLUSTER_SIZE,
+    ):
+        """
+        Construct the path finder
+
+        Usually constructed with from_walls() or from_assets()
+
+        Args:
+            walkable: Walkable navigation cells, shape (n_rows, n_cols), both
+                multiples of cluster_size
+            node_cells: Row and column of each cluster entrance, shape (n, 2)
+            edge_nodes: Pairs of entrances joined by an edge, shape (m, 2)
+            edge_costs: Cost of each edge, in cells, shape (m,)
+            cell_size: Size of navigation cells, in map (numpy) pixels
+            cluster_size: Width and height of clusters, in cells
+        """
+        self.walkable = walkable
+        self.node_cells = node_cells
+        self.edge_nodes = edge_nodes
+        self.edge_costs = edge_costs
+        self.cell_size = cell_size
+        self.cluster_size = cluster_size
+        self.n_cluster_cols = walkable.shape[1] // cluster_size
+
+        # Entrances of each cluster, sorted by cluster
+        node_clusters = self.cluster_of(node_cells[:, 0], node_cells[:, 1])
+        order = np.argsort(node_clusters, kind="stable")
+        self.cluster_nodes = order
+        self.cluster_offsets = np.searchsorted(
+            node_clusters[order], np.arange(walkable.size // cluster_size**2 + 1)
+        )
+
+        self.adjacency: List[List[Tuple[int, float]]] = [[] for _ in node_cells]
+        for (a, b), cost in zip(edge_nodes.tolist(), edge_costs.tolist()):
+            self.adjacency[a].append((b, cost))
+            self.adjacency[b].append((a, cost))
+        self.node_cell_tuples: List[Cell] = [
+            tuple(cell) for cell in node_cells.tolist()
+        ]
+        self.routes: OrderedDict = OrderedDict()
+        self.components = connected_components(walkable)
+
+    @classmethod
+    def from_walls(
+        cls,
+        walls: np.ndarray,
+        cell_size: int = CELL_SIZE,
+        cluster_size: int = CLUSTER_SIZE,
+    ) -> "PathFinder":
+        """
+        Build the navigation grid and abstract graph from the walls mask
+
+        Args:
+            walls: Walls mask, 255 where walkable
+            cell_size: Size of navigation cells, in map (numpy) pixels
+            cluster_size: Width and height of clusters, in cells
+
+        Returns:
+            Path finder
+        """
+        # Cells are walkable if all their pixels are, with the edges padded by walls
+        height, width = walls.shape
+        n_rows, n_cols = cls.grid_shape(walls.shape, cell_size, cluster_size)
+        blocked = np.ones((n_rows * cell_size, n_cols * cell_size), dtype=bool)
+        blocked[:height, :width] = walls != 255
+        walkable = ~blocked.reshape(n_rows, cell_size, n_cols, cell_size).any(
+            axis=(1, 3)
+        )
+
+        # Entrances across the vertical, then horizontal, edges between clusters
+        borders = np.arange(cluster_size, n_cols, cluster_size)
+        rows, border_idxs = entrance_positions(
+            walkable[:, borders - 1] & walkable[:, borders], cluster_size
+        )
+        inside = [np.stack([rows, borders[border_idxs] - 1], axis=-1)]
+        outside = [np.stack([rows, borders[border_idxs]], axis=-1)]
+        borders = np.arange(cluster_size, n_rows, cluster_size)
+        cols, border_idxs = entrance_positions(
+            (walkable[borders - 1] & walkable[borders]).T, cluster_size
+        )
+        inside.append(np.stack([borders[border_idxs] - 1, cols], axis=-1))
+        outside.append(np.stack([borders[border_idxs], cols], axis=-1))
+
+        # Cells at the corner of a cluster can be in more than one entrance
+        node_cells, inverse = np.unique(
+            np.concatenate(inside + outside), axis=0, return_inverse=True
+        )
+        inverse = inverse.reshape(2, -1)
+        inter_nodes = inverse.T
+        inter_costs = np.ones(len(inter_nodes))
+
+        intra_nodes, intra_costs = cls._intra_cluster_edges(
+            walkable, node_cells, cluster_size
+        )
+        return cls(
+            walkable=walkable,
+            node_cells=node_cells,
+            edge_nodes=np.concatenate([inter_nodes, intra_nodes]),
+            edge_costs=np.concatenate([inter_costs, intra_costs]),
+            cell_size=cell_size,
+            cluster_size=cluster_size,
+        )
+
+    @staticmethod
+    def grid_shape(
+        map_shape: Tuple[int, int],
+        cell_size: int = CELL_SIZE,
+        cluster_size: int = CLUSTER_SIZE,
+    ) -> Tuple[int, int]:
+        """
+        Get the shape of the navigation grid covering a map, in whole clusters
+
+        Args:
+            map_shape: Height and width of the map, in map (numpy) pixels
+            cell_size: Size of navigation cells, in map (numpy) pixels
+            cluster_size: Width and height of clusters, in cells
+
+        Returns:
+            Rows and columns of navigation cells
+        """
+        block = cell_size * cluster_size
+        return tuple(-(-size // block) * cluster_size for size in map_shape)
+
+    @staticmethod
+    def _intra_cluster_edges(
+        walkable: np.ndarray, node_cells: np.ndarray, cluster_size: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the path cost between every pair of entrances of the same cluster
+
+        Costs from the first entrance of every cluster are found together by
+        relaxing a distance field over all clusters at once, then those from the
+        second entrance, and so on.
+
+        Args:
+            walkable: Walkable navigation cells
+            node_cells: Row and column of each entrance
+            cluster_size: Width and height of clusters, in cells
+
+        Returns:
+            Pairs of entrances joined by a path within their cluster, and path costs
+        """
+        n_cluster_rows = walkable.shape[0] // cluster_size
+        n_cluster_cols = walkable.shape[1] // cluster_size
+        cluster_walkable = (
+            walkable.reshape(n_cluster_rows, cluster_size, n_cluster_cols, cluster_size)
+            .transpose(0, 2, 1, 3)
+            .reshape(-1, cluster_size, cluster_size)
+        )
+
+        # Rank of each entrance within its cluster
+        rows, cols = node_cells.T
+        clusters = (rows // cluster_size) * n_cluster_cols + cols // cluster_size
+        order = np.argsort(clusters, kind="stable")
+        counts = np.bincount(clusters, minlength=len(cluster_walkable))
+        offsets = np.cumsum(counts) - counts
+        ranks = np.empty(len(order), dtype=np.intp)
+        ranks[order] = np.arange(len(order)) - offsets[clusters[order]]
+        local_rows, local_cols = rows % cluster_size, cols % cluster_size
+
+        edge_nodes, edge_costs = [], []
+        for rank in range(counts.max(initial=0) - 1):
+            sources = np.flatnonzero(ranks == rank)
+            source_clusters = clusters[sources]
+            distances = PathFinder._distance_fields(
+                cluster_walkable[source_clusters],
+                local_rows[sources],
+                local_cols[sources],
+            )
+
+            # Pair each source with the entrances ranked after it in its cluster
+            n_later = counts[source_clusters] - rank - 1
+            field_idxs = np.repeat(np.arange(len(sources)), n_later)
+            later_ranks = (
+                np.arange(n_later.sum())
+                - np.repeat(np.cumsum(n_later) - n_later, n_later)
+                + rank
+                + 1
+            )
+            targets = order[offsets[source_clusters[field_idxs]] + later_ranks]
+            costs = distances[field_idxs, local_rows[targets], local_cols[targets]]
+            reachable = np.isfinite(costs)
+            edge_nodes.append(
+                np.stack([sources[field_idxs], targets], axis=-1)[reachable]
+            )
+            edge_costs.append(costs[reachable])
+
+        if not edge_nodes:
+            return np.empty((0, 2), dtype=np.intp), np.empty(0)
+        return np.concatenate(edge_nodes), np.concatenate(edge_costs)
+
+    @staticmethod
+    def _distance_fields(
+        walkable: np.ndarray, source_rows: np.ndarray, source_cols: np.ndarray
+    ) -> np.ndarray:
+        """
+        Find the path cost to every cell of many grids from one source cell in each
+
+        Args:
+            walkable: Walkable cells of each grid, shape (n, size, size)
+            source_rows, source_cols: Source cell of each grid, shape (n,)
+
+        Returns:
+            Path cost to each cell, inf where unreachable, shape (n, size, size)
+        """
+        n, size, _ = walkable.shape
+        padded_walkable = np.pad(walkable, ((0, 0), (1, 1), (1, 1)))
+
+        # Moves are allowed into walkable cells, without cutting wall corners
+        move_allowed = []
+        for d_row, d_col, _ in NEIGHBOUR_MOVES:
+            allowed = (
+                walkable
+                & padded_walkable[
+                    :, 1 + d_row : 1 + d_row + size, 1 + d_col : 1 + d_col + size
+                ]
+            )
+            if d_row and d_col:
+                allowed &= padded_walkable[:, 1 + d_row : 1 + d_row + size, 1:-1]
+                allowed &= padded_walkable[:, 1:-1, 1 + d_col : 1 + d_col + size]
+            move_allowed.append(allowed)
+
+        distances = np.full((n, size + 2, size + 2), np.inf)
+        distances[np.arange(n), source_rows + 1, source_cols + 1] = 0
+        interior = distances[:, 1:-1, 1:-1]
+        while True:
+            relaxed = interior.copy()
+            for (d_row, d_col, cost), allowed in zip(NEIGHBOUR_MOVES, move_allowed):
+                neighbours = distances[
+                    :, 1 + d_row : 1 + d_row + size, 1 + d_col : 1 + d_col + size
+                ]
+                np.minimum(relaxed, neighbours + cost, out=relaxed, where=allowed)
+            if np.array_equal(relaxed, interior):
+                return relaxed
+            interior[...] = relaxed
+
+    @classmethod
+    def from_assets(
+        cls, walls: np.ndarray, walls_path: Path, cache_path: Path
+    ) -> "PathFinder":
+        """
+        Load the path finder from a baked cache file, building it if out of date
+
+        Args:
+            walls: Walls mask, 255 where walkable
+            walls_path: Path walls mask was loaded from
+            cache_path: Baked navigation graph file, written if missing or stale
+
+        Returns:
+            Path finder
+        """
+        if (
+            cache_path.exists()
+            and walls_path.stat().st_mtime < cache_path.stat().st_mtime
+        ):
+            path_finder = cls.load(cache_path)
+            if (
+                path_finder.cell_size == CELL_SIZE
+                and path_finder.cluster_size == CLUSTER_SIZE
+                and path_finder.walkable.shape == cls.grid_shape(walls.shape)
+            ):
+                return path_finder
+
+        path_finder = cls.from_walls(walls)
+        path_finder.save(cache_path)
+        return path_finder
+
+    @classmethod
+    def load(cls, path: Path) -> "PathFinder":
+        """
+        Load a baked navigation graph
+
+        Args:
+            path: Path to file written by save()
+
+        Returns:
+            Path finder
+        """
+        with np.load(path) as baked:
+            return cls(
+                walkable=baked["walkable"],
+                node_cells=baked["node_cells"],
+                edge_nodes=baked["edge_nodes"],
+                edge_costs=baked["edge_costs"],
+                cell_size=int(baked["cell_size"]),
+                cluster_size=int(baked["cluster_size"]),
+            )
+
+    def save(self, path: Path) -> None:
+        """
+        Save the navigation graph
+
+        Args:
+            path: Path to write to
+        """
+        with open(path, "wb") as baked:
+            np.savez_compressed(
+                baked,
+                walkable=self.walkable,
+                node_cells=self.node_cells,
+                edge_nodes=self.edge_nodes,
+                edge_costs=self.edge_costs,
+                cell_size=self.cell_size,
+                cluster_size=self.cluster_size,
+            )
+
+    def cluster_of(
+        self, row: Union[int, np.ndarray], col: Union[int, np.ndarray]
+    ) -> Union[int, np.ndarray]:
+        """
+        Get the cluster index of cells
+
+        Args:
+            row, col: Cell row and column, scalars or arrays
+
+        Returns:
+            Cluster index
+        """
+        cluster_row, cluster_col = row // self.cluster_size, col // self.cluster_size
+        return cluster_row * self.n_cluster_cols + cluster_col
+
+    def find_path(self, start: np.ndarray, goal: np.ndarray) -> Optional[np.ndarray]:
+        """
+        Find a path between two positions, refined to cells in the start and goal
+        clusters
+
+        Args:
+            start: Map (numpy) co-ordinates to start from
+            goal: Map (numpy) co-ordinates to reach
+
+        Returns:
+            Map (numpy) co-ordinates of waypoints, ending at the goal, shape (n, 2),
+            or None if there is no path
+        """
+        start_cell, goal_cell = self.snap(start), self.snap(goal)
+        if start_cell is None or goal_cell is None:
+            return None
+        start_cluster = self.cluster_of(*start_cell)
+
+        # Paths within a cluster need no abstract search
+        if start_cluster == self.cluster_of(*goal_cell):
+            found = self.search_cluster(start_cell, {goal_cell})
+            if goal_cell in found:
+                return self.waypoints(found[goal_cell][1], goal)
+
+        # Refine the legs to the first entrance and from the last, planning afresh
+        # if a cached route leaves from or arrives in a part of the cluster this
+        # start or goal cannot reach
+        for use_cache in (True, False):
+            route = self.route(start_cell, goal_cell, use_cache=use_cache)
+            if route is None:
+                return None
+            first_cell = self.node_cell_tuples[route[0]]
+            last_cell = self.node_cell_tuples[route[-1]]
+            first_leg = self.search_cluster(start_cell, {first_cell})
+            last_leg = self.search_cluster(last_cell, {goal_cell})
+            if first_cell in first_leg and goal_cell in last_leg:
+                return self.waypoints(
+                    first_leg[first_cell][1]
+                    + [self.node_cell_tuples[node] for node in route[1:-1]]
+                    + last_leg[goal_cell][1],
+                    goal,
+                )
+        return None
+
+    def route(
+        self, start_cell: Cell, goal_cell: Cell, use_cache: bool = True
+    ) -> Optional[List[int]]:
+        """
+        Find the entrances to pass through between the clusters of two cells
+
+        Args:
+            start_cell: Row and column of start cell
+            goal_cell: Row and column of goal cell
+            use_cache: Reuse a route between the same clusters if there is one
+
+        Returns:
+            Entrance indices, or None if there is no path
+        """
+        key = (self.cluster_of(*start_cell), self.cluster_of(*goal_cell))
+        if use_cache and key in self.routes:
+            self.routes.move_to_end(key)
+            return self.routes[key]
+
+        # Costs to leave the start cluster by, and enter the goal cluster from, each
+        # of their entrances
+        start_costs = self.entrance_costs(start_cell)
+        goal_costs = self.entrance_costs(goal_cell)
+
+        # A* over the abstract graph, finishing at a virtual goal node
+        goal_node = -1
+        best = dict(start_costs)
+        came_from: Dict[int, int] = {}
+        frontier = [
+            (cost + octile_distance(self.node_cell_tuples[node], goal_cell), cost, node)
+            for node, cost in start_costs.items()
+        ]
+        heapify(frontier)
+        route = None
+        while frontier:
+            _, cost, node = heappop(frontier)
+            if cost > best.get(node, np.inf):
+                continue
+            if node == goal_node:
+                route = []
+                node = came_from[goal_node]
+                while node in came_from:
+                    route.append(node)
+                    node = came_from[node]
+                route.append(node)
+                route.reverse()
+                break
+            neighbours = self.adjacency[node]
+            if node in goal_costs:
+                neighbours = neighbours + [(goal_node, goal_costs[node])]
+            for neighbour, edge_cost in neighbours:
+                new_cost = cost + edge_cost
+                if new_cost < best.get(neighbour, np.inf):
+                    best[neighbour] = new_cost
+                    came_from[neighbour] = node
+                    heuristic = (
+                        0
+                        if neighbour == goal_node
+                        else octile_distance(
+                            self.node_cell_tuples[neighbour], goal_cell
+                        )
+                    )
+                    heappush(frontier, (new_cost + heuristic, new_cost, neighbour))
+
+        if route is not None:
+            self.routes[key] = route
+            self.routes.move_to_end(key)
+            if len(self.routes) > ROUTE_CACHE_SIZE:
+                self.routes.popitem(last=False)
+        return route
+
+    def entrance_costs(self, cell: Cell) -> Dict[int, float]:
+        """
+        Find the cost of reaching each entrance of a cell's cluster from the cell
+
+        Args:
+            cell: Row and column of cell
+
+        Returns:
+            Path cost to each reachable entrance, by entrance index
+        """
+        cluster = self.cluster_of(*cell)
+        nodes = self.cluster_nodes[
+            self.cluster_offsets[cluster] : self.cluster_offsets[cluster + 1]
+        ].tolist()
+        found = self.search_cluster(
+            cell, {self.node_cell_tuples[node] for node in nodes}
+        )
+        return {
+            node: found[self.node_cell_tuples[node]][0]
+            for node in nodes
+            if self.node_cell_tuples[node] in found
+        }
+
+    def search_cluster(
+        self, start: Cell, targets: Set[Cell]
+    ) -> Dict[Cell, Tuple[float, List[Cell]]]:
+        """
+        Find shortest paths from a cell to target cells without leaving its cluster
+
+        Args:
+            start: Row and column of start cell
+            targets: Rows and columns of target cells
+
+        Returns:
+            Path cost and path of cells from the start to each reachable target, by
+            target
+        """
+        size = self.cluster_size
+        row_min = start[0] - start[0] % size
+        col_min = start[1] - start[1] % size
+        walkable = self.walkable[row_min : row_min + size, col_min : col_min + size]
+
+        remaining = set(targets)
+        best = {start: 0.0}
+        came_from: Dict[Cell, Cell] = {}
+        frontier = [(0.0, start)]
+        found: Dict[Cell, Tuple[float, List[Cell]]] = {}
+        while frontier and remaining:
+            cost, cell = heappop(frontier)
+            if cost > best[cell]:
+                continue
+            if cell in remaining:
+                remaining.discard(cell)
+                path = [cell]
+                while path[-1] in came_from:
+                    path.append(came_from[path[-1]])
+                found[cell] = (cost, path[::-1])
+            row, col = cell[0] - row_min, cell[1] - col_min
+            for d_row, d_col, move_cost in NEIGHBOUR_MOVES:
+                next_row, next_col = row + d_row, col + d_col
+                if not (0 <= next_row < size and 0 <= next_col < size):
+                    continue
+                if not walkable[next_row, next_col]:
+                    continue
+                if (
+                    d_row
+                    and d_col
+                    and not (walkable[next_row, col] and walkable[row, next_col])
+                ):
+                    continue
+                neighbour = (next_row + row_min, next_col + col_min)
+                new_cost = cost + move_cost
+                if new_cost < best.get(neighbour, np.inf):
+                    best[neighbour] = new_cost
+                    came_from[neighbour] = cell
+                    heappush(frontier, (new_cost, neighbour))
+        return found
+
+    def connected(self, starts: np.ndarray, goals: np.ndarray) -> np.ndarray:
+        """
+        Check which pairs of positions are joined by a path, without finding it
+
+        Args:
+            starts: Map (numpy) co-ordinates to start from, shape (n, 2)
+            goals: Map (numpy) co-ordinates to reach, shape (n, 2)
+
+        Returns:
+            Whether each goal can be reached from its start, shape (n,)
+        """
+        start_components = self.components_at(starts)
+        return (start_components >= 0) & (start_components == self.components_at(goals))
+
+    def components_at(self, positions: np.ndarray) -> np.ndarray:
+        """
+        Get the connected region of the cell each position snaps to
+
+        Args:
+            positions: Map (numpy) co-ordinates, shape (n, 2)
+
+        Returns:
+            Region labels, -1 where there is no walkable cell nearby, shape (n,)
+        """
+        positions = np.reshape(positions, (-1, 2))
+        cols, rows = np.floor(positions / self.cell_size).T
+        rows, cols = rows.astype(np.intp), cols.astype(np.intp)
+        n_rows, n_cols = self.walkable.shape
+        inside = (rows >= 0) & (rows < n_rows) & (cols >= 0) & (cols < n_cols)
+        components = np.full(len(rows), -1)
+        components[inside] = self.components[rows[inside], cols[inside]]
+
+        # Positions off the grid or in walls are rare, so snap them one at a time
+        for idx in np.flatnonzero(components < 0).tolist():
+            cell = self.snap(positions[idx])
+            if cell is not None:
+                components[idx] = self.components[cell]
+        return components
+
+    def snap(self, pos: np.ndarray) -> Optional[Cell]:
+        """
+        Find the walkable cell at, or failing that nearest to, a position
+
+        Args:
+            pos: Map (numpy) co-ordinates
+
+        Returns:
+            Row and column of cell, or None if there is none nearby
+        """
+        col, row = (int(value) for value in np.floor(np.asarray(pos) / self.cell_size))
+        n_rows, n_cols = self.walkable.shape
+        if 0 <= row < n_rows and 0 <= col < n_cols and self.walkable[row, col]:
+            return row, col
+
+        row_min, col_min = max(row - SNAP_RADIUS, 0), max(col - SNAP_RADIUS, 0)
+        row_max, col_max = max(row + SNAP_RADIUS + 1, 0), max(col + SNAP_RADIUS + 1, 0)
+        window = self.walkable[row_min:row_max, col_min:col_max]
+        rows, cols = np.nonzero(window)
+        if not len(rows):
+            return None
+        nearest = np.argmin((rows + row_min - row) ** 2 + (cols + col_min - col) ** 2)
+        return int(rows[nearest] + row_min), int(cols[nearest] + col_min)
+
+    def waypoints(self, cells: List[Cell], goal: np.ndarray) -> np.ndarray:
+        """
+        Convert a path of cells to waypoints at their centres, followed by the goal
+
+        Args:
+            cells: Rows and columns of cells
+            goal: Map (numpy) co-ordinates of goal
+
+        Returns:
+            Map (numpy) co-ordinates of waypoints, shape (n, 2)
+        """
+        points = (np.array(cells, dtype=float)[:, ::-1] + 0.5) * self.cell_size
+        return np.concatenate((points, np.reshape(goal, (1, 2))))
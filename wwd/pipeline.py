@@ -0,0 +1,205 @@
+"""
+Pipelined simulation and rendering
+
+Everything the renderer needs to draw a frame is held in a FrameState, written by
+the simulation. There are two, so that when overlapped, the simulation can write the
+next frame into one on a worker thread while the main thread draws the current frame
+from the other. pygame releases the GIL while blitting and scaling, so on multi-core
+machines the two largely run in parallel.
+
+Rendering stays on the main thread, as SDL expects display calls to come from the
+thread that created the window.
+"""
+
+
+import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+import pygame
+
+from wwd.render import RenderQueue
+from wwd.scenes import Scene
+
+
+logger = logging.getLogger(__name__)
+
+
+# Frame timings are averaged and logged at this interval
+STATS_INTERVAL = 5.0
+
+# Name of the worker thread that simulates frames when overlapped
+SIMULATION_THREAD = "simulation"
+
+
+class FrameState:
+    """
+    Everything needed to draw a frame, written by the simulation
+    """
+
+    def __init__(self):
+        """
+        Construct an empty frame state
+        """
+        self.render_queue = RenderQueue()
+        self.scene: Optional[Scene] = None
+        self.screen_pos = pygame.Vector2(0, 0)
+        self.player_pos = pygame.Vector2(0, 0)
+        self.minimap_entities: List[Tuple[str, np.ndarray]] = []
+        self.visible = np.zeros((0, 0), dtype=bool)
+        self.visible_origin = (0, 0)
+        self.counters: List[Tuple[str, float]] = []
+
+
+class PipelineStats:
+    """
+    Rolling simulation, render and frame times, and how much they overlap
+    """
+
+    def __init__(self, interval: float = STATS_INTERVAL):
+        """
+        Construct the stats
+
+        Args:
+            interval: Time over which stats are averaged and logged, in seconds
+        """
+        self.interval = interval
+        self.frames: deque = deque()
+        self.last_logged = time.perf_counter()
+
+    def record(
+        self, simulate_time: float, render_time: float, frame_time: float
+    ) -> None:
+        """
+        Record the timings of a frame, logging stats once per interval
+
+        Args:
+            simulate_time: Time spent simulating, in seconds
+            render_time: Time spent rendering, in seconds
+            frame_time: Time taken to both simulate and render, in seconds
+        """
+        now = time.perf_counter()
+        self.frames.append((now, simulate_time, render_time, frame_time))
+        while self.frames[0][0] < now - self.interval:
+            self.frames.popleft()
+        if now - self.last_logged >= self.interval:
+            self.last_logged = now
+            simulate_time, render_time, frame_time = self.mean_times()
+            logger.info(
+                "Pipeline: simulate %.1fms, render %.1fms, frame %.1fms, "
+                "overlap %.0f%%",
+                simulate_time * 1000,
+                render_time * 1000,
+                frame_time * 1000,
+                self.overlap() * 100,
+            )
+
+    def mean_times(self) -> Tuple[float, float, float]:
+        """
+        Mean simulation, render and frame times, in seconds
+        """
+        if not self.frames:
+            return 0.0, 0.0, 0.0
+        _, *times = np.mean(self.frames, axis=0)
+        return tuple(times)
+
+    def overlap(self) -> float:
+        """
+        Fraction of the shorter of simulation and rendering hidden by running them
+        together, 0 when run one after the other, 1 when fully overlapped
+        """
+        simulate_time, render_time, frame_time = self.mean_times()
+        shorter = min(simulate_time, render_time)
+        if shorter <= 0:
+            return 0.0
+        return float(
+            np.clip((simulate_time + render_time - frame_time) / shorter, 0, 1)
+        )
+
+
+class FramePipeline:
+    """
+    Double buffered frame states, simulated and rendered in turn or overlapped
+    """
+
+    def __init__(self, overlapped: bool = False):
+        """
+        Construct the pipeline
+
+        Args:
+            overlapped: Simulate the next frame while rendering the current one
+        """
+        self.frames = (FrameState(), FrameState())
+        self.front = 0
+        self.overlapped = overlapped
+        self.executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix=SIMULATION_THREAD
+        )
+        self.stats = PipelineStats()
+
+    @property
+    def front_frame(self) -> FrameState:
+        """
+        Frame state to be rendered next
+        """
+        return self.frames[self.front]
+
+    def run(
+        self,
+        simulate: Callable[[FrameState], bool],
+        render: Callable[[FrameState], None],
+    ) -> bool:
+        """
+        Simulate and render a frame
+
+        When overlapped, the frame rendered is the one simulated on the previous
+        call, so frames are shown one frame later.
+
+        Args:
+            simulate: Advances the simulation and writes a frame state, returning
+                False if the game is over
+            render: Draws a frame state
+
+        Returns:
+            False if the game is over, True otherwise
+        """
+        start = time.perf_counter()
+        if self.overlapped:
+            future = self.executor.submit(
+                self.timed, simulate, self.frames[1 - self.front]
+            )
+            _, render_time = self.timed(render, self.front_frame)
+            running, simulate_time = future.result()
+            self.front = 1 - self.front
+        else:
+            running, simulate_time = self.timed(simulate, self.front_frame)
+            _, render_time = self.timed(render, self.front_frame)
+        self.stats.record(
+            simulate_time=simulate_time,
+            render_time=render_time,
+            frame_time=time.perf_counter() - start,
+        )
+        return running
+
+    @staticmethod
+    def timed(
+        function: Callable[[FrameState], bool], frame: FrameState
+    ) -> Tuple[bool, float]:
+        """
+        Call a function on a frame state, timing it
+
+        Returns:
+            Function's return value and time taken, in seconds
+        """
+        start = time.perf_counter()
+        result = function(frame)
+        return result, time.perf_counter() - start
+
+    def shutdown(self) -> None:
+        """
+        Stop the simulation worker thread
+        """
+        self.executor.shutdown()
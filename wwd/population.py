@@ -0,0 +1,171 @@
+"""
+Enemy population management
+
+Keeps the number of enemies bounded by despawning enemies far from the player and
+capping spawning with per-area budgets. Spawn positions are drawn from a precomputed
+index of walkable cells, so new enemies never land inside walls.
+"""
+
+
+from random import choice, randrange, uniform
+from typing import Dict, Optional
+
+import numpy as np
+import pygame
+
+from wwd.map_layers import MapLayer, MapLayers
+
+
+# Size of walkable cells spawn points are drawn from, in map (numpy) pixels
+SPAWN_CELL_SIZE = 16
+
+
+class PopulationManager:
+    """
+    Decides where and whether enemies spawn, and which should be despawned
+    """
+
+    def __init__(
+        self,
+        walls: np.ndarray,
+        map_layers: MapLayers,
+        max_enemies: int,
+        default_area_budget: int,
+        despawn_distance: float,
+        area_budgets: Optional[Dict[int, int]] = None,
+    ):
+        """
+        Construct the population manager
+
+        Args:
+            walls: Walls mask, 255 where walkable
+            map_layers: Map layers, used to find the area of each enemy
+            max_enemies: Maximum number of enemies across all areas
+            default_area_budget: Maximum enemies in areas not in area_budgets
+            despawn_distance: Enemies further than this from the player are despawned,
+                in map (numpy) pixels
+            area_budgets: Maximum enemies in specific areas, by area region ID
+        """
+        self.map_layers = map_layers
+        self.max_enemies = max_enemies
+        self.default_area_budget = default_area_budget
+        self.despawn_distance = despawn_distance
+        self.area_budgets = area_budgets or {}
+
+        # Cells are walkable only if every pixel in them is walkable
+        n_rows = walls.shape[0] // SPAWN_CELL_SIZE
+        n_cols = walls.shape[1] // SPAWN_CELL_SIZE
+        self.walkable = (
+            walls[: n_rows * SPAWN_CELL_SIZE, : n_cols * SPAWN_CELL_SIZE]
+            .reshape(n_rows, SPAWN_CELL_SIZE, n_cols, SPAWN_CELL_SIZE)
+            .min(axis=(1, 3))
+            == 255
+        )
+
+        # Sorted walkable rows of each column, and walkable columns of each row
+        cols, rows = np.nonzero(self.walkable.T)
+        self.column_rows = rows
+        self.column_offsets = np.searchsorted(cols, np.arange(n_cols + 1))
+        rows, cols = np.nonzero(self.walkable)
+        self.row_cols = cols
+        self.row_offsets = np.searchsorted(rows, np.arange(n_rows + 1))
+
+    def far_enemies(
+        self, enemy_positions: np.ndarray, player_pos: pygame.Vector2
+    ) -> np.ndarray:
+        """
+        Find enemies that should be despawned
+
+        Args:
+            enemy_positions: Map (numpy) co-ordinates of enemies, shape (n, 2)
+            player_pos: Map (numpy) co-ordinates of the player
+
+        Returns:
+            Indices of enemies to despawn
+        """
+        distances = np.hypot(*(enemy_positions - np.asarray(player_pos)).T)
+        return np.flatnonzero(distances > self.despawn_distance)
+
+    def spawn_position(
+        self,
+        enemy_positions: np.ndarray,
+        view_lb: pygame.Vector2,
+        view_ub: pygame.Vector2,
+        scroll_delta: pygame.Vector2,
+    ) -> Optional[pygame.Vector2]:
+        """
+        Choose a walkable position at the edge of the view to spawn an enemy
+
+        Enemies spawn at the edge the player is moving towards.
+
+        Args:
+            enemy_positions: Map (numpy) co-ordinates of existing enemies
+            view_lb: Map (numpy) co-ordinates of the top left of the view
+            view_ub: Map (numpy) co-ordinates of the bottom right of the view
+            scroll_delta: Movement of the background this frame
+
+        Returns:
+            Map (numpy) co-ordinates to spawn at, or None if no enemy may spawn
+        """
+        if len(enemy_positions) >= self.max_enemies or not scroll_delta:
+            return None
+
+        # The background moves opposite to the player
+        col_lb, row_lb = (int(coord) // SPAWN_CELL_SIZE + 1 for coord in view_lb)
+        col_ub, row_ub = (int(coord) // SPAWN_CELL_SIZE - 1 for coord in view_ub)
+        edges = []
+        if scroll_delta.x:
+            col = col_lb if scroll_delta.x > 0 else col_ub
+            edges.append((True, col, row_lb, row_ub))
+        if scroll_delta.y:
+            row = row_lb if scroll_delta.y > 0 else row_ub
+            edges.append((False, row, col_lb, col_ub))
+        is_column, edge, lb, ub = choice(edges)
+
+        # Find walkable cells along the edge
+        index, offsets, n_edges = (
+            (self.column_rows, self.column_offsets, self.walkable.shape[1])
+            if is_column
+            else (self.row_cols, self.row_offsets, self.walkable.shape[0])
+        )
+        if not 0 <= edge < n_edges:
+            return None
+        cells = index[offsets[edge] : offsets[edge + 1]]
+        start, stop = np.searchsorted(cells, (lb, ub + 1))
+        if start == stop:
+            return None
+        cell = int(cells[randrange(start, stop)])
+        col, row = (edge, cell) if is_column else (cell, edge)
+        spawn_pos = pygame.Vector2(
+            (col + uniform(0, 1)) * SPAWN_CELL_SIZE,
+            (row + uniform(0, 1)) * SPAWN_CELL_SIZE,
+        )
+
+        # Respect the budget of the area being spawned into
+        area = self.map_layers.region_at(
+            MapLayer.AREAS, int(spawn_pos.x), int(spawn_pos.y)
+        )
+        if self.area_population(enemy_positions, area) >= self.area_budgets.get(
+            area, self.default_area_budget
+        ):
+            return None
+        return spawn_pos
+
+    def area_population(self, enemy_positions: np.ndarray, area: int) -> int:
+        """
+        Count enemies in an area
+
+        Args:
+            enemy_positions: Map (numpy) co-ordinates of enemies, shape (n, 2)
+            area: Area region ID
+
+        Returns:
+            Number of enemies in the area
+        """
+        if not len(enemy_positions):
+            return 0
+        height, width = self.map_layers.shape
+        xs = np.clip(enemy_positions[:, 0].astype(int), 0, width - 1)
+        ys = np.clip(enemy_positions[:, 1].astype(int), 0, height - 1)
+        areas = self.map_layers.region_at(MapLayer.AREAS, xs, ys)
+        return int(np.count_nonzero(areas == area))
@@ -0,0 +1,165 @@
+"""
+On-demand statistical sampling profiler
+
+While running, a background thread samples the stacks of the threads that run the
+game, the main thread and the simulation worker, at a fixed interval. Other threads
+(loading, capture writing, networking) spend most of their time waiting, and would
+swamp the samples that matter. Samples of a thread blocked on a lock or queue are
+just counted as idle. When it finishes it writes the samples as collapsed stacks,
+ready for flamegraph.pl or speedscope, and a summary of the functions seen most in
+each thread, tagged with what was going on in the game at the time.
+
+Nothing is sampled, and no thread exists, until a profile is started.
+"""
+
+
+import logging
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from types import FrameType
+from typing import Dict, Iterable, List
+
+from wwd.pipeline import SIMULATION_THREAD
+
+
+logger = logging.getLogger(__name__)
+
+
+# Time between samples, in seconds
+SAMPLE_INTERVAL = 0.002
+
+# Number of functions listed in the summary, per thread
+SUMMARY_FUNCTIONS = 30
+
+# Threads sampled by default, by name prefix
+SAMPLED_THREADS = ("MainThread", SIMULATION_THREAD)
+
+# Files whose functions, at the top of a stack, mean the thread is waiting
+IDLE_FILES = ("threading.py", "queue.py", "concurrent/futures/thread.py")
+
+
+def frame_name(frame: FrameType) -> str:
+    """
+    Name a stack frame by function, file and line it starts on
+    """
+    code = frame.f_code
+    return f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+
+
+class SamplingProfiler(threading.Thread):
+    """
+    Samples the stacks of the game's threads for a fixed time, then writes them out
+    """
+
+    def __init__(
+        self,
+        duration: float,
+        path: Path,
+        tags: Dict[str, object],
+        threads: Iterable[str] = SAMPLED_THREADS,
+    ):
+        """
+        Construct the profiler, call start() to begin sampling
+
+        Args:
+            duration: Time to sample for, in seconds
+            path: Path of output files, without suffix
+            tags: Description of the game state being profiled, e.g. entity counts
+            threads: Name prefixes of threads to sample
+        """
+        super().__init__(name="profiler", daemon=True)
+        self.duration = duration
+        self.path = path
+        self.tags = tags
+        self.threads = tuple(threads)
+        self.stacks: Counter = Counter()
+        self.idle: Counter = Counter()
+        self.n_samples = 0
+        self.stopping = threading.Event()
+
+    def run(self) -> None:
+        """
+        Sample stacks until the duration has passed or stop() is called, then write
+        """
+        end = time.perf_counter() + self.duration
+        start = time.perf_counter()
+        while time.perf_counter() < end and not self.stopping.wait(SAMPLE_INTERVAL):
+            self.sample()
+        self.tags["duration"] = f"{time.perf_counter() - start:.1f}s"
+        self.write()
+
+    def sample(self) -> None:
+        """
+        Record the current stack of each sampled thread
+        """
+        frames = sys._current_frames()
+        for thread in threading.enumerate():
+            if not thread.name.startswith(self.threads):
+                continue
+            frame = frames.get(thread.ident)
+            if frame is None:
+                continue
+            if any(Path(frame.f_code.co_filename).match(name) for name in IDLE_FILES):
+                self.idle[thread.name] += 1
+                continue
+            stack: List[str] = []
+            while frame is not None:
+                stack.append(frame_name(frame))
+                frame = frame.f_back
+            stack.append(thread.name)
+            self.stacks[";".join(reversed(stack))] += 1
+        self.n_samples += 1
+
+    def stop(self) -> None:
+        """
+        Stop sampling early, still writing what has been sampled
+        """
+        self.stopping.set()
+
+    def write(self) -> None:
+        """
+        Write collapsed stacks and a summary of the most sampled functions
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        folded_path = self.path.with_suffix(".folded")
+        folded_path.write_text(
+            "".join(f"{stack} {count}\n" for stack, count in self.stacks.items())
+        )
+
+        # Time each thread spent in each function itself, and in it or anything it
+        # called, as a share of that thread's busy samples
+        self_counts: Dict[str, Counter] = {thread: Counter() for thread in self.idle}
+        total_counts: Dict[str, Counter] = {thread: Counter() for thread in self.idle}
+        for stack, count in self.stacks.items():
+            thread, *frames = stack.split(";")
+            self_counts.setdefault(thread, Counter())[frames[-1]] += count
+            thread_total_counts = total_counts.setdefault(thread, Counter())
+            for name in set(frames):
+                thread_total_counts[name] += count
+
+        lines = [f"{key}: {value}" for key, value in self.tags.items()]
+        lines.append(f"samples: {self.n_samples} every {SAMPLE_INTERVAL * 1000:g}ms")
+        for thread in sorted(self_counts):
+            n_stacks = sum(self_counts[thread].values())
+            n_idle = self.idle[thread]
+            lines.append("")
+            lines.append(
+                f"{thread}: {n_stacks} samples busy, "
+                f"{n_idle / (n_stacks + n_idle):.0%} idle"
+            )
+            for title, counts in (
+                ("Self", self_counts[thread]),
+                ("Total", total_counts[thread]),
+            ):
+                lines.append("")
+                lines.append(f"{title:>8}  Function")
+                lines.extend(
+                    f"{count / n_stacks:8.1%}  {name}"
+                    for name, count in counts.most_common(SUMMARY_FUNCTIONS)
+                )
+        summary_path = self.path.with_suffix(".txt")
+        summary_path.write_text("\n".join(lines) + "\n")
+        logger.info("Profile written to %s and %s", folded_path, summary_path)
@@ -0,0 +1,63 @@
+"""
+Mipmapped map image pyramid
+
+Scaling the full resolution background every frame is far too slow, so scaled copies
+are built once, lazily, and kept. Power of two levels (1/2, 1/4, 1/8, ...) are each
+built by halving the level above, and any other scale (e.g. a reduced internal
+render resolution) is built from the nearest larger level.
+"""
+
+
+from math import floor, log2
+from typing import Dict, List
+
+import pygame
+
+
+class MapPyramid:
+    """
+    Lazily built, cached scaled copies of a map image
+    """
+
+    def __init__(self, base: pygame.Surface):
+        """
+        Construct the pyramid
+
+        Args:
+            base: Full resolution image, level 0 of the pyramid
+        """
+        self.levels: List[pygame.Surface] = [base]
+        self.scaled: Dict[float, pygame.Surface] = {}
+
+    def level(self, idx: int) -> pygame.Surface:
+        """
+        Get a level of the pyramid, building it and the levels above it if required
+
+        Args:
+            idx: Level index, level idx is scaled by 1 / 2 ** idx
+
+        Returns:
+            Scaled image
+        """
+        while len(self.levels) <= idx:
+            self.levels.append(pygame.transform.smoothscale_by(self.levels[-1], 0.5))
+        return self.levels[idx]
+
+    def get(self, scale: float) -> pygame.Surface:
+        """
+        Get the image at any scale no larger than full resolution
+
+        Args:
+            scale: Scale relative to full resolution, in (0, 1]
+
+        Returns:
+            Scaled image
+        """
+        idx = floor(log2(1 / scale))
+        if scale == 0.5**idx:
+            return self.level(idx)
+        if scale not in self.scaled:
+            self.scaled[scale] = pygame.transform.smoothscale_by(
+                self.level(idx), scale * 2**idx
+            )
+        return self.scaled[scale]
@@ -0,0 +1,142 @@
+"""
+Adaptive quality governor
+
+Watches rolling frame times against a target frame time, stepping quality down when
+frames run over budget and back up when there is headroom again.
+"""
+
+
+import logging
+from collections import deque
+from enum import Enum
+from typing import NamedTuple, Sequence
+
+
+logger = logging.getLogger(__name__)
+
+
+# Number of frames averaged before deciding to change quality
+FRAME_TIME_WINDOW = 60
+
+# Fractions of the target frame time that trigger a change in quality
+STEP_DOWN_THRESHOLD = 1.0
+STEP_UP_THRESHOLD = 0.6
+
+
+class HealthBarDetail(Enum):
+    """
+    Which characters have health bars drawn
+    """
+
+    ALL = "all"
+    DAMAGED = "damaged"
+    NONE = "none"
+
+
+class QualityLevel(NamedTuple):
+    """
+    Settings that can be sacrificed to hold the frame time budget
+    """
+
+    name: str
+    # Internal render resolution, as a fraction of the screen resolution
+    render_scale: float
+    health_bars: HealthBarDetail
+    # Fraction of visual effects to show
+    effect_detail: float
+    # Enemies far from the player only update every this many frames
+    far_enemy_update_interval: int
+
+
+# Highest quality first. Cheaper sacrifices come before render resolution.
+QUALITY_LEVELS = (
+    QualityLevel("high", 1.0, HealthBarDetail.ALL, 1.0, 1),
+    QualityLevel("medium", 1.0, HealthBarDetail.DAMAGED, 0.5, 2),
+    QualityLevel("low", 0.75, HealthBarDetail.DAMAGED, 0.25, 4),
+    QualityLevel("lowest", 0.5, HealthBarDetail.NONE, 0.0, 8),
+)
+
+
+class QualityGovernor:
+    """
+    Chooses a quality level to hold frame times under a target
+    """
+
+    def __init__(
+        self,
+        target_frame_time: float,
+        levels: Sequence[QualityLevel] = QUALITY_LEVELS,
+        window: int = FRAME_TIME_WINDOW,
+    ):
+        """
+        Construct the quality governor
+
+        Args:
+            target_frame_time: Frame time budget, in seconds
+            levels: Quality levels, highest quality first
+            window: Number of frames averaged before changing quality
+        """
+        self.target_frame_time = target_frame_time
+        self.levels = levels
+        self.level_idx = 0
+        self.frame_times = deque(maxlen=window)
+
+    @property
+    def level(self) -> QualityLevel:
+        """
+        Current quality level
+        """
+        return self.levels[self.level_idx]
+
+    def record(self, frame_time: float) -> bool:
+        """
+        Record the time taken by a frame, changing quality level if required
+
+        Args:
+            frame_time: Time spent working on the last frame (excluding any frame rate
+                limiting delay), in seconds
+
+        Returns:
+            True if the quality level changed
+        """
+        self.frame_times.append(frame_time)
+        if len(self.frame_times) < self.frame_times.maxlen:
+            return False
+
+        mean_frame_time = sum(self.frame_times) / len(self.frame_times)
+        if (
+            mean_frame_time > self.target_frame_time * STEP_DOWN_THRESHOLD
+            and self.level_idx < len(self.levels) - 1
+        ):
+            self.set_level(self.level_idx + 1, mean_frame_time)
+            return True
+        if (
+            mean_frame_time < self.target_frame_time * STEP_UP_THRESHOLD
+            and self.level_idx > 0
+        ):
+            self.set_level(self.level_idx - 1, mean_frame_time)
+            return True
+        return False
+
+    def set_level(self, level_idx: int, mean_frame_time: float) -> None:
+        """
+        Change quality level, logging what changed
+
+        Frame times are measured afresh at the new level.
+        """
+        previous = self.level
+        self.level_idx = level_idx
+        self.frame_times.clear()
+        changes = ", ".join(
+            f"{field} {getattr(previous, field)} -> {getattr(self.level, field)}"
+            for field in QualityLevel._fields[1:]
+            if getattr(previous, field) != getattr(self.level, field)
+        )
+        logger.info(
+            "Quality %s -> %s (mean frame time %.1fms, target %.1fms): %s",
+            previous.name,
+            self.level.name,
+            mean_frame_time * 1000,
+            self.target_frame_time * 1000,
+            changes,
+        )
@@ -0,0 +1,189 @@
+"""
+Batched sprite rendering
+
+All sprite groups submit to a single render queue each frame, which orders draws by
+layer, culls those outside the viewport and issues them in one batched blit call.
+Lines (e.g. health bars) are drawn on top of all sprites.
+
+The queue can draw at a reduced internal resolution or zoomed out, scaling sprite
+images and positions as it draws.
+"""
+
+
+from enum import IntEnum
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+import pygame
+
+
+# Maximum number of scaled sprite images kept between frames
+SCALED_IMAGE_CACHE_SIZE = 512
+
+
+class RenderLayer(IntEnum):
+    """
+    Draw order of sprite groups, lowest first
+    """
+
+    PLAYER = 0
+    WEAPONS = 1
+    ENEMIES = 2
+    PETS = 3
+    PARTICLES = 4
+
+
+class RenderQueue:
+    """
+    Collects sprite draws for a frame and issues them in one batch
+    """
+
+    def __init__(self):
+        """
+        Construct the render queue
+        """
+        self.layers: Dict[int, List[Tuple[pygame.Surface, pygame.Rect]]] = {}
+        self.lines: List[Tuple[str, pygame.Vector2, pygame.Vector2, int]] = []
+        self.scaled_images: Dict[Tuple[pygame.Surface, float], pygame.Surface] = {}
+        self.submitted = 0
+        self.culled = 0
+
+    def submit(self, sprites: Iterable[pygame.sprite.Sprite], layer: int) -> None:
+        """
+        Queue sprites to be drawn this frame
+
+        Args:
+            sprites: Sprites (e.g. a group) with image and rect attributes
+            layer: Layer to draw sprites on, higher layers are drawn on top
+        """
+        self.layers.setdefault(layer, []).extend(
+            (sprite.image, sprite.rect.copy()) for sprite in sprites
+        )
+
+    def submit_images(
+        self,
+        images: Sequence[pygame.Surface],
+        image_idxs: np.ndarray,
+        centres: np.ndarray,
+        layer: int,
+    ) -> None:
+        """
+        Queue many draws of a few images, e.g. particles, without sprites
+
+        Args:
+            images: Images to draw
+            image_idxs: Index into images of each draw, shape (n,)
+            centres: Screen co-ordinates of the centre of each draw, shape (n, 2)
+            layer: Layer to draw images on, higher layers are drawn on top
+        """
+        sizes = np.array([image.get_size() for image in images]).reshape(-1, 2)
+        draw_sizes = sizes[image_idxs]
+        rects = np.concatenate(
+            [np.floor(centres - draw_sizes / 2), draw_sizes], axis=1
+        ).astype(int)
+        self.layers.setdefault(layer, []).extend(
+            zip(
+                map(images.__getitem__, image_idxs.tolist()),
+                map(pygame.Rect, rects.tolist()),
+            )
+        )
+
+    def submit_line(
+        self,
+        colour: str,
+        start: pygame.Vector2,
+        end: pygame.Vector2,
+        width: int = 1,
+    ) -> None:
+        """
+        Queue a line to be drawn over all sprites this frame
+
+        Args:
+            colour: Line colour
+            start, end: Screen co-ordinates of ends of line
+            width: Line width, in screen pixels
+        """
+        self.lines.append((colour, pygame.Vector2(start), pygame.Vector2(end), width))
+
+    def clear(self) -> None:
+        """
+        Discard all queued sprites and lines without drawing them
+        """
+        self.layers.clear()
+        self.lines.clear()
+
+    def flush(
+        self,
+        surface: pygame.Surface,
+        scale: float = 1.0,
+        offset: pygame.Vector2 = pygame.Vector2(0, 0),
+    ) -> None:
+        """
+        Draw and clear all queued sprites and lines
+
+        Screen co-ordinates are transformed to surface co-ordinates by
+        screen_pos * scale + offset, e.g. for reduced resolution or zooming out.
+
+        Args:
+            surface: Surface to draw on
+            scale: Size of drawn sprites relative to the screen
+            offset: Position of screen origin on surface
+        """
+        # Cull in screen co-ordinates, before scaling anything
+        viewport = pygame.Rect(
+            -offset / scale, pygame.Vector2(surface.get_size()) / scale
+        )
+        blit_sequence = []
+        self.submitted = self.culled = 0
+        for layer in sorted(self.layers):
+            draws = self.layers[layer]
+            visible = viewport.collidelistall([rect for _, rect in draws])
+            if scale == 1 and not offset:
+                blit_sequence.extend(draws[idx] for idx in visible)
+            else:
+                blit_sequence.extend(
+                    self.scale_draw(*draws[idx], scale, offset) for idx in visible
+                )
+            self.submitted += len(draws)
+            self.culled += len(draws) - len(visible)
+        self.layers.clear()
+
+        # fblits is only available in newer pygame versions
+        if hasattr(surface, "fblits"):
+            surface.fblits(blit_sequence)
+        else:
+            surface.blits(blit_sequence, doreturn=False)
+
+        for colour, start, end, width in self.lines:
+            pygame.draw.line(
+                surface,
+                colour,
+                start * scale + offset,
+                end * scale + offset,
+                width=max(1, round(width * scale)),
+            )
+        self.lines.clear()
+
+    def scale_draw(
+        self,
+        image: pygame.Surface,
+        rect: pygame.Rect,
+        scale: float,
+        offset: pygame.Vector2,
+    ) -> Tuple[pygame.Surface, pygame.Rect]:
+        """
+        Scale a sprite draw to a reduced resolution or zoomed out surface
+
+        Scaled images are cached, as most sprites share a handful of images.
+        """
+        key = (image, scale)
+        scaled_image = image if scale == 1 else self.scaled_images.get(key)
+        if scaled_image is None:
+            if len(self.scaled_images) >= SCALED_IMAGE_CACHE_SIZE:
+                self.scaled_images.clear()
+            scaled_image = self.scaled_images[key] = pygame.transform.scale_by(
+                image, scale
+            )
+        scaled_rect = scaled_image.get_rect()
+        scaled_rect.center = pygame.Vector2(rect.center) * scale + offset
+        return scaled_image, scaled_rect
@@ -0,0 +1,210 @@
+"""
+Scenes: the overworld and the interiors of buildings that can be entered
+
+Each scene has its own background, masks and everything built from them (line of
+sight, fog of war, pathfinding, spawning), along with its own enemies. Loading a
+scene takes a while, so interiors near the player are loaded ahead of time on a
+worker thread, and recently used ones are kept in a bounded cache. Entering or
+leaving one is then just a matter of swapping which scene the game uses.
+"""
+
+
+import logging
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterable, NamedTuple
+
+import numpy as np
+import pygame
+
+from wwd.collision import WallCollider
+from wwd.map_layers import MapLayers
+from wwd.minimap import Minimap
+from wwd.pathfinding import PathFinder
+from wwd.population import PopulationManager
+from wwd.pyramid import MapPyramid
+from wwd.raycast import RaycastEngine
+from wwd.visibility import VisibilityMap
+
+
+logger = logging.getLogger(__name__)
+
+
+# Number of interiors kept loaded, besides the overworld
+SCENE_CACHE_SIZE = 4
+
+
+class ScenePaths(NamedTuple):
+    """
+    Asset files of a scene
+    """
+
+    background: Path
+    walls: Path
+    masks_dir: Path
+    # Baked caches, written if missing or stale
+    map_layers: Path
+    nav_graph: Path
+
+    @classmethod
+    def in_dir(cls, directory: Path) -> "ScenePaths":
+        """
+        Get the asset paths of a scene laid out like the overworld's assets
+
+        Args:
+            directory: Directory of scene assets
+
+        Returns:
+            Scene asset paths
+        """
+        return cls(
+            background=directory / "combined_bg.jpg",
+            walls=directory / "walls.png",
+            masks_dir=directory / "masks",
+            map_layers=directory / "map_layers.npz",
+            nav_graph=directory / "nav_graph.npz",
+        )
+
+
+class Scene:
+    """
+    A map the player can be in, and the state of everything in it
+    """
+
+    def __init__(
+        self,
+        name: str,
+        background: pygame.Surface,
+        pyramid: MapPyramid,
+        minimap: Minimap,
+        walls: np.ndarray,
+        map_layers: MapLayers,
+        collider: WallCollider,
+        raycaster: RaycastEngine,
+        visibility: VisibilityMap,
+        pathfinder: PathFinder,
+        population: PopulationManager,
+        screen_pos: pygame.Vector2,
+    ):
+        """
+        Construct the scene
+
+        Usually constructed by Game.load_scene()
+
+        Args:
+            name: Name of the scene, e.g. "maccas"
+            background: Background, scaled to screen pixels
+            pyramid: Pyramid of the background, for zooming out
+            minimap: Minimap of the background
+            walls: Walls mask, 255 where walkable
+            map_layers: Packed map layers
+            collider: Movement against the walls
+            raycaster: Line of sight queries against the walls
+            visibility: Fog of war
+            pathfinder: Long range paths around the walls
+            population: Enemy spawning and despawning
+            screen_pos: Position of the background on screen when the scene is
+                first entered
+        """
+        self.name = name
+        self.background = background
+        self.pyramid = pyramid
+        self.minimap = minimap
+        self.walls = walls
+        self.map_layers = map_layers
+        self.collider = collider
+        self.raycaster = raycaster
+        self.visibility = visibility
+        self.pathfinder = pathfinder
+        self.population = population
+
+        # State kept while the player is in another scene
+        self.screen_pos = screen_pos
+        self.enemies_group = pygame.sprite.Group()
+
+
+class SceneCache:
+    """
+    Loads scenes ahead of time in the background, and keeps those used recently
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[str], Scene],
+        max_scenes: int = SCENE_CACHE_SIZE,
+    ):
+        """
+        Construct the scene cache
+
+        Args:
+            loader: Loads a scene by name
+            max_scenes: Number of scenes kept loaded
+        """
+        self.loader = loader
+        self.max_scenes = max_scenes
+        self.scenes: OrderedDict = OrderedDict()
+        self.loading: Dict[str, Future] = {}
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="scenes")
+
+    def get(self, name: str) -> Scene:
+        """
+        Get a scene, waiting for it to load if it has not been preloaded
+
+        Args:
+            name: Name of scene
+
+        Returns:
+            Loaded scene
+        """
+        self.collect()
+        if name not in self.scenes:
+            future = self.loading.pop(name, None)
+            if future is None:
+                logger.warning("Scene %s was not preloaded", name)
+                self.add(name, self.loader(name))
+            else:
+                self.add(name, future.result())
+        self.scenes.move_to_end(name)
+        return self.scenes[name]
+
+    def preload(self, names: Iterable[str]) -> None:
+        """
+        Start loading scenes in the background, unless already loaded or loading
+
+        Args:
+            names: Names of scenes likely to be needed soon
+        """
+        self.collect()
+        for name in names:
+            if name in self.scenes:
+                self.scenes.move_to_end(name)
+            elif name not in self.loading:
+                self.loading[name] = self.executor.submit(self.loader, name)
+
+    def collect(self) -> None:
+        """
+        Add scenes that have finished loading to the cache
+        """
+        for name, future in list(self.loading.items()):
+            if future.done():
+                del self.loading[name]
+                try:
+                    self.add(name, future.result())
+                except Exception:
+                    logger.exception("Failed to preload scene %s", name)
+
+    def add(self, name: str, scene: Scene) -> None:
+        """
+        Add a loaded scene, evicting the least recently used beyond the limit
+        """
+        self.scenes[name] = scene
+        self.scenes.move_to_end(name)
+        while len(self.scenes) > self.max_scenes:
+            self.scenes.popitem(last=False)
+
+    def shutdown(self) -> None:
+        """
+        Stop loading scenes
+        """
+        self.executor.shutdown(wait=False, cancel_futures=True)
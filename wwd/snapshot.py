@@ -0,0 +1,348 @@
+"""
+Binary snapshots of the full simulation state
+
+A snapshot is a set of NumPy structured arrays, one per section of the game state,
+written back to back into a single versioned file. Sprite surfaces are never stored,
+only their asset keys, and positions are stored in map (numpy) co-ordinates so that
+snapshots are independent of screen resolution. Each section holding sprites has a
+table of the distinct asset keys used in it, written as its own array, and each row
+stores just an index into that table.
+"""
+
+
+import random
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterable, List, Tuple
+
+import numpy as np
+import pygame
+
+from wwd.constants import BG_SCALE_FACTOR
+
+if TYPE_CHECKING:
+    from wwd.game import Game
+
+
+SNAPSHOT_MAGIC = b"WWDSNAP\x00"
+SNAPSHOT_VERSION = 2
+
+# Index into a section's table of asset keys, which are short identifiers like
+# "enemy/zombie". Sections use only a handful of distinct assets.
+ASSET_INDEX_DTYPE = "u1"
+
+GAME_DTYPE = np.dtype(
+    [
+        ("player_pos", "f8", 2),
+        ("dt", "f8"),
+        ("panko_respawn_timer", "f8"),
+    ]
+)
+PLAYER_DTYPE = np.dtype(
+    [
+        ("asset", ASSET_INDEX_DTYPE),
+        ("health", "f8"),
+        ("alive", "?"),
+        ("active_weapon", "u1"),
+    ]
+)
+PET_DTYPE = np.dtype(
+    [
+        ("asset", ASSET_INDEX_DTYPE),
+        ("pos", "f8", 2),
+        ("health", "f8"),
+        ("alive", "?"),
+        ("is_attacking", "?"),
+        ("target", "i4"),
+    ]
+)
+ENEMY_DTYPE = np.dtype(
+    [
+        ("asset", ASSET_INDEX_DTYPE),
+        ("pos", "f8", 2),
+        ("health", "f8"),
+    ]
+)
+WEAPON_DTYPE = np.dtype(
+    [
+        ("asset", ASSET_INDEX_DTYPE),
+        ("pos", "f8", 2),
+        ("target", "f8", 2),
+        ("angle", "f8"),
+        ("alive", "?"),
+        ("is_attacking", "?"),
+        ("kill_next_time", "?"),
+    ]
+)
+RNG_DTYPE = np.dtype(
+    [
+        ("version", "i4"),
+        ("state", "u4", 625),
+        ("gauss_next", "f8"),
+    ]
+)
+
+# Sections with an asset key table, stored in a section named "<section>_assets"
+ASSET_SECTIONS = ("player", "pet", "enemies", "weapons")
+
+# Order in which sections are written to and read from snapshot files
+SECTIONS = (
+    "game",
+    "player",
+    "pet",
+    "enemies",
+    "weapons",
+    "rng",
+    *(f"{section}_assets" for section in ASSET_SECTIONS),
+)
+
+Snapshot = Dict[str, np.ndarray]
+
+
+def capture(game: "Game") -> Snapshot:
+    """
+    Capture the simulation state of a game
+
+    Args:
+        game: Game to capture
+
+    Returns:
+        Mapping of section name to structured array
+    """
+    # Inside a building, save the overworld as it was left, so loading puts the
+    # player back outside. Pets and weapons stay by the player, in the centre of the
+    # screen, so are saved relative to the overworld too.
+    if game.scene is game.overworld:
+        screen_pos, enemies_group = game.screen_pos, game.enemies_group
+    else:
+        screen_pos = game.overworld.screen_pos
+        enemies_group = game.overworld.enemies_group
+    origin = np.asarray(screen_pos)
+
+    game_state = np.zeros(1, dtype=GAME_DTYPE)
+    game_state["player_pos"] = game.pygame_pos_to_numpy(screen_pos)
+    game_state["dt"] = game.dt
+    game_state["panko_respawn_timer"] = game.panko_respawn_timer
+
+    player = np.zeros(1, dtype=PLAYER_DTYPE)
+    player_assets, player["asset"] = _asset_table([game.player.ASSET_KEY])
+    player["health"] = game.player.health
+    player["alive"] = game.player.alive()
+    player["active_weapon"] = game.player.active_weapon is game.player.ranged_weapon
+
+    enemies = list(enemies_group)
+    enemy_state = np.zeros(len(enemies), dtype=ENEMY_DTYPE)
+    enemy_assets, enemy_state["asset"] = _asset_table(
+        enemy.ASSET_KEY for enemy in enemies
+    )
+    enemy_state["pos"] = (game.sprite_positions(enemies) - origin) / BG_SCALE_FACTOR
+    enemy_state["health"] = np.fromiter(
+        (enemy.health for enemy in enemies), dtype=float, count=len(enemies)
+    )
+
+    pet = np.zeros(1, dtype=PET_DTYPE)
+    pet_assets, pet["asset"] = _asset_table([game.panko.ASSET_KEY])
+    pet["pos"] = (np.asarray(game.panko.pos) - origin) / BG_SCALE_FACTOR
+    pet["health"] = game.panko.health
+    pet["alive"] = game.panko.alive()
+    pet["is_attacking"] = game.panko.is_attacking
+    pet["target"] = (
+        enemies.index(game.panko.targeted_enemy)
+        if game.panko.targeted_enemy in enemies_group
+        else -1
+    )
+
+    weapons = (game.player.meelee_weapon, game.player.ranged_weapon)
+    weapon_state = np.zeros(len(weapons), dtype=WEAPON_DTYPE)
+    weapon_assets, weapon_state["asset"] = _asset_table(
+        weapon.ASSET_KEY for weapon in weapons
+    )
+    weapon_state["target"] = np.nan
+    for row, weapon in zip(weapon_state, weapons):
+        row["pos"] = (np.asarray(weapon.pos) - origin) / BG_SCALE_FACTOR
+        if getattr(weapon, "target", None) is not None:
+            row["target"] = (np.asarray(weapon.target) - origin) / BG_SCALE_FACTOR
+        row["angle"] = getattr(weapon, "angle", 0)
+        row["alive"] = weapon.alive()
+        row["is_attacking"] = weapon.is_attacking
+        row["kill_next_time"] = weapon.kill_next_time
+
+    rng_version, rng_internal_state, rng_gauss_next = random.getstate()
+    rng = np.zeros(1, dtype=RNG_DTYPE)
+    rng["version"] = rng_version
+    rng["state"] = rng_internal_state
+    rng["gauss_next"] = np.nan if rng_gauss_next is None else rng_gauss_next
+
+    return {
+        "game": game_state,
+        "player": player,
+        "pet": pet,
+        "enemies": enemy_state,
+        "weapons": weapon_state,
+        "rng": rng,
+        "player_assets": player_assets,
+        "pet_assets": pet_assets,
+        "enemies_assets": enemy_assets,
+        "weapons_assets": weapon_assets,
+    }
+
+
+def restore(game: "Game", snapshot: Snapshot) -> None:
+    """
+    Restore the simulation state of a game from a snapshot
+
+    Args:
+        game: Game to restore into
+        snapshot: Snapshot from capture() or read()
+    """
+    # Background position determines the origin of all sprite positions
+    game_state = snapshot["game"][0]
+    game.screen_pos = game.numpy_pos_to_pygame(
+        pygame.Vector2(*game_state["player_pos"])
+    )
+    game.dt = float(game_state["dt"])
+    game.panko_respawn_timer = float(game_state["panko_respawn_timer"])
+    origin = np.asarray(game.screen_pos)
+
+    def to_screen(numpy_pos: np.ndarray) -> pygame.Vector2:
+        return pygame.Vector2(*(numpy_pos * BG_SCALE_FACTOR + origin))
+
+    # Player
+    player_state = snapshot["player"][0]
+    game.player.health = float(player_state["health"])
+    game.player.active_weapon = (
+        game.player.ranged_weapon
+        if player_state["active_weapon"]
+        else game.player.meelee_weapon
+    )
+    if player_state["alive"]:
+        game.player_group.add(game.player)
+    else:
+        game.player.kill()
+
+    # Enemies
+    enemy_state = snapshot["enemies"]
+    _check_asset_keys(
+        enemy_state, snapshot["enemies_assets"], game.enemy_factory.func.ASSET_KEY
+    )
+    enemies: List[pygame.sprite.Sprite] = []
+    for pos, health in zip(
+        (enemy_state["pos"] * BG_SCALE_FACTOR + origin).tolist(),
+        enemy_state["health"].tolist(),
+    ):
+        enemy = game.enemy_factory(pos=pygame.Vector2(pos))
+        enemy.health = health
+        enemies.append(enemy)
+    game.enemies_group = pygame.sprite.Group(enemies)
+
+    # Panko
+    pet_state = snapshot["pet"][0]
+    game.panko = game.panko_factory(pos=to_screen(pet_state["pos"]))
+    game.panko.health = float(pet_state["health"])
+    if pet_state["target"] >= 0:
+        game.panko.attack(enemies[pet_state["target"]])
+    game.panko.is_attacking = bool(pet_state["is_attacking"])
+    game.pet_group = pygame.sprite.Group()
+    if pet_state["alive"]:
+        game.pet_group.add(game.panko)
+
+    # Weapons
+    weapons = (game.player.meelee_weapon, game.player.ranged_weapon)
+    for row, weapon in zip(snapshot["weapons"], weapons):
+        weapon.kill()
+        weapon.pos = to_screen(row["pos"])
+        if not np.isnan(row["target"]).any():
+            weapon.target = to_screen(row["target"])
+        weapon.angle = float(row["angle"])
+        weapon.rect.center = weapon.pos
+        if row["alive"]:
+            weapon.add(weapon.weapons_group)
+        weapon.is_attacking = bool(row["is_attacking"])
+        weapon.kill_next_time = bool(row["kill_next_time"])
+    if game.player.meelee_weapon.is_attacking:
+        game.player.meelee_weapon.image = pygame.transform.rotate(
+            game.player.meelee_weapon.original_image, game.player.meelee_weapon.angle
+        )
+    if game.player.ranged_weapon.is_attacking:
+        game.player.ranged_weapon.image = pygame.transform.rotate(
+            game.player.ranged_weapon.original_image,
+            -game.player.ranged_weapon.angle - 125,
+        )
+
+    # Random number generator
+    rng = snapshot["rng"][0]
+    random.setstate(
+        (
+            int(rng["version"]),
+            tuple(rng["state"].tolist()),
+            None if np.isnan(rng["gauss_next"]) else float(rng["gauss_next"]),
+        )
+    )
+
+
+def write(path: Path, snapshot: Snapshot) -> None:
+    """
+    Write a snapshot to a file
+
+    Args:
+        path: Path to write to
+        snapshot: Snapshot from capture()
+    """
+    with open(path, "wb") as snapshot_file:
+        snapshot_file.write(SNAPSHOT_MAGIC)
+        snapshot_file.write(np.uint32(SNAPSHOT_VERSION).tobytes())
+        for section in SECTIONS:
+            np.lib.format.write_array(
+                snapshot_file, snapshot[section], allow_pickle=False
+            )
+
+
+def read(path: Path) -> Snapshot:
+    """
+    Read a snapshot from a file
+
+    Args:
+        path: Path to read from
+
+    Returns:
+        Snapshot suitable for restore()
+
+    Raises:
+        ValueError: If the file is not a snapshot, or is from an unsupported version
+    """
+    with open(path, "rb") as snapshot_file:
+        if snapshot_file.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} is not a snapshot file")
+        version = int(np.frombuffer(snapshot_file.read(4), dtype=np.uint32)[0])
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(
+                f"{path} has snapshot version {version}, expected {SNAPSHOT_VERSION}"
+            )
+        return {
+            section: np.lib.format.read_array(snapshot_file, allow_pickle=False)
+            for section in SECTIONS
+        }
+
+
+def _asset_table(keys: Iterable[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Build a section's table of distinct asset keys, and the index of each key in it
+
+    Raises:
+        ValueError: If there are too many distinct keys to index
+    """
+    table, indices = np.unique(np.array(list(keys), dtype=str), return_inverse=True)
+    if len(table) > np.iinfo(ASSET_INDEX_DTYPE).max + 1:
+        raise ValueError(f"Too many distinct assets in a section: {len(table)}")
+    return table, indices.astype(ASSET_INDEX_DTYPE)
+
+
+def _check_asset_keys(state: np.ndarray, table: np.ndarray, expected_key: str) -> None:
+    """
+    Ensure all entities in a section use an asset we know how to construct
+    """
+    indices = np.unique(state["asset"])
+    if len(indices) and indices[-1] >= len(table):
+        raise ValueError("Snapshot contains asset indices outside its asset table")
+    unknown = set(table[indices].tolist()) - {expected_key}
+    if unknown:
+        raise ValueError(f"Snapshot contains unknown assets: {sorted(unknown)}")
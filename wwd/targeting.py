@@ -0,0 +1,160 @@
+"""
+Target assignment for companions
+
+Rather than each companion sorting every enemy by distance each frame (and all of
+them piling onto the same zombie), targets are assigned to all companions together
+in one batched pass. Unassigned companions are greedily given their nearest
+reachable enemy, closest pairs first, with a cap on companions per enemy. An enemy
+is reachable if any path around the walls leads to it, even if it is out of sight;
+of enemies about as close as each other, one in sight is preferred. Assignments are
+kept until the target dies or leaves range.
+"""
+
+
+from typing import Dict, Sequence
+
+import numpy as np
+import pygame
+
+from wwd.pathfinding import PathFinder
+from wwd.raycast import RaycastEngine
+
+
+# Maximum number of companions assigned to the same enemy
+MAX_ALLIES_PER_TARGET = 2
+
+# Nearest enemies considered for each unassigned companion, checked for a path
+CANDIDATES_PER_ALLY = 8
+
+
+class TargetingService:
+    """
+    Assigns enemies to companions, keeping assignments between frames
+    """
+
+    def __init__(
+        self,
+        raycaster: RaycastEngine,
+        pathfinder: PathFinder,
+        target_range: float,
+        max_allies_per_target: int = MAX_ALLIES_PER_TARGET,
+        candidates_per_ally: int = CANDIDATES_PER_ALLY,
+    ):
+        """
+        Construct the targeting service
+
+        Args:
+            raycaster: Raycast engine, to prefer enemies companions can see
+            pathfinder: Path finder, to check companions can reach enemies
+            target_range: Maximum distance to a target, in map (numpy) pixels
+            max_allies_per_target: Maximum number of companions per enemy
+            candidates_per_ally: Nearest enemies considered for each companion
+        """
+        self.raycaster = raycaster
+        self.pathfinder = pathfinder
+        self.target_range = target_range
+        self.max_allies_per_target = max_allies_per_target
+        self.candidates_per_ally = candidates_per_ally
+        self.assignments: Dict[pygame.sprite.Sprite, pygame.sprite.Sprite] = {}
+
+    def assign(
+        self,
+        allies: Sequence[pygame.sprite.Sprite],
+        ally_positions: np.ndarray,
+        enemies: Sequence[pygame.sprite.Sprite],
+        enemy_positions: np.ndarray,
+    ) -> Dict[pygame.sprite.Sprite, pygame.sprite.Sprite]:
+        """
+        Update target assignments
+
+        Args:
+            allies: Companions needing targets
+            ally_positions: Map (numpy) co-ordinates of allies, shape (n_allies, 2)
+            enemies: Enemies that can be targeted
+            enemy_positions: Map (numpy) co-ordinates of enemies, shape (n_enemies, 2)
+
+        Returns:
+            Target of each ally that has one
+        """
+        ally_idxs = {ally: idx for idx, ally in enumerate(allies)}
+        enemy_idxs = {enemy: idx for idx, enemy in enumerate(enemies)}
+
+        # Keep assignments whose ally and target are still around and in range
+        kept = [
+            (ally, enemy)
+            for ally, enemy in self.assignments.items()
+            if ally in ally_idxs and enemy in enemy_idxs
+        ]
+        if kept:
+            kept_distances = np.hypot(
+                *(
+                    ally_positions[[ally_idxs[ally] for ally, _ in kept]]
+                    - enemy_positions[[enemy_idxs[enemy] for _, enemy in kept]]
+                ).T
+            )
+            kept = [
+                pair
+                for pair, in_range in zip(
+                    kept, (kept_distances <= self.target_range).tolist()
+                )
+                if in_range
+            ]
+        self.assignments = dict(kept)
+
+        unassigned = np.array(
+            [idx for ally, idx in ally_idxs.items() if ally not in self.assignments],
+            dtype=np.intp,
+        )
+        if not len(unassigned) or not len(enemies):
+            return self.assignments
+
+        # Nearest enemies in range of each unassigned ally
+        distances = np.hypot(
+            *np.moveaxis(
+                ally_positions[unassigned, None] - enemy_positions[None], -1, 0
+            )
+        )
+        n_candidates = min(self.candidates_per_ally, len(enemies))
+        candidates = np.argpartition(distances, n_candidates - 1, axis=1)[
+            :, :n_candidates
+        ]
+        rows = np.repeat(np.arange(len(unassigned)), n_candidates)
+        cols = candidates.ravel()
+        pair_distances = distances[rows, cols]
+        in_range = pair_distances <= self.target_range
+        rows, cols, pair_distances = (
+            rows[in_range],
+            cols[in_range],
+            pair_distances[in_range],
+        )
+
+        # Only enemies with a path to them can be targeted
+        reachable = self.pathfinder.connected(
+            ally_positions[unassigned[rows]], enemy_positions[cols]
+        )
+        rows, cols, pair_distances = (
+            rows[reachable],
+            cols[reachable],
+            pair_distances[reachable],
+        )
+        in_sight = self.raycaster.segments_clear(
+            ally_positions[unassigned[rows]], enemy_positions[cols]
+        )
+
+        # Greedily assign closest pairs first, up to the cap per enemy, preferring
+        # enemies in sight over those at the same distance in navigation cells
+        allies_per_target = np.zeros(len(enemies), dtype=int)
+        for enemy in self.assignments.values():
+            allies_per_target[enemy_idxs[enemy]] += 1
+        order = np.lexsort(
+            (~in_sight, np.floor(pair_distances / self.pathfinder.cell_size))
+        )
+        for row, col in zip(rows[order].tolist(), cols[order].tolist()):
+            ally = allies[unassigned[row]]
+            if (
+                ally not in self.assignments
+                and allies_per_target[col] < self.max_allies_per_target
+            ):
+                self.assignments[ally] = enemies[col]
+                allies_per_target[col] += 1
+        return self.assignments
@@ -0,0 +1,253 @@
+"""
+Fog of war from the walls mask
+
+The walls mask is reduced to a coarse grid of opaque cells, and the player's field
+of view is found over a window of it around them by recursive shadowcasting. It is
+only recomputed when the player moves into another cell. The visibility grid is
+drawn as a light map, scaled up once each time it changes, and multiplied over the
+frame in a single blit. Cells are only opaque if they are mostly wall, so thin walls
+do not show in the grid: it is only fit for drawing, and enemy sight still casts
+rays against the full walls mask.
+"""
+
+
+from math import ceil, hypot
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pygame
+
+from wwd.constants import BG_SCALE_FACTOR
+
+
+# Size of visibility cells, in map (numpy) pixels
+FOG_CELL_SIZE = 16
+
+# Brightness of cells out of sight, out of 255
+FOG_BRIGHTNESS = 70
+
+# Extra scale applied smoothly before the light map is scaled up to the screen,
+# softening the edges of shadows
+FOG_SOFTENING = 4
+
+# Row and column signs and transposition of each octant, for shadowcasting
+OCTANTS = (
+    (1, 0, 0, 1),
+    (0, 1, 1, 0),
+    (0, -1, 1, 0),
+    (-1, 0, 0, 1),
+    (-1, 0, 0, -1),
+    (0, -1, -1, 0),
+    (0, 1, -1, 0),
+    (1, 0, 0, -1),
+)
+
+
+class VisibilityMap:
+    """
+    Field of view around the player on a coarse grid of the walls mask
+    """
+
+    def __init__(
+        self,
+        walls: np.ndarray,
+        view_size: Tuple[float, float],
+        cell_size: int = FOG_CELL_SIZE,
+    ):
+        """
+        Construct the visibility map
+
+        Args:
+            walls: Walls mask, 255 where walkable
+            view_size: Width and height of the area around the player to compute
+                visibility over, in map (numpy) pixels
+            cell_size: Size of visibility cells, in map (numpy) pixels
+        """
+        self.cell_size = cell_size
+
+        # Cells are opaque if they are mostly wall
+        height, width = walls.shape
+        n_rows, n_cols = -(-height // cell_size), -(-width // cell_size)
+        wall_counts = np.zeros((n_rows * cell_size, n_cols * cell_size), np.uint16)
+        wall_counts[:height, :width] = walls != 255
+        self.opaque = (
+            wall_counts.reshape(n_rows, cell_size, n_cols, cell_size).sum(axis=(1, 3))
+            > cell_size**2 / 2
+        )
+
+        # Cells either side of the player in the window, and the view radius that
+        # reaches its corners
+        self.half_size = tuple(
+            ceil(size / 2 / cell_size) + 1 for size in reversed(view_size)
+        )
+        self.radius = ceil(hypot(*self.half_size))
+
+        # Visible cells of the window, and the row and column of its top left cell.
+        # Both are replaced, never modified, so they can be drawn while the next
+        # frame is simulated.
+        self.cell: Optional[Tuple[int, int]] = None
+        self.visible = np.zeros([2 * size + 1 for size in self.half_size], bool)
+        self.origin = (0, 0)
+
+    def update(self, pos: pygame.Vector2) -> bool:
+        """
+        Recompute the field of view if the player has moved into another cell
+
+        Args:
+            pos: Map (numpy) co-ordinates of the player
+
+        Returns:
+            True if the field of view was recomputed
+        """
+        cell = (int(pos.y // self.cell_size), int(pos.x // self.cell_size))
+        if cell == self.cell:
+            return False
+        self.cell = cell
+        self.origin = (cell[0] - self.half_size[0], cell[1] - self.half_size[1])
+        self.visible = self.shadowcast()
+        return True
+
+    def shadowcast(self) -> np.ndarray:
+        """
+        Find the cells of the window visible from its centre
+
+        Returns:
+            Visible cells, shape of window
+        """
+        n_rows, n_cols = self.visible.shape
+        row_0, col_0 = self.origin
+
+        # Cells outside the map are opaque
+        opaque = np.ones((n_rows, n_cols), dtype=bool)
+        src_rows = slice(max(row_0, 0), max(row_0 + n_rows, 0))
+        src_cols = slice(max(col_0, 0), max(col_0 + n_cols, 0))
+        window = self.opaque[src_rows, src_cols]
+        dst_row, dst_col = src_rows.start - row_0, src_cols.start - col_0
+        opaque[
+            dst_row : dst_row + window.shape[0], dst_col : dst_col + window.shape[1]
+        ] = window
+
+        opaque_rows: List[List[bool]] = opaque.tolist()
+        visible_rows = [[False] * n_cols for _ in range(n_rows)]
+        centre_row, centre_col = self.half_size
+        visible_rows[centre_row][centre_col] = True
+        radius_squared = self.radius**2
+        for xx, xy, yx, yy in OCTANTS:
+            # Rows of the octant still to scan, with the slopes of the light left
+            scans = [(1, 1.0, 0.0)]
+            while scans:
+                depth, start_slope, end_slope = scans.pop()
+                if start_slope < end_slope:
+                    continue
+                for distance in range(depth, self.radius + 1):
+                    blocked = False
+                    next_start_slope = start_slope
+                    d_y = -distance
+                    for d_x in range(-distance, 1):
+                        left_slope = (d_x - 0.5) / (d_y + 0.5)
+                        right_slope = (d_x + 0.5) / (d_y - 0.5)
+                        if start_slope < right_slope:
+                            continue
+                        if end_slope > left_slope:
+                            break
+
+                        row = centre_row + d_x * yx + d_y * yy
+                        col = centre_col + d_x * xx + d_y * xy
+                        inside = 0 <= row < n_rows and 0 <= col < n_cols
+                        if inside and d_x * d_x + d_y * d_y <= radius_squared:
+                            visible_rows[row][col] = True
+                        cell_opaque = not inside or opaque_rows[row][col]
+
+                        if blocked:
+                            if cell_opaque:
+                                next_start_slope = right_slope
+                            else:
+                                blocked = False
+                                start_slope = next_start_slope
+                        elif cell_opaque and distance < self.radius:
+                            blocked = True
+                            scans.append((distance + 1, start_slope, left_slope))
+                            next_start_slope = right_slope
+                    if blocked:
+                        break
+        return np.array(visible_rows, dtype=bool)
+
+
+class FogOverlay:
+    """
+    Draws a visibility grid as a light map multiplied over a frame
+    """
+
+    def __init__(self, cell_size: int = FOG_CELL_SIZE):
+        """
+        Construct the fog overlay
+
+        Args:
+            cell_size: Size of visibility cells, in map (numpy) pixels
+        """
+        self.cell_size = cell_size
+        self.light_map: Optional[pygame.Surface] = None
+        self.drawn_visible: Optional[np.ndarray] = None
+        self.drawn_scale: Optional[float] = None
+        self.fog: Optional[pygame.Surface] = None
+
+    def draw(
+        self,
+        surface: pygame.Surface,
+        visible: np.ndarray,
+        origin: Tuple[int, int],
+        screen_pos: pygame.Vector2,
+        scale: float = 1.0,
+        offset: pygame.Vector2 = pygame.Vector2(0, 0),
+    ) -> None:
+        """
+        Darken everything out of sight
+
+        Args:
+            surface: Surface to draw on
+            visible: Visible cells of the window
+            origin: Row and column of the window's top left cell
+            screen_pos: Position of the map origin on screen
+            scale: Size of drawn sprites relative to the screen
+            offset: Position of screen origin on surface
+        """
+        # Scale the light map up only when visibility or zoom has changed
+        cell_pixels = self.cell_size * BG_SCALE_FACTOR * scale
+        if visible is not self.drawn_visible or scale != self.drawn_scale:
+            brightness = np.where(visible.T, 255, FOG_BRIGHTNESS).astype(np.uint8)
+            light_map = pygame.surfarray.make_surface(
+                np.repeat(brightness[..., None], 3, axis=-1)
+            )
+            light_map = pygame.transform.smoothscale_by(light_map, FOG_SOFTENING)
+            self.light_map = pygame.transform.scale(
+                light_map,
+                (
+                    round(visible.shape[1] * cell_pixels),
+                    round(visible.shape[0] * cell_pixels),
+                ),
+            )
+            self.drawn_visible, self.drawn_scale = visible, scale
+
+        # Fog anything beyond the window too, e.g. when zoomed out
+        topleft = (
+            pygame.Vector2(origin[1], origin[0]) * self.cell_size * BG_SCALE_FACTOR
+            + screen_pos
+        ) * scale + offset
+        window = self.light_map.get_rect(topleft=topleft)
+        surface.blit(self.light_map, window, special_flags=pygame.BLEND_RGB_MULT)
+        bounds = surface.get_rect()
+        if not window.contains(bounds):
+            if self.fog is None or self.fog.get_size() != bounds.size:
+                self.fog = pygame.Surface(bounds.size)
+                self.fog.fill((FOG_BRIGHTNESS,) * 3)
+            for strip in (
+                pygame.Rect(0, 0, bounds.width, window.top),
+                pygame.Rect(0, window.bottom, bounds.width, bounds.height),
+                pygame.Rect(0, window.top, window.left, window.height),
+                pygame.Rect(window.right, window.top, bounds.width, window.height),
+            ):
+                strip = strip.clip(bounds)
+                if strip.width > 0 and strip.height > 0:
+                    surface.blit(
+                        self.fog, strip, area=strip, special_flags=pygame.BLEND_RGB_MULT
+                    )
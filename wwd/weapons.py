@@ -4,13 +4,13 @@ Wagga Wagga Down character classes
 
 
 from enum import Enum
-from math import exp, sin, cos, radians
-from pathlib import Path
+from math import sin, cos, radians
 from typing import Dict
 
 import pygame
 
-from wwd.constants import CollisionsDict
+from wwd.assets import load_sprite
+from wwd.render import RenderQueue
 
 
 RANGED_SCALE_FACTOR = 1.0
@@ -22,6 +22,9 @@ ARROW_DAMAGE = 50
 ARROW_SPEED = 400
 ARROW_DISTANCE = 1000
 
+# Rate at which weapon damage decays with distance from the weapon, per pixel
+DAMAGE_FALLOFF = 0.01
+
 
 class Weapon(pygame.sprite.Sprite):
     """
@@ -56,12 +59,9 @@ class Weapon(pygame.sprite.Sprite):
         self.is_attacking = False
         self.kill_next_time = False
 
-    def update(
-        self,
-        weapon_enemy_collisions: CollisionsDict,
-    ) -> None:
+    def update(self) -> None:
         """
-        Update enemy state
+        Update enemy state, damage is dealt by the combat resolver
         """
         # Check if we were killed last time
         if self.kill_next_time:
@@ -72,15 +72,10 @@ class Weapon(pygame.sprite.Sprite):
         if not self.alive():
             self.is_attacking = False
 
-        # Check collisions with enemies
-        if self in weapon_enemy_collisions and self.is_attacking:
-            for enemy in weapon_enemy_collisions[self]:
-                enemy.health -= self.damage * exp(
-                    -(enemy.pos - self.pos).magnitude() * 0.01
-                )
-                if self.single_use:
-                    self.kill_next_time = True
-                    return
+    def draw_overlay(self, render_queue: RenderQueue) -> None:
+        """
+        Queue drawing of anything drawn over the weapon, nothing by default
+        """
 
     def attack(self) -> None:
         """
@@ -102,6 +97,9 @@ class MeeleeWeapon(Weapon):
     Handheld weapons
     """
 
+    ASSET_KEY = "weapons/machete"
+    SCALE_FACTOR = MEELEE_SCALE_FACTOR
+
     def __init__(
         self,
         pos: pygame.Vector2,
@@ -115,12 +113,7 @@ class MeeleeWeapon(Weapon):
             damage: Amount of damage inflicted by weapon
             single_use: Weapon dies after making contact if True
         """
-        img = pygame.transform.smoothscale_by(
-            pygame.image.load(
-                Path("../assets/sprites/weapons/machete.png")
-            ).convert_alpha(),
-            MEELEE_SCALE_FACTOR,
-        )
+        img = load_sprite(self.ASSET_KEY, self.SCALE_FACTOR)
         super().__init__(
             pos=pos,
             weapons_group=weapons_group,
@@ -137,12 +130,11 @@ class MeeleeWeapon(Weapon):
         self,
         scroll_delta: pygame.Vector2,
         dt: float,
-        weapon_enemy_collisions: CollisionsDict,
     ) -> None:
         """
         Update enemy state
         """
-        super().update(weapon_enemy_collisions=weapon_enemy_collisions)
+        super().update()
 
         # Update animation if currently attacking
         if self.is_attacking:
@@ -176,6 +168,9 @@ class RangedWeapon(Weapon):
     HandheldRanged weapons
     """
 
+    ASSET_KEY = "weapons/arrow"
+    SCALE_FACTOR = RANGED_SCALE_FACTOR
+
     def __init__(
         self,
         pos: pygame.Vector2,
@@ -190,12 +185,7 @@ class RangedWeapon(Weapon):
             damage: Amount of damage inflicted by weapon
             single_use: Weapon dies after making contact if True
         """
-        img = pygame.transform.smoothscale_by(
-            pygame.image.load(
-                Path("../assets/sprites/weapons/arrow.png")
-            ).convert_alpha(),
-            RANGED_SCALE_FACTOR,
-        )
+        img = load_sprite(self.ASSET_KEY, self.SCALE_FACTOR)
         super().__init__(
             pos=pos + pygame.Vector2(0, 25),
             weapons_group=weapons_group,
@@ -214,22 +204,15 @@ class RangedWeapon(Weapon):
         self,
         scroll_delta: pygame.Vector2,
         dt: float,
-        weapon_enemy_collisions: CollisionsDict,
     ) -> None:
         """
         Update enemy state
         """
         # Base class update
-        super().update(weapon_enemy_collisions=weapon_enemy_collisions)
-
-        # Draw aim line
-        pygame.draw.line(
-            self.screen, "black", self.player_center, pygame.mouse.get_pos()
-        )
+        super().update()
 
         # Update animation if currently attacking
         if self.is_attacking:
-
             # Account for background shifts
             self.pos += scroll_delta
             self.target += scroll_delta
@@ -240,6 +223,12 @@ class RangedWeapon(Weapon):
                 self.kill()
             self.rect.center = self.pos
 
+    def draw_overlay(self, render_queue: RenderQueue) -> None:
+        """
+        Queue drawing of the aim line
+        """
+        render_queue.submit_line("black", self.player_center, pygame.mouse.get_pos())
+
     def attack(self) -> None:
         """
         Execute weapon attack